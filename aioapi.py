@@ -0,0 +1,351 @@
+import os
+import json
+import asyncio
+from aiotransport import AsyncTransport
+from api import MAX_PAGE_SIZE, LAST_PAGE
+from cache import ListingCache
+from hasher import get_hash_pool
+from ratelimit import get_request_scheduler
+from records import FileRecord
+from uploader import UploadSessionStore, FileWindow, classify_slice_result, split_slices, DEFAULT_UPLOAD_WORKERS
+
+UPLOAD_RESULT_ATTEMPTS = 30  # 轮询异步上传结果的最多次数
+UPLOAD_RESULT_INTERVAL = 1.0  # 轮询异步上传结果的间隔(秒)
+
+
+class AsyncAPI_123pan:
+    """asyncio版本的123云盘客户端，接口与 API_123pan 对应
+    
+    所有请求在同一个事件循环中通过 AsyncTransport 发出，成千上万个并发请求只占用一个线程。
+    列表缓存与搜索索引可以和 API_123pan 共用。读写本地文件、上传会话和搜索索引等阻塞操作在线程池中进行。
+    图形界面仍使用 API_123pan 和 RequestExecutor，本类只作为脚本或其他程序批量调用的库接口(见 threads.AsyncExecutor)。
+    """
+    BASE_URL = "open-api.123pan.com"
+    SCHEME = "https"
+    
+    def __init__(self, token=None, transport=None, listing_cache=None, stale_while_revalidate=True, search_index=None,
+                 scheduler=None):
+        self.token = token
+        self.transport = transport or AsyncTransport()
+        self.scheduler = scheduler  # 与 API_123pan 共用的按接口限速调度器，为空时使用全局共享的
+        self.listing_cache = listing_cache or ListingCache()
+        self.search_index = search_index  # 每次从服务器获取列表后更新
+        self.stale_while_revalidate = stale_while_revalidate  # 缓存过期时先返回旧列表，后台刷新
+        self._revalidating = {}  # 缓存键 -> 后台刷新任务
+    
+    def set_token(self, token, account=None):
+        """设置访问令牌，account 与 API_123pan.set_token 相同"""
+        self.token = token
+        # 切换账号后旧的列表缓存不再可用
+        self.listing_cache.clear()
+        if self.search_index is not None:
+            self.search_index.set_account(account)
+    
+    def invalidate_folder(self, folder_id):
+        """文件夹内容变化(上传、删除、移动)后清除其列表缓存"""
+        self.listing_cache.invalidate(folder_id)
+    
+    def get_headers(self):
+        """获取请求头"""
+        headers = {
+            'Content-Type': 'application/json',
+            'Platform': 'open_platform'
+        }
+        if self.token:
+            headers['Authorization'] = self.token
+        return headers
+    
+    async def request(self, method, path, payload="", headers=None):
+        """按接口限速发送请求，被限流时退避重试，返回解析后的JSON"""
+        scheduler = self.scheduler or get_request_scheduler()
+        url = f"{self.SCHEME}://{self.BASE_URL}{path}"
+        limiter = scheduler.limiter(scheduler.endpoint(url))
+        for attempt in range(scheduler.max_retries + 1):
+            wait = limiter.reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            res = await self.transport.request(method, url, payload, headers if headers is not None else self.get_headers())
+            rate_limited, data_dict = scheduler.handle_response(limiter, res)
+            if not rate_limited:
+                return data_dict
+        raise scheduler.exhausted(url)
+    
+    async def close(self):
+        """等待后台刷新结束并关闭空闲连接"""
+        if self._revalidating:
+            await asyncio.gather(*self._revalidating.values(), return_exceptions=True)
+        self.transport.close()
+    
+    async def get_user_info(self):
+        """获取用户信息"""
+        if not self.token:
+            raise Exception("未登录")
+        
+        data_dict = await self.request("GET", "/api/v1/user/info")
+        
+        if data_dict.get("code") != 0:
+            raise Exception(data_dict.get("message", "未知错误"))
+        
+        spaceUsed = (data_dict["data"]["spaceUsed"])/1073741824
+        spacePermanent = (data_dict["data"]["spacePermanent"])/1099511627776
+        directTraffic = (data_dict["data"]["directTraffic"])/1073741824
+        return spaceUsed, spacePermanent, directTraffic
+    
+    async def get_file_list(self, folder_id, last_file_id=None, refresh=False, limit=MAX_PAGE_SIZE):
+        """获取指定文件夹的文件列表，返回 ([FileRecord], lastFileId)，缓存规则同 API_123pan.get_file_list"""
+        if not self.token:
+            raise Exception("未登录")
+        
+        key = ListingCache.make_key(folder_id, last_file_id, self.cache_limit(limit))
+        if not refresh:
+            cached = self.listing_cache.get(key)
+            if cached:
+                (files, next_file_id), fresh = cached
+                if not fresh:
+                    if not self.stale_while_revalidate:
+                        return await self.fetch_file_list(folder_id, last_file_id, limit)
+                    self.revalidate(folder_id, last_file_id, limit)
+                return list(files), next_file_id
+        
+        return await self.fetch_file_list(folder_id, last_file_id, limit)
+    
+    async def iter_folder_pages(self, folder_id, page_size=MAX_PAGE_SIZE, refresh=False, last_file_id=None):
+        """逐页返回文件夹中的全部文件，处理当前页时已在请求下一页，提前结束迭代时取消预取"""
+        page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+        pending = asyncio.ensure_future(self.get_file_list(folder_id, last_file_id, refresh, page_size))
+        try:
+            while pending is not None:
+                files, last_file_id = await pending
+                pending = None
+                if last_file_id and last_file_id != LAST_PAGE:
+                    pending = asyncio.ensure_future(self.get_file_list(folder_id, last_file_id, refresh, page_size))
+                if files:
+                    yield files
+        finally:
+            if pending is not None:
+                pending.cancel()
+    
+    async def iter_folder(self, folder_id, page_size=MAX_PAGE_SIZE, refresh=False):
+        """逐个返回文件夹中的全部 FileRecord"""
+        async for files in self.iter_folder_pages(folder_id, page_size, refresh):
+            for record in files:
+                yield record
+    
+    @staticmethod
+    def cache_limit(limit):
+        """与 API_123pan 使用相同的缓存键"""
+        return None if limit == MAX_PAGE_SIZE else limit
+    
+    def revalidate(self, folder_id, last_file_id=None, limit=MAX_PAGE_SIZE):
+        """在后台刷新一页列表缓存，同一页同时只刷新一次"""
+        key = ListingCache.make_key(folder_id, last_file_id, self.cache_limit(limit))
+        if key in self._revalidating:
+            return
+        
+        async def task():
+            try:
+                await self.fetch_file_list(folder_id, last_file_id, limit)
+            except Exception:
+                pass
+            finally:
+                self._revalidating.pop(key, None)
+        
+        self._revalidating[key] = asyncio.ensure_future(task())
+    
+    async def fetch_file_list(self, folder_id, last_file_id=None, limit=MAX_PAGE_SIZE):
+        """从服务器获取一页文件列表并写入缓存"""
+        if not self.token:
+            raise Exception("未登录")
+        
+        request_last_file_id = last_file_id
+        generation = self.listing_cache.generation(folder_id)
+        url = f"/api/v2/file/list?parentFileId={folder_id}&limit={limit}"
+        if last_file_id:
+            url += f"&lastFileId={last_file_id}"
+        
+        data_dict = await self.request("GET", url)
+        
+        if data_dict.get("code") != 0:
+            raise Exception(data_dict.get("message", "未知错误"))
+        
+        file_list = data_dict.get("data", {}).get("fileList", [])
+        last_file_id = data_dict.get("data", {}).get("lastFileId")
+        records = [FileRecord.from_api(file) for file in file_list if file.get("trashed") != 1]
+        
+        key = ListingCache.make_key(folder_id, request_last_file_id, self.cache_limit(limit))
+        self.listing_cache.put(key, (records, last_file_id), generation)
+        if self.search_index is not None:
+            await asyncio.to_thread(self.search_index.update_page, folder_id, records, request_last_file_id, last_file_id)
+        return list(records), last_file_id
+    
+    async def get_download_url(self, file_id):
+        """获取文件下载链接"""
+        if not self.token:
+            raise Exception("未登录")
+        
+        try:
+            data_dict = await self.request("GET", f"/api/v1/file/download_info?fileId={file_id}")
+            
+            if data_dict.get("code") != 0:
+                raise Exception(data_dict.get("message", "未知错误"))
+            
+            return data_dict.get("data", {}).get("downloadUrl")
+        except Exception as e:
+            raise Exception(f"获取下载链接失败: {e}")
+    
+    async def get_access_token(self, client_id, client_secret):
+        """获取访问令牌，返回 (accessToken, expiredAt)"""
+        payload = json.dumps({
+            "clientID": client_id,
+            "clientSecret": client_secret
+        })
+        headers = {
+            'Platform': 'open_platform',
+            'Content-Type': 'application/json'
+        }
+        
+        data_dict = await self.request("POST", "/api/v1/access_token", payload, headers)
+        
+        if data_dict.get("code") != 0:
+            error_msg = data_dict.get('message', '未知错误')
+            raise Exception(f"获取token失败: {error_msg}")
+        
+        return data_dict["data"]["accessToken"], data_dict["data"]["expiredAt"]
+    
+    async def create_file(self, parent_folder_id, filename, etag, size):
+        """创建上传任务，返回接口的 data (含 reuse、fileID 或 preuploadID、sliceSize)"""
+        payload = json.dumps({
+            "parentFileID": parent_folder_id,
+            "filename": filename,
+            "etag": etag,
+            "size": size
+        })
+        data_dict = await self.request("POST", "/upload/v1/file/create", payload)
+        
+        if data_dict is None or "data" not in data_dict:
+            raise Exception(f"API返回无效响应: {data_dict}")
+        return data_dict["data"]
+    
+    async def get_upload_url(self, preupload_id, slice_no):
+        """获取分片上传地址"""
+        payload = json.dumps({
+            "preuploadID": preupload_id,
+            "sliceNo": slice_no
+        })
+        data_dict = await self.request("POST", "/upload/v1/file/get_upload_url", payload)
+        
+        if data_dict.get("code") == 0:
+            return data_dict.get("data", {}).get("presignedURL")
+        return None
+    
+    async def upload_slice(self, presigned_url, file_path, start_pos, slice_size):
+        """上传文件分片，返回HTTP状态码
+        
+        与 UploadThread 一样通过 FileWindow 流式发送，缓冲区受全局内存预算限制，结果同样由 classify_slice_result 判断。
+        """
+        # 打开文件和等待内存预算都可能阻塞，在线程池中进行
+        body = await asyncio.to_thread(FileWindow, file_path, start_pos, slice_size)
+        try:
+            headers = {
+                'Content-Type': 'application/octet-stream',
+                'Content-Length': str(len(body))
+            }
+            res = await self.transport.request("PUT", presigned_url, body, headers)
+        finally:
+            body.close()
+        return res.status
+    
+    async def complete_upload(self, preupload_id):
+        """通知服务器上传完成"""
+        payload = json.dumps({
+            "preuploadID": preupload_id
+        })
+        data_dict = await self.request("POST", "/upload/v1/file/upload_complete", payload)
+        
+        if data_dict.get("code") == 0:
+            return data_dict.get("data", {})
+        return None
+    
+    async def check_upload_result(self, preupload_id, max_retries=UPLOAD_RESULT_ATTEMPTS, retry_interval=UPLOAD_RESULT_INTERVAL):
+        """异步轮询获取上传结果，等待期间不占用线程"""
+        payload = json.dumps({
+            "preuploadID": preupload_id
+        })
+        for retry in range(max_retries):
+            data_dict = await self.request("POST", "/upload/v1/file/upload_async_result", payload)
+            
+            if data_dict.get("code") != 0:
+                return None
+            result_data = data_dict.get("data", {})
+            if result_data.get("completed", False):
+                return result_data
+            await asyncio.sleep(retry_interval)
+        return None
+    
+    async def upload_file(self, file_path, parent_folder_id="0", workers=DEFAULT_UPLOAD_WORKERS, on_progress=None):
+        """上传一个文件，返回文件ID，失败时抛出异常
+        
+        流程与 UploadThread 相同：MD5在共享的哈希线程池中计算，未完成的上传从断点继续，
+        最多 workers 个分片同时上传。on_progress(已上传分片数, 总分片数) 在事件循环中调用。
+        """
+        if not self.token:
+            raise Exception("未登录")
+        
+        name = os.path.basename(file_path)
+        stat = await asyncio.to_thread(os.stat, file_path)
+        sessions = UploadSessionStore()
+        session = await asyncio.to_thread(sessions.find, file_path, parent_folder_id, stat)
+        
+        if session is not None:
+            preupload_id = session["preuploadID"]
+            slice_size = session["sliceSize"]
+            uploaded = set(session["uploaded"])
+        else:
+            digest = await asyncio.wrap_future(get_hash_pool().submit(file_path))
+            data = await self.create_file(parent_folder_id, name, digest.md5, stat.st_size)
+            if data.get("reuse", False):
+                return str(data.get("fileID"))
+            preupload_id = data.get("preuploadID")
+            slice_size = data.get("sliceSize")
+            if not preupload_id or not slice_size:
+                raise Exception("获取上传参数失败")
+            await asyncio.to_thread(sessions.save, file_path, parent_folder_id, stat, digest.md5, preupload_id, slice_size)
+            uploaded = set()
+        
+        slices = split_slices(stat.st_size, slice_size)
+        remaining = [s for s in slices if s.slice_no not in uploaded]
+        done = len(slices) - len(remaining)
+        slots = asyncio.Semaphore(max(1, workers))
+        
+        async def upload_one(part):
+            nonlocal done
+            async with slots:
+                url = await self.get_upload_url(preupload_id, part.slice_no)
+                if not url:
+                    raise Exception(f"获取分片 {part.slice_no} 的上传地址失败，再次上传该文件将从断点继续")
+                status = await self.upload_slice(url, file_path, part.start, part.size)
+                if classify_slice_result(status) is not None:
+                    raise Exception(f"分片 {part.slice_no} 上传失败(HTTP状态码 {status})，再次上传该文件将从断点继续")
+            await asyncio.to_thread(sessions.mark_uploaded, file_path, parent_folder_id, part.slice_no)
+            done += 1
+            if on_progress:
+                on_progress(done, len(slices))
+        
+        tasks = [asyncio.ensure_future(upload_one(part)) for part in remaining]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            # 一个分片失败时取消其余分片
+            for task in tasks:
+                task.cancel()
+        
+        complete_result = await self.complete_upload(preupload_id)
+        # 服务器已接收全部分片(或会话无法完成)，不再需要续传记录
+        await asyncio.to_thread(sessions.remove, file_path, parent_folder_id)
+        if not complete_result:
+            raise Exception("完成上传请求失败")
+        if complete_result.get("async", False):
+            complete_result = await self.check_upload_result(preupload_id)
+        if not complete_result or not complete_result.get("completed", False):
+            raise Exception("文件上传可能未完成，请稍后检查")
+        return str(complete_result.get("fileID"))
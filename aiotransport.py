@@ -0,0 +1,244 @@
+import asyncio
+import ssl
+import time
+from urllib.parse import urlsplit
+from transport import Response, DEFAULT_IDLE_TIMEOUT, DEFAULT_TIMEOUT, SEND_BLOCK_SIZE
+
+DEFAULT_CONNECTIONS_PER_HOST = 100  # 每个主机同时打开的最大连接数
+MAX_HEADER_LINES = 200
+
+# 复用连接时可能遇到的"服务器已关闭连接"错误，遇到时换一个新连接重试一次
+STALE_CONNECTION_ERRORS = (
+    asyncio.IncompleteReadError,
+    ConnectionResetError,
+    ConnectionAbortedError,
+    BrokenPipeError,
+)
+
+
+class AsyncConnection:
+    """一条HTTP/1.1 keep-alive连接"""
+    
+    def __init__(self, reader, writer, timeout=DEFAULT_TIMEOUT):
+        self.reader = reader
+        self.writer = writer
+        self.timeout = timeout
+        self.released_at = 0
+    
+    @property
+    def closed(self):
+        return self.writer.is_closing() or self.reader.at_eof()
+    
+    def close(self):
+        self.writer.close()
+    
+    async def send(self, method, host, path, body, headers):
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {host}"]
+        names = {name.lower() for name in headers}
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        if body is not None and "content-length" not in names:
+            if not isinstance(body, (bytes, bytearray, memoryview)):
+                raise ValueError("文件对象作为请求体时必须给出Content-Length")
+            lines.append(f"Content-Length: {len(body)}")
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        
+        if isinstance(body, (bytes, bytearray, memoryview)):
+            self.writer.write(body)
+        elif body is not None:
+            # 文件对象按Content-Length分块发送，每块等待缓冲区排空，内存占用与文件大小无关；
+            # 读文件在线程池中进行，不阻塞事件循环
+            remaining = int(next(value for name, value in headers.items() if name.lower() == "content-length"))
+            loop = asyncio.get_running_loop()
+            while remaining > 0:
+                block = await loop.run_in_executor(None, body.read, min(SEND_BLOCK_SIZE, remaining))
+                if not block:
+                    raise ValueError("请求体比Content-Length短")
+                # FileWindow 返回的块在下次 read 时会被覆盖，新版本的 asyncio 可能不复制就放入发送缓冲区
+                self.writer.write(bytes(block))
+                remaining -= len(block)
+                await self.drain()
+        await self.drain()
+    
+    async def drain(self):
+        # 超时按每次写入计算，大分片在慢速网络上也不会整体超时
+        await asyncio.wait_for(self.writer.drain(), self.timeout)
+    
+    async def read_response(self, method):
+        """读取完整响应，返回 (Response, 连接是否需要关闭)"""
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError("服务器关闭了连接")
+        version, status, reason = (status_line.decode("latin-1").rstrip("\r\n").split(" ", 2) + [""])[:3]
+        status = int(status)
+        
+        headers = {}
+        for _ in range(MAX_HEADER_LINES):
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        
+        connection = headers.get("connection", "").lower()
+        will_close = connection == "close" or (version == "HTTP/1.0" and connection != "keep-alive")
+        
+        if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+            data = b""
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            data = await self.read_chunked()
+        elif "content-length" in headers:
+            data = await self.reader.readexactly(int(headers["content-length"]))
+        else:
+            data = await self.reader.read()
+            will_close = True
+        return Response(status, reason, headers, data), will_close
+    
+    async def read_chunked(self):
+        chunks = []
+        while True:
+            size_line = await self.reader.readline()
+            size = int(size_line.split(b";", 1)[0].strip(), 16)
+            if size == 0:
+                # 跳过trailer
+                while (await self.reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                return b"".join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readexactly(2)
+
+
+class AsyncConnectionPool:
+    """单个主机的连接池，限制同时打开的连接数"""
+    
+    def __init__(self, scheme, host, port, connections=DEFAULT_CONNECTIONS_PER_HOST,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT, timeout=DEFAULT_TIMEOUT, ssl_context=None):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+        self.host_header = host if port in (80, 443) else f"{host}:{port}"
+        self.slots = asyncio.Semaphore(connections)
+        self._idle = []  # 后进先出
+        
+        # 统计信息
+        self.created = 0
+        self.reused = 0
+    
+    async def new_connection(self):
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(
+                self.host, self.port,
+                ssl=self.ssl_context if self.scheme == "https" else None,
+                server_hostname=self.host if self.scheme == "https" else None
+            ),
+            self.timeout
+        )
+        self.created += 1
+        return AsyncConnection(reader, writer, self.timeout)
+    
+    async def acquire(self):
+        """取出一个连接，返回 (连接, 是否为复用的连接)，调用前需已占用 slots"""
+        now = time.monotonic()
+        while self._idle:
+            conn = self._idle.pop()
+            if now - conn.released_at > self.idle_timeout or conn.closed:
+                conn.close()
+                continue
+            self.reused += 1
+            return conn, True
+        return await self.new_connection(), False
+    
+    def release(self, conn, reusable=True):
+        if reusable and not conn.closed:
+            conn.released_at = time.monotonic()
+            self._idle.append(conn)
+        else:
+            conn.close()
+    
+    def close(self):
+        idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+class AsyncTransport:
+    """asyncio版本的传输层，在一个事件循环中复用各主机的keep-alive连接
+    
+    只使用标准库实现HTTP/1.1，不依赖aiohttp。必须在同一个事件循环中使用。
+    """
+    
+    def __init__(self, connections_per_host=DEFAULT_CONNECTIONS_PER_HOST, idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                 timeout=DEFAULT_TIMEOUT, ssl_context=None):
+        self.connections_per_host = connections_per_host
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.ssl_context = ssl_context or ssl.create_default_context()
+        self._pools = {}
+    
+    def get_pool(self, scheme, host, port=None):
+        """获取(或创建)指定主机的连接池"""
+        if port is None:
+            port = 443 if scheme == "https" else 80
+        key = (scheme, host, port)
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = AsyncConnectionPool(
+                scheme, host, port,
+                connections=self.connections_per_host,
+                idle_timeout=self.idle_timeout,
+                timeout=self.timeout,
+                ssl_context=self.ssl_context
+            )
+            self._pools[key] = pool
+        return pool
+    
+    async def request(self, method, url, body=None, headers=None):
+        """发送请求并读取完整响应，参数与 Transport.request 相同"""
+        parts = urlsplit(url)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        pool = self.get_pool(parts.scheme or "https", parts.hostname, parts.port)
+        body_start = body.tell() if hasattr(body, "tell") else None
+        
+        async with pool.slots:
+            conn, reused = await pool.acquire()
+            try:
+                response, will_close = await self._send(conn, method, pool.host_header, path, body, headers)
+            except STALE_CONNECTION_ERRORS:
+                pool.release(conn, reusable=False)
+                if not reused:
+                    raise
+                # 服务器已关闭空闲连接，换新连接重试一次
+                if body_start is not None:
+                    body.seek(body_start)
+                conn = await pool.new_connection()
+                try:
+                    response, will_close = await self._send(conn, method, pool.host_header, path, body, headers)
+                except BaseException:
+                    pool.release(conn, reusable=False)
+                    raise
+            except BaseException:
+                # 包括任务被取消，连接上可能残留未读完的响应
+                pool.release(conn, reusable=False)
+                raise
+            pool.release(conn, reusable=not will_close)
+        return response
+    
+    async def _send(self, conn, method, host, path, body, headers):
+        await conn.send(method, host, path, body, headers or {})
+        return await asyncio.wait_for(conn.read_response(method), self.timeout)
+    
+    def stats(self):
+        """各主机的连接统计 {(scheme, host, port): {...}}"""
+        return {key: {"created": pool.created, "reused": pool.reused} for key, pool in self._pools.items()}
+    
+    def close(self):
+        """关闭所有空闲连接"""
+        pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            pool.close()
@@ -1,16 +1,47 @@
-import http.client
 import json
-from utils import format_file_size
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from cache import ListingCache, DownloadUrlCache
+from ratelimit import get_request_scheduler
+from records import FileRecord
+
+MAX_PAGE_SIZE = 100  # 文件列表接口每页最多返回的文件数
+LAST_PAGE = -1  # lastFileId 为 -1 表示没有下一页
+URL_PREFETCH_WORKERS = 4  # 同时预取下载链接的请求数
 
 class API_123pan:
     BASE_URL = "open-api.123pan.com"
+    SCHEME = "https"
     
-    def __init__(self, token=None):
+    def __init__(self, token=None, transport=None, listing_cache=None, stale_while_revalidate=True, search_index=None,
+                 url_cache=None, scheduler=None):
         self.token = token
+        self.transport = transport
+        self.listing_cache = listing_cache or ListingCache()
+        self.url_cache = url_cache or DownloadUrlCache()
+        self.scheduler = scheduler  # 按接口限速的请求调度器，为空时使用全局共享的
+        self._url_futures = {}  # 文件ID -> 正在预取下载链接的Future
+        self._url_lock = threading.Lock()
+        self._url_pool = ThreadPoolExecutor(max_workers=URL_PREFETCH_WORKERS, thread_name_prefix="download-url")
+        self.search_index = search_index  # 每次从服务器获取列表后更新
+        self.stale_while_revalidate = stale_while_revalidate  # 缓存过期时先返回旧列表，后台刷新
+        self._revalidating = set()
+        self._revalidate_lock = threading.Lock()
+        self._revalidate_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="revalidate")
+        self._prefetch_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="list-prefetch")
     
-    def set_token(self, token):
-        """设置访问令牌"""
+    def set_token(self, token, account=None):
+        """设置访问令牌，account 为账号标识(clientID)，搜索索引按账号分别保存"""
         self.token = token
+        # 切换账号后旧的列表缓存和下载链接不再可用
+        self.listing_cache.clear()
+        self.url_cache.clear()
+        if self.search_index is not None:
+            self.search_index.set_account(account)
+    
+    def invalidate_folder(self, folder_id):
+        """文件夹内容变化(上传、删除、移动)后清除其列表缓存"""
+        self.listing_cache.invalidate(folder_id)
     
     def get_headers(self):
         """获取请求头"""
@@ -22,18 +53,18 @@ class API_123pan:
             headers['Authorization'] = self.token
         return headers
     
+    def request(self, method, path, payload="", headers=None):
+        """通过共享连接池发送请求，按接口限速，被限流时退避重试，返回解析后的JSON"""
+        scheduler = self.scheduler or get_request_scheduler()
+        url = f"{self.SCHEME}://{self.BASE_URL}{path}"
+        return scheduler.send(method, url, payload, headers if headers is not None else self.get_headers(), self.transport)
+    
     def get_user_info(self):
         """获取用户信息"""
         if not self.token:
             raise Exception("未登录")
             
-        conn = http.client.HTTPSConnection(self.BASE_URL)
-        headers = self.get_headers()
-        
-        conn.request("GET", "/api/v1/user/info", "", headers)
-        res = conn.getresponse()
-        data = res.read()
-        data_dict = json.loads(data)
+        data_dict = self.request("GET", "/api/v1/user/info")
         
         if data_dict.get("code") != 0:
             raise Exception(data_dict.get("message", "未知错误"))
@@ -43,22 +74,85 @@ class API_123pan:
         directTraffic = (data_dict["data"]["directTraffic"])/1073741824
         return spaceUsed, spacePermanent, directTraffic
     
-    def get_file_list(self, folder_id, last_file_id=None):
-        """获取指定文件夹的文件列表"""
+    def get_file_list(self, folder_id, last_file_id=None, refresh=False, limit=MAX_PAGE_SIZE):
+        """获取指定文件夹的文件列表，返回 ([FileRecord], lastFileId)，优先使用缓存，refresh=True时强制从服务器获取"""
+        if not self.token:
+            raise Exception("未登录")
+        
+        key = ListingCache.make_key(folder_id, last_file_id, self.cache_limit(limit))
+        if not refresh:
+            cached = self.listing_cache.get(key)
+            if cached:
+                (files, next_file_id), fresh = cached
+                if not fresh:
+                    if not self.stale_while_revalidate:
+                        return self.fetch_file_list(folder_id, last_file_id, limit)
+                    self.revalidate(folder_id, last_file_id, limit)
+                return list(files), next_file_id
+        
+        return self.fetch_file_list(folder_id, last_file_id, limit)
+    
+    def iter_folder_pages(self, folder_id, page_size=MAX_PAGE_SIZE, refresh=False, last_file_id=None):
+        """逐页返回文件夹中的全部文件，给出 last_file_id 时从该游标之后开始
+        
+        处理当前页时已在后台请求下一页，列出整个文件夹每页只需等待约一次往返。
+        调用方提前结束迭代(break 或 close())时取消尚未发出的预取。
+        """
+        page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+        pending = self._prefetch_pool.submit(self.get_file_list, folder_id, last_file_id, refresh, page_size)
+        try:
+            while pending is not None:
+                files, last_file_id = pending.result()
+                pending = None
+                if last_file_id and last_file_id != LAST_PAGE:
+                    pending = self._prefetch_pool.submit(self.get_file_list, folder_id, last_file_id, refresh, page_size)
+                if files:
+                    yield files
+        finally:
+            if pending is not None:
+                pending.cancel()
+    
+    def iter_folder(self, folder_id, page_size=MAX_PAGE_SIZE, refresh=False):
+        """逐个返回文件夹中的全部 FileRecord，分页和预取同 iter_folder_pages"""
+        for files in self.iter_folder_pages(folder_id, page_size, refresh):
+            yield from files
+    
+    @staticmethod
+    def cache_limit(limit):
+        """默认每页条数的缓存键不带 limit，与按钮翻页共用缓存"""
+        return None if limit == MAX_PAGE_SIZE else limit
+    
+    def revalidate(self, folder_id, last_file_id=None, limit=MAX_PAGE_SIZE):
+        """在后台刷新一页列表缓存，同一页同时只刷新一次"""
+        key = ListingCache.make_key(folder_id, last_file_id, self.cache_limit(limit))
+        with self._revalidate_lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+        
+        def task():
+            try:
+                self.fetch_file_list(folder_id, last_file_id, limit)
+            except Exception:
+                pass
+            finally:
+                with self._revalidate_lock:
+                    self._revalidating.discard(key)
+        
+        self._revalidate_pool.submit(task)
+    
+    def fetch_file_list(self, folder_id, last_file_id=None, limit=MAX_PAGE_SIZE):
+        """从服务器获取一页文件列表并写入缓存"""
         if not self.token:
             raise Exception("未登录")
-            
-        conn = http.client.HTTPSConnection(self.BASE_URL)
-        headers = self.get_headers()
         
-        url = f"/api/v2/file/list?parentFileId={folder_id}&limit=100"
+        request_last_file_id = last_file_id
+        generation = self.listing_cache.generation(folder_id)
+        url = f"/api/v2/file/list?parentFileId={folder_id}&limit={limit}"
         if last_file_id:
             url += f"&lastFileId={last_file_id}"
             
-        conn.request("GET", url, "", headers)
-        res = conn.getresponse()
-        data = res.read()
-        data_dict = json.loads(data)
+        data_dict = self.request("GET", url)
         
         if data_dict.get("code") != 0:
             raise Exception(data_dict.get("message", "未知错误"))
@@ -66,62 +160,115 @@ class API_123pan:
         file_list = data_dict.get("data", {}).get("fileList", [])
         last_file_id = data_dict.get("data", {}).get("lastFileId")
         
-        # 处理文件列表数据
-        processed_files = []
-        for file in file_list:
-            # 跳过已删除的文件
-            if file.get("trashed") == 1:
-                continue
-                
-            file_type = "文件夹" if file.get("type") == 1 else "文件"
-            category_map = {0: "未知", 1: "音频", 2: "视频", 3: "图片"}
-            category = category_map.get(file.get("category", 0), "未知")
-            file_status = "正常" if file.get("status") <= 100 else "驳回"
-            
-            # 计算文件大小的可读形式
-            size = file.get("size", 0)
-            size_str = format_file_size(size)
-            
-            processed_file = {
-                "fileId": file.get("fileId"),
-                "filename": file.get("filename"),
-                "type": file_type,
-                "size": size_str,
-                "raw_size": size,
-                "etag": file.get("etag"),
-                "status": file_status,
-                "parentFileId": file.get("parentFileId"),
-                "category": category,
-                "trashed": "否"  # 已经过滤掉了trashed=1的文件
-            }
-            processed_files.append(processed_file)
-        
-        return processed_files, last_file_id
-    
-    def get_download_url(self, file_id):
-        """获取文件下载链接"""
+        # 跳过已删除的文件，显示用的文字由 FileRecord 在需要时生成
+        records = [FileRecord.from_api(file) for file in file_list if file.get("trashed") != 1]
+        
+        key = ListingCache.make_key(folder_id, request_last_file_id, self.cache_limit(limit))
+        self.listing_cache.put(key, (records, last_file_id), generation)
+        if self.search_index is not None:
+            self.search_index.update_page(folder_id, records, request_last_file_id, last_file_id)
+        return list(records), last_file_id
+    
+    def get_download_url(self, file_id, refresh=False):
+        """获取文件下载链接，优先使用未过期的缓存或正在进行的预取，refresh=True时丢弃缓存重新获取"""
         if not self.token:
             raise Exception("未登录")
-            
-        conn = http.client.HTTPSConnection(self.BASE_URL)
-        headers = self.get_headers()
         
+        file_id = str(file_id)
+        if refresh:
+            self.url_cache.invalidate(file_id)
+        else:
+            url = self.url_cache.get(file_id)
+            if url:
+                return url
+            with self._url_lock:
+                future = self._url_futures.get(file_id)
+            if future is not None:
+                try:
+                    return future.result()
+                except Exception:
+                    pass  # 预取失败时再请求一次
+        return self.fetch_download_url(file_id)
+    
+    def fetch_download_url(self, file_id):
+        """从服务器获取下载链接并写入缓存"""
         try:
-            conn.request("GET", f"/api/v1/file/download_info?fileId={file_id}", "", headers)
-            res = conn.getresponse()
-            data = res.read()
-            data_dict = json.loads(data)
+            data_dict = self.request("GET", f"/api/v1/file/download_info?fileId={file_id}")
             
             if data_dict.get("code") != 0:
                 raise Exception(data_dict.get("message", "未知错误"))
             
-            return data_dict.get("data", {}).get("downloadUrl")
+            url = data_dict.get("data", {}).get("downloadUrl")
         except Exception as e:
             raise Exception(f"获取下载链接失败: {e}")
+        if url:
+            self.url_cache.put(file_id, url)
+        return url
+    
+    def prefetch_download_urls(self, file_ids):
+        """在后台并发获取多个文件的下载链接，已缓存或正在获取的跳过，返回新提交的数量
+        
+        请求速率受请求调度器中 download_info 接口的限制，结果写入缓存，之后 get_download_url 直接返回。
+        """
+        if not self.token:
+            return 0
+        submitted = {}
+        with self._url_lock:
+            for file_id in map(str, file_ids):
+                if file_id in self._url_futures or file_id in submitted or file_id in self.url_cache:
+                    continue
+                submitted[file_id] = self._url_futures[file_id] = self._url_pool.submit(self.fetch_download_url, file_id)
+        # 在锁外注册回调，已完成的Future会在当前线程立即执行回调
+        for file_id, future in submitted.items():
+            future.add_done_callback(lambda future, file_id=file_id: self._forget_url_future(file_id, future))
+        return len(submitted)
+    
+    def _forget_url_future(self, file_id, future):
+        with self._url_lock:
+            if self._url_futures.get(file_id) is future:
+                del self._url_futures[file_id]
+    
+    def mkdir(self, name, parent_id="0"):
+        """在指定文件夹下创建文件夹，返回新文件夹ID"""
+        if not self.token:
+            raise Exception("未登录")
+        
+        payload = json.dumps({
+            "name": name,
+            "parentID": parent_id
+        })
+        data_dict = self.request("POST", "/upload/v1/file/mkdir", payload)
+        
+        if data_dict.get("code") != 0:
+            raise Exception(data_dict.get("message", "未知错误"))
+        
+        self.invalidate_folder(parent_id)
+        return str(data_dict["data"]["dirID"])
+    
+    def create_file(self, parent_folder_id, filename, etag, size):
+        """创建上传任务，返回接口的 data (含 reuse、fileID 或 preuploadID、sliceSize)
+        
+        reuse 为真时服务器已有相同内容的文件(秒传)，不需要再上传任何数据。
+        """
+        if not self.token:
+            raise Exception("未登录")
+        
+        payload = json.dumps({
+            "parentFileID": parent_folder_id,
+            "filename": filename,
+            "etag": etag,
+            "size": size
+        })
+        data_dict = self.request("POST", "/upload/v1/file/create", payload)
+        
+        if data_dict is None or "data" not in data_dict:
+            raise Exception(f"API返回无效响应: {data_dict}")
+        if data_dict.get("code", 0) != 0:
+            raise Exception(data_dict.get("message", "未知错误"))
+        return data_dict["data"]
     
     def get_access_token(self, client_id, client_secret):
         """获取访问令牌"""
-        conn = http.client.HTTPSConnection(self.BASE_URL)
         payload = json.dumps({
             "clientID": client_id,
             "clientSecret": client_secret
@@ -131,10 +278,7 @@ class API_123pan:
             'Content-Type': 'application/json'
         }
         
-        conn.request("POST", "/api/v1/access_token", payload, headers)
-        res = conn.getresponse()
-        data = res.read()
-        data_dict = json.loads(data)
+        data_dict = self.request("POST", "/api/v1/access_token", payload, headers)
         
         # 检查API返回是否成功
         if data_dict.get("code") != 0:
@@ -54,12 +54,13 @@ class AuthManager:
                     token_data = json.load(f)
                     access_token = token_data.get("accessToken")
                     expired_at = token_data.get("expiredAt")
+                    client_id = token_data.get("clientId")
                     
                     # 检查token是否有效
                     if access_token and check_token_validity(expired_at):
                         self.token = access_token
                         self.expired_at = expired_at
-                        self.api.set_token(access_token)
+                        self.api.set_token(access_token, client_id)
                         return True, get_remaining_time(expired_at)
             except Exception as e:
                 return False, f"读取本地token出错: {e}"
@@ -72,12 +73,12 @@ class AuthManager:
             access_token, expired_at = self.api.get_access_token(client_id, client_secret)
             
             # 保存token
-            save_token(access_token, expired_at)
+            save_token(access_token, expired_at, client_id)
             
             # 更新当前token
             self.token = access_token
             self.expired_at = expired_at
-            self.api.set_token(access_token)
+            self.api.set_token(access_token, client_id)
             
             return True, f"登录成功，token有效期: {get_remaining_time(expired_at)}"
         except Exception as e:
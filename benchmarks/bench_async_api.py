@@ -0,0 +1,85 @@
+"""对比线程池+API_123pan 与单个事件循环+AsyncAPI_123pan 同时发出大量列表请求的耗时和线程数
+
+本地服务器每个请求加入 --latency-ms 的延迟(模拟高延迟链路)，共发出 --requests 个请求，
+同时进行的请求数为 --concurrency。同步客户端每个并发请求占用一个线程，异步客户端只用一个线程。
+    
+    python benchmarks/bench_async_api.py --requests 5000 --concurrency 1000 --latency-ms 300
+"""
+import argparse
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from stand_in import StandInServer
+from bench_iter_folder import ListHandler
+from aioapi import AsyncAPI_123pan
+from aiotransport import AsyncTransport
+from api import API_123pan
+from cache import ListingCache
+from transport import Transport
+from ratelimit import configure_request_scheduler
+
+
+class BacklogServer(StandInServer):
+    # 同时到达的连接很多，默认的监听队列会让部分连接超时重试
+    request_queue_size = 4096
+
+
+def run_threads(server, requests, concurrency):
+    api = API_123pan("token", transport=Transport(pool_size=concurrency), listing_cache=ListingCache(max_entries=0))
+    api.SCHEME = "http"
+    api.BASE_URL = server.host
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bench-sync") as executor:
+        futures = [executor.submit(api.fetch_file_list, str(folder_id)) for folder_id in range(requests)]
+        files = sum(len(future.result()[0]) for future in futures)
+        # 工作线程在线程池关闭前一直存在
+        threads = sum(1 for thread in threading.enumerate() if thread.name.startswith("bench-sync"))
+    api.transport.close()
+    return files, threads
+
+
+async def run_async(server, requests, concurrency):
+    api = AsyncAPI_123pan("token", transport=AsyncTransport(connections_per_host=concurrency),
+                          listing_cache=ListingCache(max_entries=0))
+    api.SCHEME = "http"
+    api.BASE_URL = server.host
+    pages = await asyncio.gather(*(api.fetch_file_list(str(folder_id)) for folder_id in range(requests)))
+    await api.close()
+    return sum(len(files) for files, _ in pages), 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000, help="请求总数")
+    parser.add_argument("--concurrency", type=int, default=1000, help="同时进行的请求数")
+    parser.add_argument("--latency-ms", type=float, default=300, help="每个请求的服务器延迟(毫秒)")
+    parser.add_argument("--files", type=int, default=20, help="每页的文件数")
+    args = parser.parse_args()
+    # 本地服务器不会限流，不按接口限速
+    configure_request_scheduler(limits={}, default_qps=0)
+    
+    ListHandler.files = args.files
+    ListHandler.latency = args.latency_ms / 1000
+    ideal = args.requests / args.concurrency * args.latency_ms / 1000
+    print(f"{args.requests} 个请求，并发 {args.concurrency}，延迟 {args.latency_ms:.0f} ms，理想耗时约 {ideal:.2f} s")
+    
+    server = BacklogServer(ListHandler).start()
+    try:
+        for name, run in (("线程池", lambda: run_threads(server, args.requests, args.concurrency)),
+                          ("asyncio", lambda: asyncio.run(run_async(server, args.requests, args.concurrency)))):
+            server.reset_counters()
+            started = time.perf_counter()
+            cpu_started = time.process_time()
+            files, threads = run()
+            elapsed = time.perf_counter() - started
+            assert files == args.requests * args.files, files
+            print(f"{name:<8} 耗时 {elapsed:6.2f} s  {args.requests / elapsed:7.0f} 请求/秒  "
+                  f"客户端线程 {threads:>5}  连接 {server.connections:>5}  "
+                  f"进程CPU {time.process_time() - cpu_started:6.2f} s(含本地服务器)")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
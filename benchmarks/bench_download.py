@@ -0,0 +1,98 @@
+"""对比单连接下载与分段并行下载的吞吐量
+
+本地服务器对每个连接限速，模拟单条TCP流的带宽上限。
+    
+    python benchmarks/bench_download.py --size-mb 64 --stream-mbps 16
+"""
+import argparse
+import os
+import re
+import tempfile
+import time
+
+from stand_in import StandInHandler, StandInServer
+from downloader import SegmentedDownloader
+from utils import format_file_size
+
+RANGE_PATTERN = re.compile(r"bytes=(\d+)-(\d*)")
+
+
+class RangeHandler(StandInHandler):
+    """支持Range请求、按连接限速的文件服务"""
+    blob = b""
+    stream_rate = 16 * 1024 * 1024  # 每个连接的字节/秒
+    honor_range = True
+    
+    def do_GET(self):
+        self.server.count_request()
+        total = len(self.blob)
+        start, end = 0, total - 1
+        match = RANGE_PATTERN.match(self.headers.get("Range", ""))
+        if self.honor_range and match:
+            start = int(match.group(1))
+            end = min(int(match.group(2)) if match.group(2) else total - 1, total - 1)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{total}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes" if self.honor_range else "none")
+        self.end_headers()
+        
+        # 按固定速率分块发送
+        block = 64 * 1024
+        began = time.perf_counter()
+        sent = 0
+        try:
+            for offset in range(start, end + 1, block):
+                chunk = self.blob[offset:min(offset + block, end + 1)]
+                self.wfile.write(chunk)
+                sent += len(chunk)
+                delay = sent / self.stream_rate - (time.perf_counter() - began)
+                if delay > 0:
+                    time.sleep(delay)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def run(server, segments, save_path):
+    downloader = SegmentedDownloader(f"{server.url}/file", save_path, segments=segments, min_segment_size=1024 * 1024)
+    start = time.perf_counter()
+    downloader.run()
+    elapsed = time.perf_counter() - start
+    with open(save_path, "rb") as f:
+        assert f.read() == RangeHandler.blob, "下载内容不一致"
+    return elapsed, downloader.supports_range
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=64, help="测试文件大小(MB)")
+    parser.add_argument("--stream-mbps", type=float, default=16, help="每个连接的限速(MB/s)")
+    parser.add_argument("--segments", type=int, nargs="+", default=[1, 2, 4, 8], help="要测试的分段数")
+    args = parser.parse_args()
+    
+    RangeHandler.blob = os.urandom(args.size_mb * 1024 * 1024)
+    RangeHandler.stream_rate = args.stream_mbps * 1024 * 1024
+    server = StandInServer(RangeHandler).start()
+    save_path = os.path.join(tempfile.mkdtemp(prefix="123pan_bench_"), "download.bin")
+    size = len(RangeHandler.blob)
+    
+    try:
+        for segments in args.segments:
+            elapsed, ranged = run(server, segments, save_path)
+            print(f"分段数 {segments:>2}  Range {'是' if ranged else '否'}  耗时 {elapsed:6.2f}s  "
+                  f"吞吐 {format_file_size(size / elapsed)}/s")
+        
+        # 服务器忽略Range时应退回单连接
+        RangeHandler.honor_range = False
+        elapsed, ranged = run(server, max(args.segments), save_path)
+        print(f"忽略Range  分段数 {max(args.segments):>2}  Range {'是' if ranged else '否'}  耗时 {elapsed:6.2f}s  "
+              f"吞吐 {format_file_size(size / elapsed)}/s")
+    finally:
+        server.stop()
+        os.remove(save_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""对比逐个获取下载链接与批量预取+缓存的耗时，并检查获取下载链接的请求速率
+
+本地服务器的 /api/v1/file/download_info 每个请求加入 --latency-ms 的延迟。
+分别测试逐个调用 get_download_url、先 prefetch_download_urls 再逐个取用，以及再次取用(全部命中缓存)。
+    
+    python benchmarks/bench_download_urls.py --files 100 --qps 20 --latency-ms 150
+"""
+import argparse
+import json
+import threading
+import time
+from urllib.parse import urlparse, parse_qs
+
+from stand_in import StandInHandler, StandInServer
+from api import API_123pan
+from cache import DownloadUrlCache
+from ratelimit import RequestScheduler
+
+
+class DownloadInfoHandler(StandInHandler):
+    latency = 0.15
+    times = []
+    lock = threading.Lock()
+    
+    def do_GET(self):
+        self.server.count_request()
+        with self.lock:
+            self.times.append(time.monotonic())
+        file_id = parse_qs(urlparse(self.path).query)["fileId"][0]
+        time.sleep(self.latency)
+        url = f"{self.server.url}/blob/{file_id}?expires={int(time.time()) + 3600}"
+        self.send_body(json.dumps({"code": 0, "data": {"downloadUrl": url}}).encode())
+
+
+def max_rate():
+    """任意1秒窗口内的最多请求数"""
+    times = sorted(DownloadInfoHandler.times)
+    best = 0
+    start = 0
+    for end, now in enumerate(times):
+        while now - times[start] >= 1:
+            start += 1
+        best = max(best, end - start + 1)
+    return best
+
+
+def make_api(server, qps):
+    scheduler = RequestScheduler(limits={"/api/v1/file/download_info": qps})
+    api = API_123pan("token", url_cache=DownloadUrlCache(), scheduler=scheduler)
+    api.SCHEME = "http"
+    api.BASE_URL = server.host
+    return api
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=100, help="文件数")
+    parser.add_argument("--qps", type=float, default=20, help="获取下载链接的请求速率上限")
+    parser.add_argument("--latency-ms", type=float, default=150, help="每个请求的服务器延迟(毫秒)")
+    args = parser.parse_args()
+    DownloadInfoHandler.latency = args.latency_ms / 1000
+    
+    file_ids = list(range(1, args.files + 1))
+    server = StandInServer(DownloadInfoHandler).start()
+    try:
+        def measure(name, api, fn):
+            server.reset_counters()
+            DownloadInfoHandler.times = []
+            started = time.perf_counter()
+            fn(api)
+            elapsed = time.perf_counter() - started
+            print(f"{name:<8} 耗时 {elapsed:6.2f} s  {server.requests:>4} 次请求  每秒最多 {max_rate():>3} 次")
+        
+        def serial(api):
+            for file_id in file_ids:
+                assert api.get_download_url(file_id)
+        
+        def prefetched(api):
+            api.prefetch_download_urls(file_ids)
+            for file_id in file_ids:
+                assert api.get_download_url(file_id)
+        
+        print(f"{args.files} 个文件，服务器延迟 {args.latency_ms:.0f} ms，速率上限 {args.qps:g} 次/秒")
+        measure("逐个获取", make_api(server, args.qps), serial)
+        api = make_api(server, args.qps)
+        measure("批量预取", api, prefetched)
+        measure("命中缓存", api, serial)
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""对比 QTableWidget 逐行插入与 FileTableModel 按页批量插入大文件夹的耗时和内存
+
+每种方式在独立子进程中运行(使用offscreen平台，无需显示器)，
+按每页100条追加合成的文件记录，每页之后处理一次事件循环，与界面翻页时的行为一致。
+    
+    python benchmarks/bench_file_model.py --rows 200000
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+# 基准测试脚本从仓库根目录导入客户端模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PAGE_SIZE = 100
+
+
+def make_page(start, count):
+    """生成一页与 API_123pan.get_file_list 返回格式相同的文件"""
+    from records import FileRecord
+    files = []
+    for file_id in range(start, start + count):
+        is_folder = file_id % 10 == 0
+        files.append(FileRecord(
+            10000000 + file_id,
+            f"文件_{file_id:07d}.bin",
+            type=1 if is_folder else 0,
+            size=0 if is_folder else file_id * 37 % (1 << 30),
+            etag="" if is_folder else f"{file_id:032x}",
+        ))
+    return files
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+
+
+def child(mode, rows):
+    """子进程：加载 rows 行，输出 插入耗时(秒) 增加的RSS(MB) 清空耗时(秒)"""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PySide6.QtWidgets import QApplication, QTableWidget, QTableWidgetItem, QTableView, QHeaderView
+    
+    app = QApplication([])
+    if mode == "widget":
+        # 原实现：每个单元格一个 QTableWidgetItem，逐行 insertRow
+        table = QTableWidget(0, 7)
+        
+        def append_files(files):
+            current_row_count = table.rowCount()
+            for row, file in enumerate(files):
+                row_index = current_row_count + row
+                table.insertRow(row_index)
+                table.setItem(row_index, 0, QTableWidgetItem(str(file.file_id)))
+                table.setItem(row_index, 1, QTableWidgetItem(file.filename))
+                table.setItem(row_index, 2, QTableWidgetItem(file.type_label))
+                table.setItem(row_index, 3, QTableWidgetItem(file.size_label))
+                table.setItem(row_index, 4, QTableWidgetItem(file.category_label))
+                table.setItem(row_index, 5, QTableWidgetItem(file.status_label))
+                table.setItem(row_index, 6, QTableWidgetItem(file.etag or ""))
+        
+        def clear():
+            table.setRowCount(0)
+    else:
+        from models import FileTableModel
+        model = FileTableModel()
+        table = QTableView()
+        table.setModel(model)
+        # 与 MainWindow.create_file_table 相同的固定行高设置
+        table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        table.verticalHeader().setDefaultSectionSize(table.fontMetrics().height() + 12)
+        append_files = model.append_files
+        clear = model.clear
+    table.verticalHeader().setVisible(False)
+    table.resize(1000, 700)
+    table.show()
+    app.processEvents()
+    
+    # 页数据在计时前生成，只统计插入表格的开销
+    pages = [make_page(start, min(PAGE_SIZE, rows - start)) for start in range(0, rows, PAGE_SIZE)]
+    base_rss = rss_mb()
+    started = time.perf_counter()
+    for page in pages:
+        append_files(page)
+        app.processEvents()
+    elapsed = time.perf_counter() - started
+    del pages
+    rss = rss_mb() - base_rss
+    
+    # 切换文件夹时清空表格
+    started = time.perf_counter()
+    clear()
+    app.processEvents()
+    print(elapsed, rss, time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000, help="加载的文件数")
+    parser.add_argument("--modes", nargs="+", default=["widget", "model"], choices=["widget", "model"])
+    args = parser.parse_args()
+    
+    for mode in args.modes:
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", mode, str(args.rows)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        elapsed, rss, clear_elapsed = (float(value) for value in output.split()[-3:])
+        name = "QTableWidget" if mode == "widget" else "FileTableModel"
+        print(f"{name:<15} {args.rows} 行  插入耗时 {elapsed:7.2f} s  "
+              f"每页 {elapsed / max(1, -(-args.rows // PAGE_SIZE)) * 1000:7.2f} ms  RSS增加 {rss:7.1f} MB  "
+              f"清空耗时 {clear_elapsed * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        child(sys.argv[2], int(sys.argv[3]))
+    else:
+        main()
@@ -0,0 +1,120 @@
+"""对比把文件列表接口返回的文件转换为字典与 FileRecord 的耗时和内存
+
+先生成与 /api/v2/file/list 格式相同的JSON分页，解析后分别用原来的字典转换和
+FileRecord.from_api 建立 --files 个文件的索引，用tracemalloc统计保留的内存。
+    
+    python benchmarks/bench_file_records.py --files 100000
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+# 基准测试脚本从仓库根目录导入客户端模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from records import FileRecord
+from utils import format_file_size
+
+PAGE_SIZE = 100
+
+
+def make_pages(files):
+    """生成接口返回的JSON分页"""
+    pages = []
+    for start in range(0, files, PAGE_SIZE):
+        file_list = []
+        for file_id in range(start, min(start + PAGE_SIZE, files)):
+            is_folder = file_id % 10 == 0
+            file_list.append({
+                "fileId": 10000000 + file_id,
+                "filename": f"文件_{file_id:07d}.bin",
+                "type": 1 if is_folder else 0,
+                "size": 0 if is_folder else file_id * 37 % (1 << 30),
+                "etag": "" if is_folder else f"{file_id:032x}",
+                "status": 0,
+                "parentFileId": 0,
+                "category": file_id % 4,
+                "trashed": 0,
+            })
+        pages.append(json.dumps({"code": 0, "data": {"lastFileId": -1, "fileList": file_list}}))
+    return pages
+
+
+def to_dicts(file_list):
+    """原实现：每个文件一个十个键的字典，显示文字和大小提前生成"""
+    processed_files = []
+    for file in file_list:
+        if file.get("trashed") == 1:
+            continue
+        file_type = "文件夹" if file.get("type") == 1 else "文件"
+        category_map = {0: "未知", 1: "音频", 2: "视频", 3: "图片"}
+        category = category_map.get(file.get("category", 0), "未知")
+        file_status = "正常" if file.get("status") <= 100 else "驳回"
+        size = file.get("size", 0)
+        size_str = format_file_size(size)
+        processed_files.append({
+            "fileId": file.get("fileId"),
+            "filename": file.get("filename"),
+            "type": file_type,
+            "size": size_str,
+            "raw_size": size,
+            "etag": file.get("etag"),
+            "status": file_status,
+            "parentFileId": file.get("parentFileId"),
+            "category": category,
+            "trashed": "否"
+        })
+    return processed_files
+
+
+def to_records(file_list):
+    return [FileRecord.from_api(file) for file in file_list if file.get("trashed") != 1]
+
+
+def build_index(pages, convert):
+    """返回 (索引, 解析+转换耗时, 其中转换耗时)"""
+    index = []
+    convert_time = 0
+    started = time.perf_counter()
+    for page in pages:
+        file_list = json.loads(page)["data"]["fileList"]
+        convert_started = time.perf_counter()
+        index.extend(convert(file_list))
+        convert_time += time.perf_counter() - convert_started
+        del file_list
+    return index, time.perf_counter() - started, convert_time
+
+
+def measure(pages, convert):
+    """返回 (解析+转换耗时, 转换耗时, 保留的内存MB)，耗时在关闭tracemalloc时测量"""
+    gc.collect()
+    index, elapsed, convert_time = build_index(pages, convert)
+    del index
+    gc.collect()
+    tracemalloc.start()
+    index = build_index(pages, convert)[0]
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del index
+    return elapsed, convert_time, retained / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=100000, help="文件数")
+    args = parser.parse_args()
+    
+    pages = make_pages(args.files)
+    for name, convert in (("字典", to_dicts), ("FileRecord", to_records)):
+        elapsed, convert_time, retained = measure(pages, convert)
+        print(f"{name:<10} {args.files} 个文件  解析+转换 {elapsed * 1000:8.1f} ms  "
+              f"转换 {convert_time * 1000:8.1f} ms  保留内存 {retained:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
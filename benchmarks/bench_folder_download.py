@@ -0,0 +1,157 @@
+"""测试下载整个文件夹时快速通道对小文件的作用
+
+本地服务器模拟一个文件夹：先列出 --big 个大文件(--big-mb MB，每个连接限速 --mbps MB/s)，
+再列出 --small 个小文件(--small-kb KB)，每个接口请求和下载请求加入 --latency-ms 的延迟。
+用 iter_folder_downloads 遍历文件夹加入 TransferManager，分别关闭和打开快速通道，
+输出小文件、大文件各自全部下载完的时间和全部完成的时间。
+    
+    python benchmarks/bench_folder_download.py --big 3 --big-mb 64 --small 400
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from urllib.parse import urlparse, parse_qs
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from stand_in import StandInHandler, StandInServer
+from PySide6.QtCore import QCoreApplication, QTimer
+from api import API_123pan
+from cache import ListingCache
+from transfers import TransferManager, TransferQueueStore, iter_folder_downloads, DONE, SMALL_FILE_SIZE
+from ratelimit import configure_request_scheduler
+
+BLOCK_SIZE = 64 * 1024
+
+
+class QuietServer(StandInServer):
+    def handle_error(self, request, client_address):
+        # 探测请求只读取响应头就关闭连接，忽略由此产生的连接重置
+        pass
+
+
+class FolderHandler(StandInHandler):
+    """文件ID 1..big 为大文件，其余为小文件"""
+    big = 3
+    big_size = 64 * 1024 * 1024
+    small = 400
+    small_size = 16 * 1024
+    bytes_per_second = 5 * 1024 * 1024
+    latency = 0.02
+    
+    @classmethod
+    def file_size(cls, file_id):
+        return cls.big_size if file_id <= cls.big else cls.small_size
+    
+    def do_GET(self):
+        parts = urlparse(self.path)
+        query = parse_qs(parts.query)
+        time.sleep(self.latency)
+        if parts.path == "/api/v2/file/list":
+            total = self.big + self.small
+            limit = int(query["limit"][0])
+            start = int(query.get("lastFileId", ["0"])[0])
+            end = min(start + limit, total)
+            file_list = [{"fileId": file_id, "filename": f"file_{file_id}.bin", "type": 0,
+                          "size": self.file_size(file_id), "etag": "", "status": 0, "parentFileId": 0,
+                          "category": 0, "trashed": 0} for file_id in range(start + 1, end + 1)]
+            body = {"code": 0, "data": {"lastFileId": end if end < total else -1, "fileList": file_list}}
+            return self.send_body(json.dumps(body).encode())
+        if parts.path == "/api/v1/file/download_info":
+            url = f"{self.server.url}/blob/{query['fileId'][0]}"
+            return self.send_body(json.dumps({"code": 0, "data": {"downloadUrl": url}}).encode())
+        
+        size = self.file_size(int(parts.path.rsplit("/", 1)[1]))
+        match = re.match(r"bytes=(\d+)-(\d+)", self.headers.get("Range", ""))
+        start, end = int(match.group(1)), min(int(match.group(2)), size - 1)
+        self.send_response(206)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        block = bytes(BLOCK_SIZE)
+        remaining = end - start + 1
+        try:
+            while remaining > 0:
+                n = min(BLOCK_SIZE, remaining)
+                self.wfile.write(block[:n])
+                remaining -= n
+                time.sleep(n / self.bytes_per_second)
+        except OSError:
+            pass
+
+
+def run(server, save_dir, fast_lane_slots, max_active):
+    app = QCoreApplication.instance() or QCoreApplication([])
+    api = API_123pan("token", listing_cache=ListingCache(max_entries=0))
+    api.SCHEME = "http"
+    api.BASE_URL = server.host
+    manager = TransferManager(api, max_active=max_active, fast_lane_slots=fast_lane_slots,
+                              store=TransferQueueStore(os.path.join(save_dir, "queue.json")))
+    manager.start()
+    started = time.perf_counter()
+    for batch in iter_folder_downloads(api, "0", "folder", save_dir):
+        manager.add_transfers(batch)
+    
+    times = {}
+    
+    def check():
+        transfers = list(manager.transfers.values())
+        now = time.perf_counter() - started
+        for lane, small in (("small", True), ("big", False)):
+            if lane not in times and all(t.state == DONE for t in transfers if (t.size <= SMALL_FILE_SIZE) == small):
+                times[lane] = now
+        if all(t.state == DONE for t in transfers):
+            times["all"] = now
+            app.quit()
+    
+    timer = QTimer()
+    timer.timeout.connect(check)
+    timer.start(20)
+    app.exec()
+    timer.stop()
+    return times["small"], times["big"], times["all"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--big", type=int, default=3, help="大文件数")
+    parser.add_argument("--big-mb", type=int, default=64, help="大文件大小(MB)")
+    parser.add_argument("--small", type=int, default=400, help="小文件数")
+    parser.add_argument("--small-kb", type=int, default=16, help="小文件大小(KB)")
+    parser.add_argument("--mbps", type=float, default=5, help="每个连接的速度(MB/s)")
+    parser.add_argument("--latency-ms", type=float, default=20, help="每个请求的服务器延迟(毫秒)")
+    parser.add_argument("--max-active", type=int, default=3, help="同时传输数")
+    parser.add_argument("--fast-lane", type=int, default=8, help="快速通道数")
+    args = parser.parse_args()
+    # 本地服务器不会限流，不按接口限速
+    configure_request_scheduler(limits={}, default_qps=0)
+    
+    FolderHandler.big = args.big
+    FolderHandler.big_size = args.big_mb * 1024 * 1024
+    FolderHandler.small = args.small
+    FolderHandler.small_size = args.small_kb * 1024
+    FolderHandler.bytes_per_second = args.mbps * 1024 * 1024
+    FolderHandler.latency = args.latency_ms / 1000
+    
+    server = QuietServer(FolderHandler).start()
+    try:
+        for name, slots in (("无快速通道", 0), (f"快速通道{args.fast_lane}", args.fast_lane)):
+            save_dir = tempfile.mkdtemp(prefix="123pan_bench_")
+            try:
+                small_done, big_done, all_done = run(server, save_dir, slots, args.max_active)
+                files = sum(len(names) for _, _, names in os.walk(os.path.join(save_dir, "folder")))
+                assert files == args.big + args.small, files
+            finally:
+                shutil.rmtree(save_dir)
+            print(f"{name:<8} 小文件全部完成 {small_done:6.2f} s  大文件全部完成 {big_done:6.2f} s  "
+                  f"全部完成 {all_done:6.2f} s")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
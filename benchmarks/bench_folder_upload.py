@@ -0,0 +1,139 @@
+"""对比逐个文件“计算MD5→创建上传任务”与 FolderUploader 并发流水线上传文件夹的耗时
+
+在临时目录生成 --folders 个子文件夹、共 --files 个文件(平均 --file-kb KB)，
+其中 --reuse 比例的文件内容服务器已有(创建上传任务时返回 reuse)。
+本地服务器的每个请求加入 --latency-ms 的延迟。两种方式各使用一份内容相同的新目录，哈希缓存不会命中。
+    
+    python benchmarks/bench_folder_upload.py --files 1000 --folders 20 --reuse 0.7
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+from stand_in import StandInHandler, StandInServer
+from api import API_123pan
+from cache import ListingCache
+from folderupload import FolderUploader, scan_local_tree
+from hasher import get_file_digest
+from ratelimit import configure_request_scheduler
+
+
+class UploadHandler(StandInHandler):
+    known_etags = set()
+    latency = 0.05
+    dir_ids = itertools.count(10 ** 6)
+    lock = threading.Lock()
+    
+    def do_POST(self):
+        self.server.count_request()
+        body = json.loads(self.read_body() or b"{}")
+        time.sleep(self.latency)
+        if self.path == "/upload/v1/file/mkdir":
+            with self.lock:
+                data = {"dirID": next(self.dir_ids)}
+        elif body.get("etag") in self.known_etags:
+            data = {"reuse": True, "fileID": 1}
+        else:
+            data = {"reuse": False, "preuploadID": "p", "sliceSize": 16 * 1024 * 1024}
+        self.send_body(json.dumps({"code": 0, "data": data}).encode())
+
+
+def make_tree(root, folders, files, file_kb, seed):
+    """生成目录树，seed 相同时生成的文件名、大小和内容都相同"""
+    rng = random.Random(seed)
+    for number in range(files):
+        folder = os.path.join(root, f"dir_{number % folders}", f"sub_{number % 3}")
+        os.makedirs(folder, exist_ok=True)
+        size = rng.randint(1, file_kb * 2) * 1024
+        with open(os.path.join(folder, f"file_{number}.bin"), "wb") as f:
+            f.write(random.Random(number).randbytes(size))
+
+
+def make_api(server):
+    api = API_123pan("token", listing_cache=ListingCache(max_entries=0))
+    api.SCHEME = "http"
+    api.BASE_URL = server.host
+    return api
+
+
+def upload_sequentially(api, local_dir):
+    """逐层逐个创建文件夹，再逐个计算MD5并创建上传任务"""
+    folders, files = scan_local_tree(local_dir)
+    folder_ids = {"": api.mkdir(os.path.basename(local_dir), "0")}
+    for path in folders:
+        parent, _, name = path.rpartition("/")
+        folder_ids[path] = api.mkdir(name, folder_ids[parent])
+    reused_bytes = 0
+    for local_file in files:
+        digest = get_file_digest(local_file.path)
+        data = api.create_file(folder_ids[local_file.folder], local_file.name, digest.md5, local_file.size)
+        if data.get("reuse"):
+            reused_bytes += local_file.size
+    return reused_bytes
+
+
+def upload_pipeline(api, local_dir, qps):
+    report = None
+    for report in FolderUploader(api, local_dir, qps=qps).run():
+        pass
+    assert not report.failed, report.failed[:3]
+    return report.reused_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=1000, help="文件数")
+    parser.add_argument("--folders", type=int, default=20, help="一级子文件夹数(每个下面再有3个子文件夹)")
+    parser.add_argument("--file-kb", type=int, default=256, help="平均文件大小(KB)")
+    parser.add_argument("--reuse", type=float, default=0.7, help="服务器已有内容的文件比例")
+    parser.add_argument("--latency-ms", type=float, default=50, help="每个请求的服务器延迟(毫秒)")
+    parser.add_argument("--qps", type=float, default=0, help="流水线的请求速率上限，0表示不限制")
+    args = parser.parse_args()
+    # 本地服务器不会限流，不按接口限速
+    configure_request_scheduler(limits={}, default_qps=0)
+    
+    work_dir = tempfile.mkdtemp(prefix="123pan_bench_")
+    cwd = os.getcwd()
+    # 哈希缓存写在临时目录中
+    os.chdir(work_dir)
+    server = StandInServer(UploadHandler).start()
+    try:
+        trees = []
+        for name in ("sequential", "pipeline"):
+            root = os.path.join(work_dir, name, "photos")
+            make_tree(root, args.folders, args.files, args.file_kb, seed=1)
+            trees.append(root)
+        _, files = scan_local_tree(trees[0])
+        total_bytes = sum(local_file.size for local_file in files)
+        rng = random.Random(2)
+        for local_file in files:
+            if rng.random() < args.reuse:
+                with open(local_file.path, "rb") as f:
+                    UploadHandler.known_etags.add(hashlib.md5(f.read()).hexdigest())
+        UploadHandler.latency = args.latency_ms / 1000
+        print(f"{len(files)} 个文件，共 {total_bytes / 1024 / 1024:.1f} MB，"
+              f"服务器已有 {len(UploadHandler.known_etags)} 个，延迟 {args.latency_ms:.0f} ms")
+        
+        for name, run, root in (("逐个", lambda root: upload_sequentially(make_api(server), root), trees[0]),
+                                ("流水线", lambda root: upload_pipeline(make_api(server), root, args.qps), trees[1])):
+            server.reset_counters()
+            started = time.perf_counter()
+            reused_bytes = run(root)
+            elapsed = time.perf_counter() - started
+            print(f"{name:<4} 耗时 {elapsed:6.2f} s  {server.requests:>5} 次请求  秒传节省 {reused_bytes / 1024 / 1024:7.1f} MB  "
+                  f"等效速度 {reused_bytes / 1024 / 1024 / elapsed:7.1f} MB/s")
+    finally:
+        server.stop()
+        os.chdir(cwd)
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
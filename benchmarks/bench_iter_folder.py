@@ -0,0 +1,88 @@
+"""对比手动按 lastFileId 逐页获取与 iter_folder 预取下一页列出整个文件夹的耗时
+
+本地服务器模拟文件列表接口，每页加入 --latency-ms 的延迟，
+调用方每处理一页耗时 --work-ms(模拟追加到表格或写入索引)。
+    
+    python benchmarks/bench_iter_folder.py --files 5000 --latency-ms 50 --work-ms 30
+"""
+import argparse
+import json
+import time
+from urllib.parse import urlparse, parse_qs
+
+from stand_in import StandInHandler, StandInServer
+from api import API_123pan
+from cache import ListingCache
+from ratelimit import configure_request_scheduler
+
+
+class ListHandler(StandInHandler):
+    """按 parentFileId/limit/lastFileId 分页返回合成的文件"""
+    files = 0
+    latency = 0.0
+    
+    def do_GET(self):
+        self.server.count_request()
+        query = parse_qs(urlparse(self.path).query)
+        limit = int(query["limit"][0])
+        start = int(query.get("lastFileId", ["0"])[0])
+        end = min(start + limit, self.files)
+        file_list = [{
+            "fileId": file_id + 1, "filename": f"file_{file_id}.bin", "type": 0, "size": file_id,
+            "etag": f"{file_id:032x}", "status": 0, "parentFileId": 0, "category": 0, "trashed": 0,
+        } for file_id in range(start, end)]
+        time.sleep(self.latency)
+        body = {"code": 0, "data": {"lastFileId": end if end < self.files else -1, "fileList": file_list}}
+        self.send_body(json.dumps(body).encode())
+
+
+def list_manually(api, work):
+    files = 0
+    last_file_id = None
+    while True:
+        page, last_file_id = api.get_file_list("0", last_file_id)
+        files += len(page)
+        work()
+        if not last_file_id or last_file_id == -1:
+            return files
+
+
+def list_with_iterator(api, work):
+    files = 0
+    for page in api.iter_folder_pages("0"):
+        files += len(page)
+        work()
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=5000, help="文件夹中的文件数")
+    parser.add_argument("--latency-ms", type=float, default=50, help="每页的服务器延迟(毫秒)")
+    parser.add_argument("--work-ms", type=float, default=30, help="调用方处理每页的耗时(毫秒)")
+    args = parser.parse_args()
+    # 本地服务器不会限流，不按接口限速
+    configure_request_scheduler(limits={}, default_qps=0)
+    
+    ListHandler.files = args.files
+    ListHandler.latency = args.latency_ms / 1000
+    server = StandInServer(ListHandler).start()
+    work = lambda: time.sleep(args.work_ms / 1000)
+    try:
+        for name, list_folder in (("手动翻页", list_manually), ("iter_folder", list_with_iterator)):
+            # 每轮使用新的缓存，都从服务器获取
+            api = API_123pan("token", listing_cache=ListingCache())
+            api.SCHEME = "http"
+            api.BASE_URL = server.host
+            server.reset_counters()
+            started = time.perf_counter()
+            files = list_folder(api, work)
+            elapsed = time.perf_counter() - started
+            pages = server.requests
+            print(f"{name:<12} {files} 个文件  {pages} 页  总耗时 {elapsed:6.2f} s  每页 {elapsed / pages * 1000:6.1f} ms")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""对比每块数据发出一次进度信号与合并后发出时界面线程的CPU占用
+
+--transfers 个线程模拟下载，每个以 --rate-mb MB/s 的速度每读 --chunk-kb KB 更新一次进度，持续 --seconds 秒。
+界面线程收到进度信号后设置进度条、用 format_file_size 格式化状态文字。
+分别测试每块发出一次信号(原来的做法)和经 ProgressThrottle 合并后发出，统计信号数和界面线程的CPU时间。
+    
+    python benchmarks/bench_progress.py --transfers 4 --rate-mb 100 --chunk-kb 8 --seconds 5
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import stand_in  # noqa: F401  从仓库根目录导入客户端模块
+from PySide6.QtCore import QObject, QTimer, Signal
+from PySide6.QtWidgets import QApplication, QLabel, QProgressBar
+from progress import ProgressThrottle, PROGRESS_EMIT_INTERVAL
+from utils import format_file_size
+
+
+class Emitter(QObject):
+    progress_signal = Signal("qint64", "qint64")
+
+
+def simulate(emit, total, chunk, rate):
+    """按 rate 字节/秒的速度每 chunk 字节回调一次 emit(已完成, 总量)"""
+    started = time.monotonic()
+    done = 0
+    while done < total:
+        done = min(total, done + chunk)
+        emit(done, total)
+        # 每 64 块检查一次是否超前，避免每块都 sleep
+        if done % (chunk * 64) == 0:
+            ahead = done / rate - (time.monotonic() - started)
+            if ahead > 0:
+                time.sleep(ahead)
+
+
+def run(app, transfers, total, chunk, rate, throttled):
+    bars = [QProgressBar() for _ in range(transfers)]
+    labels = [QLabel() for _ in range(transfers)]
+    emitters = [Emitter() for _ in range(transfers)]
+    received = [0]
+    
+    def on_progress(index, done, size):
+        received[0] += 1
+        bars[index].setValue(int(done * 100 / size))
+        labels[index].setText(f"已下载 {format_file_size(done)}/{format_file_size(size)}")
+    
+    for index, emitter in enumerate(emitters):
+        emitter.progress_signal.connect(lambda done, size, index=index: on_progress(index, done, size))
+    
+    def worker(emitter):
+        if throttled:
+            progress = ProgressThrottle(emitter.progress_signal.emit)
+            simulate(progress.update, total, chunk, rate)
+            progress.flush()
+        else:
+            simulate(emitter.progress_signal.emit, total, chunk, rate)
+    
+    threads = [threading.Thread(target=worker, args=(emitter,)) for emitter in emitters]
+    
+    def check():
+        if not any(thread.is_alive() for thread in threads):
+            app.quit()
+    
+    timer = QTimer()
+    timer.setInterval(50)
+    timer.timeout.connect(check)
+    timer.start()
+    cpu_started = time.thread_time()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    app.exec()
+    # 处理剩余排队的信号
+    app.processEvents()
+    timer.stop()
+    for thread in threads:
+        thread.join()
+    return received[0], time.thread_time() - cpu_started, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transfers", type=int, default=4, help="同时进行的下载数")
+    parser.add_argument("--rate-mb", type=float, default=100, help="每个下载的速度(MB/s)")
+    parser.add_argument("--chunk-kb", type=int, default=8, help="每次更新进度的数据块大小(KB)")
+    parser.add_argument("--seconds", type=float, default=5, help="每个下载持续的秒数")
+    args = parser.parse_args()
+    
+    app = QApplication(sys.argv[:1])
+    rate = args.rate_mb * 1024 * 1024
+    chunk = args.chunk_kb * 1024
+    total = int(rate * args.seconds) // chunk * chunk
+    print(f"{args.transfers} 个下载，每个 {args.rate_mb:g} MB/s，每 {args.chunk_kb} KB 更新一次进度，"
+          f"合并间隔 {PROGRESS_EMIT_INTERVAL * 1000:.0f} ms")
+    for name, throttled in (("每块发出", False), ("合并发出", True)):
+        received, cpu, elapsed = run(app, args.transfers, total, chunk, rate, throttled)
+        print(f"{name:<8} 信号 {received:>8} 个 ({received / elapsed:8.0f} 个/秒)  "
+              f"界面线程CPU {cpu:6.2f} s  耗时 {elapsed:5.2f} s")
+
+
+if __name__ == "__main__":
+    main()
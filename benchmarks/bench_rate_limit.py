@@ -0,0 +1,107 @@
+"""测试按接口限速的请求调度器在服务器限流时的表现
+
+本地服务器对每个接口按滑动1秒窗口限流(超过 --server-qps 时返回 code 429)，每个请求加入 --latency-ms 的延迟。
+--threads 个线程共发出 --requests 个列表请求，分别测试：不限速也不重试(原来的行为，被限流即失败)、
+调度器上限高于服务器限制(靠自适应退避收敛)、调度器上限与服务器限制一致。
+    
+    python benchmarks/bench_rate_limit.py --requests 200 --threads 16 --server-qps 10
+"""
+import argparse
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from stand_in import StandInHandler, StandInServer
+from api import API_123pan
+from ratelimit import RequestScheduler
+from transport import get_transport
+
+LIST_PATH = "/api/v2/file/list"
+
+
+class ThrottlingHandler(StandInHandler):
+    qps = 10
+    latency = 0.02
+    windows = {}
+    lock = threading.Lock()
+    throttled = 0
+    
+    def do_GET(self):
+        self.server.count_request()
+        path = urlparse(self.path).path
+        now = time.monotonic()
+        with self.lock:
+            window = self.windows.setdefault(path, deque())
+            while window and now - window[0] >= 1:
+                window.popleft()
+            allowed = len(window) < self.qps
+            if allowed:
+                window.append(now)
+            else:
+                ThrottlingHandler.throttled += 1
+        time.sleep(self.latency)
+        if allowed:
+            body = {"code": 0, "data": {"lastFileId": -1, "fileList": []}}
+        else:
+            body = {"code": 429, "message": "操作频繁，请稍后再试"}
+        self.send_body(json.dumps(body).encode())
+
+
+class DirectSender:
+    """原来的做法：直接发送，不限速也不重试"""
+    
+    def send(self, method, url, body=None, headers=None, transport=None):
+        return json.loads((transport or get_transport()).request(method, url, body, headers).data)
+
+
+def run(server, scheduler, requests, threads):
+    api = API_123pan("token", scheduler=scheduler)
+    api.SCHEME = "http"
+    api.BASE_URL = server.host
+    
+    def list_once(_):
+        try:
+            return api.request("GET", f"{LIST_PATH}?parentFileId=0&limit=100").get("code") == 0
+        except Exception:
+            return False
+    
+    server.reset_counters()
+    ThrottlingHandler.throttled = 0
+    ThrottlingHandler.windows = {}
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        succeeded = sum(executor.map(list_once, range(requests)))
+    return succeeded, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="请求数")
+    parser.add_argument("--threads", type=int, default=16, help="并发线程数")
+    parser.add_argument("--server-qps", type=int, default=10, help="服务器每个接口每秒允许的请求数")
+    parser.add_argument("--latency-ms", type=float, default=20, help="每个请求的服务器延迟(毫秒)")
+    args = parser.parse_args()
+    ThrottlingHandler.qps = args.server_qps
+    ThrottlingHandler.latency = args.latency_ms / 1000
+    
+    server = StandInServer(ThrottlingHandler).start()
+    try:
+        print(f"{args.requests} 个请求，{args.threads} 个线程，服务器限流 {args.server_qps} 次/秒")
+        cases = (
+            ("不限速不重试", DirectSender()),
+            (f"上限 {args.server_qps * 3} 次/秒", RequestScheduler(limits={LIST_PATH: args.server_qps * 3})),
+            (f"上限 {args.server_qps} 次/秒", RequestScheduler(limits={LIST_PATH: args.server_qps})),
+        )
+        for name, scheduler in cases:
+            succeeded, elapsed = run(server, scheduler, args.requests, args.threads)
+            print(f"{name:<10} 成功 {succeeded:>4}/{args.requests}  被限流 {ThrottlingHandler.throttled:>4} 次  "
+                  f"共 {server.requests:>4} 次请求  耗时 {elapsed:6.2f} s  有效速率 {succeeded / elapsed:5.1f} 次/秒")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""在百万条记录的本地搜索索引上测试写入和查询耗时
+
+按每页100条调用 SearchIndex.update_page 写入 --files 个合成文件(与浏览文件夹时相同的写入路径)，
+再对文件名子串、扩展名、大小范围、etag及组合条件各查询多次，输出耗时中位数。
+    
+    python benchmarks/bench_search_index.py --files 1000000
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import stand_in  # noqa: F401 把仓库根目录加入 sys.path
+from records import FileRecord
+from searchindex import SearchIndex
+
+PAGE_SIZE = 100
+EXTENSIONS = ["mp4", "jpg", "pdf", "zip", "txt", "mkv", "docx", "png"]
+WORDS = ["report", "holiday", "invoice", "backup", "season", "photo", "project", "archive", "draft", "final"]
+FILES_PER_FOLDER = 1000
+
+
+def make_page(start, count):
+    records = []
+    for number in range(start, start + count):
+        name = f"{WORDS[number % len(WORDS)]}_{WORDS[number // 7 % len(WORDS)]}_{number}.{EXTENSIONS[number % len(EXTENSIONS)]}"
+        records.append(FileRecord(number + 1, name, 0, number * 7919 % (8 * 1024 ** 3), f"{number * 2654435761:032x}"[-32:]))
+    return records
+
+
+def timed(fn, repeat):
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        durations.append(time.perf_counter() - started)
+    return statistics.median(durations) * 1000, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=1000000, help="索引中的文件数")
+    parser.add_argument("--repeat", type=int, default=20, help="每个查询的重复次数")
+    args = parser.parse_args()
+    
+    tmp_dir = tempfile.mkdtemp(prefix="123pan_bench_")
+    path = os.path.join(tmp_dir, "search_index.db")
+    index = SearchIndex(path)
+    try:
+        started = time.perf_counter()
+        for start in range(0, args.files, PAGE_SIZE):
+            # 每个文件夹 FILES_PER_FOLDER 个文件，按页连续列出
+            folder_id = 10 ** 9 + start // FILES_PER_FOLDER
+            cursor = start % FILES_PER_FOLDER or None
+            end = min(start + PAGE_SIZE, args.files)
+            next_cursor = end % FILES_PER_FOLDER if end < args.files and end % FILES_PER_FOLDER else -1
+            index.update_page(folder_id, make_page(start, end - start), cursor, next_cursor)
+        elapsed = time.perf_counter() - started
+        print(f"写入 {index.count()} 个文件  耗时 {elapsed:6.1f} s  每页 {elapsed / (args.files / PAGE_SIZE) * 1000:5.2f} ms  "
+              f"数据库 {os.path.getsize(path) / 1024 / 1024:6.1f} MB")
+        
+        sample = make_page(args.files // 2, 1)[0]
+        queries = [
+            ("子串(少见)", lambda: index.query(f"_{args.files // 2}.")),
+            ("子串(常见)", lambda: index.query("photo_project")),
+            ("两个字符", lambda: index.query("_9")),
+            ("扩展名", lambda: index.query("ext:pdf")),
+            ("大小范围", lambda: index.query("size:1GB..1.001GB")),
+            ("etag", lambda: index.query(sample.etag)),
+            ("组合", lambda: index.query("photo ext:mkv size:>4GB")),
+            ("组合(少见)", lambda: index.query(f"{args.files // 2} ext:{sample.filename.rsplit('.', 1)[1]} size:>1")),
+        ]
+        for name, query in queries:
+            median_ms, count = timed(query, args.repeat)
+            print(f"{name:<8} {count:>4} 条结果  中位数 {median_ms:8.2f} ms")
+    finally:
+        index.close()
+        for file_name in os.listdir(tmp_dir):
+            os.remove(os.path.join(tmp_dir, file_name))
+        os.rmdir(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
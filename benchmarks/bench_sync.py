@@ -0,0 +1,142 @@
+"""测试 SyncEngine 首次同步与增量同步的比较耗时
+
+本地服务器模拟一棵目录树(每个文件夹 --fanout 个子文件夹，共 --depth 层，每个文件夹 --files 个文件)，
+在临时目录生成内容完全相同的本地目录。依次比较：首次同步(没有同步记录，需要计算所有文件的MD5)、
+没有变化时的增量同步、两边各修改 --changes 个文件后的增量同步。只生成同步计划，不传输文件。
+    
+    python benchmarks/bench_sync.py --fanout 4 --depth 4 --files 100 --changes 50
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from urllib.parse import urlparse, parse_qs
+
+from stand_in import StandInServer
+from bench_walker import TreeHandler, FILE_ID_BASE, make_api
+from sync import SyncEngine, SyncState
+from ratelimit import configure_request_scheduler
+
+
+def file_content(folder_id, number):
+    return f"{folder_id}:{number}\n".encode() * (number % 7 + 1)
+
+
+class SyncTreeHandler(TreeHandler):
+    """与 TreeHandler 结构相同，文件的etag为 file_content 的MD5，changed 中的文件内容已在网盘被修改"""
+    changed = set()
+    
+    def do_GET(self):
+        self.server.count_request()
+        query = parse_qs(urlparse(self.path).query)
+        folder_id = int(query["parentFileId"][0])
+        limit = int(query["limit"][0])
+        start = int(query.get("lastFileId", ["0"])[0])
+        subfolders = self.fanout if self.folder_depth(folder_id) < self.depth else 0
+        end = min(start + limit, subfolders + self.files)
+        file_list = []
+        for index in range(start, end):
+            if index < subfolders:
+                child = folder_id * self.fanout + 1 + index
+                file_list.append({"fileId": child, "filename": f"dir_{child}", "type": 1, "size": 0,
+                                  "etag": "", "status": 0, "parentFileId": folder_id, "category": 0, "trashed": 0})
+            else:
+                number = index - subfolders
+                content = file_content(folder_id, number)
+                if (folder_id, number) in self.changed:
+                    content += b"remote edit\n"
+                file_list.append({"fileId": FILE_ID_BASE + folder_id * self.files + number,
+                                  "filename": f"file_{number}.bin", "type": 0, "size": len(content),
+                                  "etag": hashlib.md5(content).hexdigest(), "status": 0, "parentFileId": folder_id,
+                                  "category": 0, "trashed": 0})
+        time.sleep(self.latency)
+        last_file_id = end if end < subfolders + self.files else -1
+        self.send_body(json.dumps({"code": 0, "data": {"lastFileId": last_file_id, "fileList": file_list}}).encode())
+
+
+def make_local_tree(root):
+    """生成与模拟网盘相同的本地目录，返回 [(文件夹ID, 文件编号, 本地路径)]"""
+    files = []
+    stack = [(0, root)]
+    while stack:
+        folder_id, path = stack.pop()
+        os.makedirs(path, exist_ok=True)
+        if TreeHandler.folder_depth(folder_id) < TreeHandler.depth:
+            for index in range(TreeHandler.fanout):
+                child = folder_id * TreeHandler.fanout + 1 + index
+                stack.append((child, os.path.join(path, f"dir_{child}")))
+        for number in range(TreeHandler.files):
+            file_path = os.path.join(path, f"file_{number}.bin")
+            with open(file_path, "wb") as f:
+                f.write(file_content(folder_id, number))
+            files.append((folder_id, number, file_path))
+    return files
+
+
+def run(server, local_dir, state, workers):
+    engine = SyncEngine(make_api(server), local_dir, "0", state=state, workers=workers, qps=0)
+    server.reset_counters()
+    started = time.perf_counter()
+    plan = engine.compare()
+    return plan, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fanout", type=int, default=4, help="每个文件夹的子文件夹数")
+    parser.add_argument("--depth", type=int, default=4, help="目录层数")
+    parser.add_argument("--files", type=int, default=100, help="每个文件夹的文件数")
+    parser.add_argument("--changes", type=int, default=50, help="本地和网盘各修改的文件数")
+    parser.add_argument("--latency-ms", type=float, default=30, help="每页的服务器延迟(毫秒)")
+    parser.add_argument("--workers", type=int, default=8, help="遍历网盘的并发数")
+    args = parser.parse_args()
+    # 本地服务器不会限流，不按接口限速
+    configure_request_scheduler(limits={}, default_qps=0)
+    
+    TreeHandler.fanout = args.fanout
+    TreeHandler.depth = args.depth
+    TreeHandler.files = args.files
+    TreeHandler.latency = args.latency_ms / 1000
+    
+    work_dir = tempfile.mkdtemp(prefix="123pan_bench_")
+    cwd = os.getcwd()
+    # 哈希缓存写在临时目录中
+    os.chdir(work_dir)
+    server = StandInServer(SyncTreeHandler).start()
+    state = SyncState(os.path.join(work_dir, "sync_state.db"))
+    try:
+        local_dir = os.path.join(work_dir, "local")
+        files = make_local_tree(local_dir)
+        print(f"{len(files)} 个文件，服务器每页延迟 {args.latency_ms:.0f} ms，遍历并发 {args.workers}")
+        
+        def report(name, plan, elapsed):
+            print(f"{name:<10} 耗时 {elapsed:6.2f} s  {server.requests:>5} 次请求  计算MD5 {plan.hashed_files:>6} 个  "
+                  f"未变化 {plan.unchanged + plan.matched:>6}  上传 {len(plan.uploads) + len(plan.overwrites):>4}  "
+                  f"下载 {len(plan.downloads):>4}  冲突 {len(plan.conflicts):>4}")
+            return plan
+        
+        plan = report("首次同步", *run(server, local_dir, state, args.workers))
+        assert plan.matched == len(files), plan.summary()
+        report("无变化", *run(server, local_dir, state, args.workers))
+        
+        rng = random.Random(1)
+        picked = rng.sample(files, args.changes * 2)
+        for _, _, file_path in picked[:args.changes]:
+            with open(file_path, "ab") as f:
+                f.write(b"local edit\n")
+        SyncTreeHandler.changed = {(folder_id, number) for folder_id, number, _ in picked[args.changes:]}
+        plan = report("两边修改后", *run(server, local_dir, state, args.workers))
+        assert len(plan.overwrites) == len(plan.downloads) == args.changes, plan.summary()
+    finally:
+        state.close()
+        server.stop()
+        os.chdir(cwd)
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
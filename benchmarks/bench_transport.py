@@ -0,0 +1,97 @@
+"""对比每次新建HTTPS连接与共享连接池的往返次数
+
+模拟一次分片上传：每个分片先POST获取上传地址，再PUT上传分片。
+    
+    python benchmarks/bench_transport.py --slices 200
+"""
+import argparse
+import http.client
+import json
+import time
+from urllib.parse import urlsplit
+
+from stand_in import StandInHandler, StandInServer, self_signed_contexts
+from transport import Transport
+
+
+class UploadHandler(StandInHandler):
+    def do_POST(self):
+        self.server.count_request()
+        self.read_body()
+        body = json.dumps({"code": 0, "data": {"presignedURL": f"{self.server.url}/slice"}}).encode()
+        self.send_body(body)
+    
+    def do_PUT(self):
+        self.server.count_request()
+        self.read_body()
+        self.send_body(b"", content_type="application/octet-stream")
+
+
+def legacy_request(context, method, url, body, headers):
+    """原实现：每次调用新建HTTPSConnection"""
+    parts = urlsplit(url)
+    conn = http.client.HTTPSConnection(parts.hostname, parts.port, context=context)
+    conn.request(method, parts.path, body, headers)
+    res = conn.getresponse()
+    data = res.read()
+    conn.close()
+    return res.status, data
+
+
+def pooled_request(transport, method, url, body, headers):
+    res = transport.request(method, url, body, headers)
+    return res.status, res.data
+
+
+def run_upload(server, send, slices, slice_data):
+    headers = {"Content-Type": "application/json", "Platform": "open_platform"}
+    for slice_no in range(1, slices + 1):
+        payload = json.dumps({"preuploadID": "bench", "sliceNo": slice_no})
+        _, data = send("POST", f"{server.url}/upload/v1/file/get_upload_url", payload, headers)
+        presigned_url = json.loads(data)["data"]["presignedURL"]
+        send("PUT", presigned_url, slice_data, {"Content-Type": "application/octet-stream"})
+
+
+def report(name, server, elapsed, slices):
+    # TCP握手1个往返，完整TLS握手至少1个往返，每个请求1个往返
+    round_trips = server.connections * 2 + server.requests
+    print(f"{name:<10} 请求 {server.requests:>5}  连接 {server.connections:>5}  "
+          f"完整握手 {server.full_handshakes:>5}  会话复用握手 {server.resumed_handshakes:>5}  "
+          f"估算往返 {round_trips:>6}  每分片往返 {round_trips / slices:5.2f}  耗时 {elapsed:6.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slices", type=int, default=200, help="模拟的分片数量")
+    parser.add_argument("--slice-kb", type=int, default=64, help="每个分片的大小(KB)")
+    args = parser.parse_args()
+    
+    server_context, client_context = self_signed_contexts()
+    server = StandInServer(UploadHandler, server_context).start()
+    slice_data = b"\0" * (args.slice_kb * 1024)
+    
+    try:
+        start = time.perf_counter()
+        run_upload(server, lambda *a: legacy_request(client_context, *a), args.slices, slice_data)
+        report("每次新建", server, time.perf_counter() - start, args.slices)
+        
+        server.reset_counters()
+        transport = Transport(ssl_context=client_context)
+        start = time.perf_counter()
+        run_upload(server, lambda *a: pooled_request(transport, *a), args.slices, slice_data)
+        report("连接池", server, time.perf_counter() - start, args.slices)
+        transport.close()
+        
+        # 不保留空闲连接时，仍可通过TLS会话复用省去完整握手
+        server.reset_counters()
+        transport = Transport(pool_size=0, ssl_context=client_context)
+        start = time.perf_counter()
+        run_upload(server, lambda *a: pooled_request(transport, *a), args.slices, slice_data)
+        report("仅会话复用", server, time.perf_counter() - start, args.slices)
+        transport.close()
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""对比整片读入内存与流式发送分片时的峰值内存(RSS)
+
+每个文件大小在独立子进程中上传到本地服务器，读取子进程的 ru_maxrss。
+测试文件为稀疏文件，不占用磁盘空间。
+    
+    python benchmarks/bench_upload_memory.py --sizes-mb 64 256 1024
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+from stand_in import StandInHandler, StandInServer
+
+
+class SinkHandler(StandInHandler):
+    """接收并丢弃PUT请求体"""
+    
+    def do_PUT(self):
+        remaining = int(self.headers.get("Content-Length", 0))
+        while remaining > 0:
+            data = self.rfile.read(min(remaining, 1024 * 1024))
+            if not data:
+                break
+            remaining -= len(data)
+        self.send_body(b"", content_type="application/octet-stream")
+
+
+def child(mode, url, file_path, slice_size, workers):
+    """子进程：把文件按分片并发上传，输出峰值RSS(KB)"""
+    import resource
+    from transport import get_transport
+    from uploader import SliceUploader, FileWindow, split_slices
+    
+    def upload_bytes(presigned_url, start, size):
+        # 原实现：整个分片读入 bytes 后再发送
+        with open(file_path, "rb") as f:
+            f.seek(start)
+            data = f.read(size)
+        return get_transport().request("PUT", presigned_url, data, {"Content-Type": "application/octet-stream"}).status == 200
+    
+    def upload_stream(presigned_url, start, size):
+        with FileWindow(file_path, start, size) as body:
+            headers = {"Content-Type": "application/octet-stream", "Content-Length": str(len(body))}
+            return get_transport().request("PUT", presigned_url, body, headers).status == 200
+    
+    uploader = SliceUploader(
+        lambda slice_no: f"{url}/slice/{slice_no}",
+        upload_bytes if mode == "bytes" else upload_stream,
+        workers=workers
+    )
+    assert uploader.run(split_slices(os.path.getsize(file_path), slice_size))
+    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes-mb", type=int, nargs="+", default=[64, 256, 1024], help="测试文件大小(MB)")
+    parser.add_argument("--slice-mb", type=int, default=16, help="分片大小(MB)")
+    parser.add_argument("--workers", type=int, default=4, help="并发上传的分片数")
+    args = parser.parse_args()
+    
+    server = StandInServer(SinkHandler).start()
+    tmp_dir = tempfile.mkdtemp(prefix="123pan_bench_")
+    try:
+        for size_mb in args.sizes_mb:
+            file_path = os.path.join(tmp_dir, f"{size_mb}.bin")
+            with open(file_path, "wb") as f:
+                f.truncate(size_mb * 1024 * 1024)
+            results = []
+            for mode in ("bytes", "stream"):
+                output = subprocess.run(
+                    [sys.executable, __file__, "--child", mode, server.url, file_path,
+                     str(args.slice_mb * 1024 * 1024), str(args.workers)],
+                    check=True, capture_output=True, text=True
+                ).stdout
+                results.append(int(output.split()[-1]) / 1024)
+            os.remove(file_path)
+            print(f"文件 {size_mb:>5} MB  整片读入峰值RSS {results[0]:7.1f} MB  流式发送峰值RSS {results[1]:7.1f} MB")
+    finally:
+        server.stop()
+        os.rmdir(tmp_dir)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        child(sys.argv[2], sys.argv[3], sys.argv[4], int(sys.argv[5]), int(sys.argv[6]))
+    else:
+        main()
@@ -0,0 +1,122 @@
+"""对比每个上传线程各自每秒轮询一次与共享查询服务查询异步上传结果
+
+本地服务器的 upload_async_result 在上传完成后 0 ~ --max-processing-ms 毫秒内随机时间处理完成。
+--uploads 个上传同时完成分片上传，分别测试每个上传占用一个线程、固定间隔1秒轮询(原来的做法)，
+以及全部交给 UploadResultPoller。统计查询请求数、处理完成到得知结果的平均延迟和占用的线程数。
+    
+    python benchmarks/bench_upload_result.py --uploads 200 --max-processing-ms 3000
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from stand_in import StandInHandler, StandInServer
+from poller import UploadResultPoller
+from ratelimit import RequestScheduler
+
+RESULT_PATH = "/upload/v1/file/upload_async_result"
+
+
+class AsyncResultHandler(StandInHandler):
+    ready_at = {}  # preuploadID -> 处理完成的时间
+    
+    def do_POST(self):
+        self.server.count_request()
+        preupload_id = json.loads(self.read_body())["preuploadID"]
+        data = {"completed": time.monotonic() >= self.ready_at[preupload_id], "fileID": preupload_id}
+        self.send_body(json.dumps({"code": 0, "data": data}).encode())
+
+
+class BacklogServer(StandInServer):
+    """原来的做法会同时建立上百个连接，加大监听队列"""
+    request_queue_size = 1024
+
+
+def fixed_interval(url, scheduler, preupload_id, max_retries=30, retry_interval=1):
+    """原来的 check_upload_result：在上传线程中每秒查询一次"""
+    payload = json.dumps({"preuploadID": preupload_id})
+    for _ in range(max_retries):
+        data = scheduler.send("POST", url, payload, {"Content-Type": "application/json"})
+        if data.get("code") == 0 and data["data"].get("completed"):
+            return data["data"]
+        time.sleep(retry_interval)
+    return None
+
+
+def client_threads():
+    """不含本地服务器处理请求的线程"""
+    return sum(1 for thread in threading.enumerate() if "process_request" not in thread.name)
+
+
+def run(server, name, uploads, max_processing, wait_all):
+    server.reset_counters()
+    ids = [f"upload-{i}" for i in range(uploads)]
+    now = time.monotonic()
+    AsyncResultHandler.ready_at = {key: now + random.Random(key).uniform(0, max_processing) for key in ids}
+    done_at = {}
+    peak_threads = base_threads = client_threads()
+    started = time.perf_counter()
+    
+    def record(preupload_id):
+        done_at[preupload_id] = time.monotonic()
+    
+    finished = threading.Event()
+    
+    def sample():
+        nonlocal peak_threads
+        while not finished.wait(0.05):
+            peak_threads = max(peak_threads, client_threads())
+    
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    wait_all(ids, record)
+    finished.set()
+    sampler.join()
+    elapsed = time.perf_counter() - started
+    delays = [done_at[key] - AsyncResultHandler.ready_at[key] for key in done_at]
+    print(f"{name:<10} 完成 {len(done_at):>4}/{uploads}  查询 {server.requests:>5} 次  "
+          f"平均延迟 {sum(delays) / len(delays) * 1000:6.0f} ms  占用线程 {peak_threads - base_threads - 1:>4}  耗时 {elapsed:5.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uploads", type=int, default=200, help="同时等待结果的上传数")
+    parser.add_argument("--max-processing-ms", type=float, default=3000, help="服务器处理时间的上限(毫秒)")
+    args = parser.parse_args()
+    max_processing = args.max_processing_ms / 1000
+    
+    server = BacklogServer(AsyncResultHandler).start()
+    url = f"{server.url}{RESULT_PATH}"
+    # 本地服务器不会限流，不按接口限速
+    scheduler = RequestScheduler(limits={}, default_qps=0)
+    try:
+        print(f"{args.uploads} 个上传，服务器处理时间 0 ~ {args.max_processing_ms:.0f} ms")
+        
+        def per_thread(ids, record):
+            def one(preupload_id):
+                if fixed_interval(url, scheduler, preupload_id):
+                    record(preupload_id)
+            with ThreadPoolExecutor(max_workers=len(ids)) as executor:
+                list(executor.map(one, ids))
+        
+        def shared(ids, record):
+            poller = UploadResultPoller(url=url, scheduler=scheduler)
+            futures = []
+            for preupload_id in ids:
+                future = poller.submit("token", preupload_id)
+                future.add_done_callback(lambda f, key=preupload_id: f.result() and record(key))
+                futures.append(future)
+            for future in futures:
+                future.result()
+        
+        run(server, "每线程轮询", args.uploads, max_processing, per_thread)
+        run(server, "共享查询服务", args.uploads, max_processing, shared)
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""对比分片失败即放弃与按分片重试时，在不稳定的服务器上完成上传的文件数
+
+本地服务器的分片PUT按 --error-rate 的概率返回 503，按 --expired-rate 的概率返回 403(上传地址过期)。
+依次上传 --files 个文件(每个 --slices 个分片)，分别测试不重试(原来的行为)和默认重试次数。
+    
+    python benchmarks/bench_upload_retry.py --files 20 --slices 50 --error-rate 0.02 --expired-rate 0.01
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+from stand_in import StandInHandler, StandInServer
+from transport import get_transport
+from uploader import SliceUploader, FileWindow, split_slices, DEFAULT_RETRY_BUDGET
+
+
+class FlakyHandler(StandInHandler):
+    error_rate = 0.02
+    expired_rate = 0.01
+    rng = random.Random(1)
+    lock = threading.Lock()
+    
+    def do_PUT(self):
+        self.server.count_request()
+        self.read_body()
+        with self.lock:
+            roll = self.rng.random()
+        if roll < self.error_rate:
+            self.send_body(b"Service Unavailable", status=503, content_type="text/plain")
+        elif roll < self.error_rate + self.expired_rate:
+            self.send_body(b"Request has expired", status=403, content_type="text/plain")
+        else:
+            self.send_body(b"", content_type="application/octet-stream")
+
+
+def upload(server, file_path, slice_size, retry_budget):
+    def upload_slice(presigned_url, start, size):
+        with FileWindow(file_path, start, size) as body:
+            headers = {"Content-Type": "application/octet-stream", "Content-Length": str(len(body))}
+            return get_transport().request("PUT", presigned_url, body, headers).status
+    
+    uploader = SliceUploader(lambda slice_no: f"{server.url}/slice/{slice_no}", upload_slice, retry_budget=retry_budget)
+    return uploader.run(split_slices(os.path.getsize(file_path), slice_size)), uploader.retries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=20, help="上传的文件数")
+    parser.add_argument("--slices", type=int, default=50, help="每个文件的分片数")
+    parser.add_argument("--slice-kb", type=int, default=256, help="分片大小(KB)")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="分片返回503的概率")
+    parser.add_argument("--expired-rate", type=float, default=0.01, help="分片返回403(地址过期)的概率")
+    args = parser.parse_args()
+    FlakyHandler.error_rate = args.error_rate
+    FlakyHandler.expired_rate = args.expired_rate
+    
+    slice_size = args.slice_kb * 1024
+    fd, file_path = tempfile.mkstemp(prefix="123pan_bench_")
+    with os.fdopen(fd, "wb") as f:
+        f.truncate(slice_size * args.slices)
+    server = StandInServer(FlakyHandler).start()
+    try:
+        print(f"{args.files} 个文件，每个 {args.slices} 个分片，503概率 {args.error_rate:g}，地址过期概率 {args.expired_rate:g}")
+        for name, budget in (("不重试", 0), (f"重试上限 {DEFAULT_RETRY_BUDGET}", DEFAULT_RETRY_BUDGET)):
+            server.reset_counters()
+            FlakyHandler.rng = random.Random(1)
+            started = time.perf_counter()
+            results = [upload(server, file_path, slice_size, budget) for _ in range(args.files)]
+            elapsed = time.perf_counter() - started
+            completed = sum(1 for ok, _ in results if ok)
+            retries = sum(r for _, r in results)
+            print(f"{name:<10} 完成 {completed:>3}/{args.files}  重试 {retries:>4} 次  "
+                  f"共 {server.requests:>5} 次PUT  耗时 {elapsed:6.2f} s")
+    finally:
+        server.stop()
+        os.remove(file_path)
+
+
+if __name__ == "__main__":
+    main()
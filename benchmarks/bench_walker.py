@@ -0,0 +1,133 @@
+"""在本地模拟的深而宽的目录树上测试 TreeWalker 的并发遍历和断点续传
+
+每个文件夹有 --fanout 个子文件夹(直到 --depth 层)和 --files 个文件，
+服务器每页加入 --latency-ms 的延迟。依次用不同的并发数完整遍历，
+最后演示遍历到一半中断、用断点文件继续，检查没有遗漏。
+    
+    python benchmarks/bench_walker.py --fanout 4 --depth 4 --files 150 --workers 1 4 8 16
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from urllib.parse import urlparse, parse_qs
+
+from stand_in import StandInHandler, StandInServer
+from api import API_123pan
+from cache import ListingCache
+from walker import TreeWalker
+from ratelimit import configure_request_scheduler
+
+FILE_ID_BASE = 10 ** 9
+
+
+class TreeHandler(StandInHandler):
+    """文件夹 i 的子文件夹为 i*fanout+1 ... i*fanout+fanout，根目录为 0"""
+    fanout = 4
+    depth = 4
+    files = 100
+    latency = 0.0
+    
+    @classmethod
+    def folder_depth(cls, folder_id):
+        depth = 0
+        while folder_id:
+            folder_id = (folder_id - 1) // cls.fanout
+            depth += 1
+        return depth
+    
+    @classmethod
+    def count(cls):
+        """返回 (文件夹数, 文件数)，不含根目录"""
+        folders = sum(cls.fanout ** level for level in range(1, cls.depth + 1))
+        return folders, (folders + 1) * cls.files
+    
+    def do_GET(self):
+        self.server.count_request()
+        query = parse_qs(urlparse(self.path).query)
+        folder_id = int(query["parentFileId"][0])
+        limit = int(query["limit"][0])
+        start = int(query.get("lastFileId", ["0"])[0])
+        subfolders = self.fanout if self.folder_depth(folder_id) < self.depth else 0
+        end = min(start + limit, subfolders + self.files)
+        file_list = []
+        for index in range(start, end):
+            if index < subfolders:
+                child = folder_id * self.fanout + 1 + index
+                file_list.append({"fileId": child, "filename": f"dir_{child}", "type": 1, "size": 0,
+                                  "etag": "", "status": 0, "parentFileId": folder_id, "category": 0, "trashed": 0})
+            else:
+                number = index - subfolders
+                file_list.append({"fileId": FILE_ID_BASE + folder_id * self.files + number,
+                                  "filename": f"file_{number}.bin", "type": 0, "size": number,
+                                  "etag": f"{number:032x}", "status": 0, "parentFileId": folder_id,
+                                  "category": 0, "trashed": 0})
+        time.sleep(self.latency)
+        last_file_id = end if end < subfolders + self.files else -1
+        self.send_body(json.dumps({"code": 0, "data": {"lastFileId": last_file_id, "fileList": file_list}}).encode())
+
+
+def make_api(server):
+    # 遍历结果不写入共享的列表缓存
+    api = API_123pan("token", listing_cache=ListingCache(max_entries=0))
+    api.SCHEME = "http"
+    api.BASE_URL = server.host
+    return api
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fanout", type=int, default=4, help="每个文件夹的子文件夹数")
+    parser.add_argument("--depth", type=int, default=4, help="目录层数")
+    parser.add_argument("--files", type=int, default=150, help="每个文件夹的文件数")
+    parser.add_argument("--latency-ms", type=float, default=30, help="每页的服务器延迟(毫秒)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8, 16], help="并发数")
+    parser.add_argument("--qps", type=float, default=0, help="请求速率上限，0表示不限制")
+    args = parser.parse_args()
+    # 本地服务器不会限流，不按接口限速
+    configure_request_scheduler(limits={}, default_qps=0)
+    
+    TreeHandler.fanout = args.fanout
+    TreeHandler.depth = args.depth
+    TreeHandler.files = args.files
+    TreeHandler.latency = args.latency_ms / 1000
+    folders, files = TreeHandler.count()
+    print(f"目录树：{folders} 个文件夹，{files} 个文件")
+    
+    server = StandInServer(TreeHandler).start()
+    try:
+        for workers in args.workers:
+            server.reset_counters()
+            walker = TreeWalker(make_api(server), workers=workers, qps=args.qps)
+            started = time.perf_counter()
+            count = sum(1 for _ in walker.walk())
+            elapsed = time.perf_counter() - started
+            assert count == folders + files, count
+            print(f"并发 {workers:>3}  {server.requests:>5} 次请求  耗时 {elapsed:6.2f} s  "
+                  f"{count / elapsed:8.0f} 项/秒  {server.requests / elapsed:6.1f} 请求/秒")
+        
+        # 中断后继续
+        checkpoint_path = os.path.join(tempfile.mkdtemp(prefix="123pan_bench_"), "walk.json")
+        seen = set()
+        walker = TreeWalker(make_api(server), workers=max(args.workers), qps=args.qps, checkpoint_path=checkpoint_path)
+        for path, record in walker.walk():
+            seen.add(path)
+            if len(seen) >= (folders + files) // 2:
+                break
+        first_part = len(seen)
+        walker = TreeWalker(make_api(server), workers=max(args.workers), qps=args.qps, checkpoint_path=checkpoint_path)
+        repeated = 0
+        for path, record in walker.walk():
+            repeated += path in seen
+            seen.add(path)
+        assert len(seen) == folders + files, len(seen)
+        assert not os.path.exists(checkpoint_path)
+        os.rmdir(os.path.dirname(checkpoint_path))
+        print(f"断点续传：中断前 {first_part} 项，继续后共 {len(seen)} 项，无遗漏，重复返回 {repeated} 项")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
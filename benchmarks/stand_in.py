@@ -0,0 +1,111 @@
+"""本地模拟服务器，供基准测试使用"""
+import os
+import socket
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 基准测试脚本从仓库根目录导入客户端模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def self_signed_contexts():
+    """用openssl生成自签名证书，返回 (服务端SSLContext, 客户端SSLContext)"""
+    tmp_dir = tempfile.mkdtemp(prefix="123pan_bench_")
+    cert_file = os.path.join(tmp_dir, "cert.pem")
+    key_file = os.path.join(tmp_dir, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1",
+         "-keyout", key_file, "-out", cert_file],
+        check=True, capture_output=True
+    )
+    server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    server_context.load_cert_chain(cert_file, key_file)
+    client_context = ssl.create_default_context(cafile=cert_file)
+    return server_context, client_context
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """支持keep-alive的请求处理基类"""
+    protocol_version = "HTTP/1.1"
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def send_body(self, body, status=200, content_type="application/json", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+    
+    def read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length) if length else b""
+
+
+class StandInServer(ThreadingHTTPServer):
+    """统计连接数和TLS握手情况的本地服务器"""
+    daemon_threads = True
+    
+    def __init__(self, handler_class, ssl_context=None):
+        super().__init__(("127.0.0.1", 0), handler_class)
+        self.ssl_context = ssl_context
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.full_handshakes = 0
+        self.resumed_handshakes = 0
+        self.requests = 0
+        self.thread = None
+    
+    @property
+    def scheme(self):
+        return "https" if self.ssl_context else "http"
+    
+    @property
+    def host(self):
+        return f"127.0.0.1:{self.server_address[1]}"
+    
+    @property
+    def url(self):
+        return f"{self.scheme}://{self.host}"
+    
+    def finish_request(self, request, client_address):
+        with self.lock:
+            self.connections += 1
+        request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.ssl_context:
+            try:
+                request = self.ssl_context.wrap_socket(request, server_side=True)
+            except (ssl.SSLError, OSError):
+                return
+            with self.lock:
+                if request.session_reused:
+                    self.resumed_handshakes += 1
+                else:
+                    self.full_handshakes += 1
+        super().finish_request(request, client_address)
+    
+    def count_request(self):
+        with self.lock:
+            self.requests += 1
+    
+    def reset_counters(self):
+        with self.lock:
+            self.connections = self.full_handshakes = self.resumed_handshakes = self.requests = 0
+    
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+    
+    def stop(self):
+        self.shutdown()
+        self.server_close()
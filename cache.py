@@ -0,0 +1,142 @@
+import time
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+
+DEFAULT_LISTING_TTL = 30  # 文件列表缓存的有效期(秒)
+DEFAULT_STALE_TTL = 600  # 过期后仍可先行展示、同时后台刷新的时长(秒)
+DEFAULT_LISTING_ENTRIES = 512  # 最多缓存的列表页数
+DEFAULT_URL_TTL = 600  # 链接中没有过期时间时，下载链接的缓存有效期(秒)
+URL_EXPIRY_MARGIN = 30  # 提前多少秒把快过期的下载链接视为过期
+DEFAULT_URL_ENTRIES = 4096  # 最多缓存的下载链接数
+URL_EXPIRY_PARAMS = ("expires", "x-oss-expires", "e")  # 下载链接中表示过期时间(Unix时间戳)的参数
+
+
+class ListingCache:
+    """文件列表缓存，按 (文件夹ID, 分页游标) 保存一页结果
+    
+    有效期内直接返回；过期但仍在 stale_ttl 内时返回旧结果并标记需要刷新；
+    超出条数上限时淘汰最久未使用的页。
+    """
+    
+    def __init__(self, ttl=DEFAULT_LISTING_TTL, max_entries=DEFAULT_LISTING_ENTRIES, stale_ttl=DEFAULT_STALE_TTL):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stale_ttl = stale_ttl
+        self._entries = OrderedDict()  # key -> (写入时间, 值)
+        self._generations = {}  # 文件夹ID -> 失效次数，用于丢弃失效前发出的请求结果
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def make_key(folder_id, last_file_id=None, limit=None):
+        """limit 为空表示默认每页条数"""
+        key = (str(folder_id), str(last_file_id) if last_file_id else None)
+        return key + (limit,) if limit else key
+    
+    def get(self, key):
+        """返回 (值, 是否仍在有效期内)，没有可用缓存时返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, value = entry
+            age = time.monotonic() - stored_at
+            if age > self.ttl + self.stale_ttl:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value, age <= self.ttl
+    
+    def generation(self, folder_id):
+        """请求列表前记录，写入时若文件夹已被清除过缓存则丢弃结果"""
+        with self._lock:
+            return self._generations.get(str(folder_id), 0)
+    
+    def put(self, key, value, generation=None):
+        with self._lock:
+            if generation is not None and generation != self._generations.get(key[0], 0):
+                return
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, folder_id):
+        """删除某个文件夹所有分页的缓存(上传、删除、移动之后调用)"""
+        folder_id = str(folder_id)
+        with self._lock:
+            self._generations[folder_id] = self._generations.get(folder_id, 0) + 1
+            for key in [key for key in self._entries if key[0] == folder_id]:
+                del self._entries[key]
+    
+    def clear(self):
+        with self._lock:
+            for folder_id in {key[0] for key in self._entries}:
+                self._generations[folder_id] = self._generations.get(folder_id, 0) + 1
+            self._entries.clear()
+
+
+def url_expires_at(url, default_ttl=DEFAULT_URL_TTL):
+    """返回下载链接的过期时间(Unix时间戳)，链接中没有过期参数时按 default_ttl 计算"""
+    query = parse_qs(urlparse(url).query)
+    for name in URL_EXPIRY_PARAMS:
+        for key, values in query.items():
+            if key.lower() == name and values[0].isdigit():
+                return int(values[0])
+    return time.time() + default_ttl
+
+
+class DownloadUrlCache:
+    """下载链接缓存，按文件ID保存链接和过期时间
+    
+    距离过期不足 URL_EXPIRY_MARGIN 秒的链接不再返回，超出条数上限时淘汰最久未使用的链接。
+    """
+    
+    def __init__(self, ttl=DEFAULT_URL_TTL, max_entries=DEFAULT_URL_ENTRIES, margin=URL_EXPIRY_MARGIN):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.margin = margin
+        self._entries = OrderedDict()  # 文件ID -> (过期时间, 链接)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, file_id):
+        """返回仍然有效的链接，没有时返回None"""
+        file_id = str(file_id)
+        with self._lock:
+            entry = self._entries.get(file_id)
+            if entry is not None and entry[0] - self.margin > time.time():
+                self._entries.move_to_end(file_id)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[file_id]
+            self.misses += 1
+            return None
+    
+    def __contains__(self, file_id):
+        with self._lock:
+            entry = self._entries.get(str(file_id))
+            return entry is not None and entry[0] - self.margin > time.time()
+    
+    def put(self, file_id, url):
+        with self._lock:
+            self._entries[str(file_id)] = (url_expires_at(url, self.ttl), url)
+            self._entries.move_to_end(str(file_id))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, file_id):
+        """删除已失效的链接"""
+        with self._lock:
+            self._entries.pop(str(file_id), None)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
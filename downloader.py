@@ -0,0 +1,338 @@
+import os
+import re
+import json
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_DOWNLOAD_SEGMENTS = 4  # 并行下载的分段数
+MIN_SEGMENT_SIZE = 4 * 1024 * 1024  # 小于此大小的文件不再细分
+CHUNK_SIZE = 256 * 1024  # 每次读取的块大小
+CHECKPOINT_SUFFIX = ".123pan.json"  # 断点文件后缀，与下载文件放在同一目录
+PARTIAL_SUFFIX = ".123pan.part"  # 下载中的临时文件后缀，完成后改名为目标文件
+CHECKPOINT_INTERVAL = 1.0  # 断点文件的最短保存间隔(秒)
+
+# 下载链接过期时服务器返回的状态码
+EXPIRED_URL_STATUS = (401, 403, 404, 410)
+
+CONTENT_RANGE_PATTERN = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+|\*)")
+
+
+def split_ranges(total_size, segments, min_segment_size=MIN_SEGMENT_SIZE):
+    """把 [0, total_size) 切成最多 segments 段，返回 [(起始, 结束)]，结束位置包含在内"""
+    if total_size <= 0:
+        return []
+    segments = max(1, min(segments, total_size // max(1, min_segment_size) or 1))
+    segment_size = -(-total_size // segments)
+    return [(start, min(start + segment_size, total_size) - 1) for start in range(0, total_size, segment_size)]
+
+
+class Segment:
+    """下载分段，[start, next) 已写入磁盘，[next, end] 尚未下载"""
+    __slots__ = ("start", "end", "next")
+    
+    def __init__(self, start, end, next=None):
+        self.start = start
+        self.end = end
+        self.next = start if next is None else next
+    
+    @property
+    def done(self):
+        return self.next > self.end
+    
+    @property
+    def completed_bytes(self):
+        return self.next - self.start
+
+
+class DownloadCheckpoint:
+    """下载断点文件
+    
+    记录文件来源(文件ID)、预期大小、etag以及每个分段已完成的字节范围，
+    中断后再次下载同一文件时从断点继续。
+    """
+    
+    def __init__(self, save_path):
+        self.path = save_path + CHECKPOINT_SUFFIX
+        self.file_id = None
+        self.etag = None
+        self.http_etag = None
+        self.size = 0
+        self.segments = []
+    
+    def load(self):
+        """读取断点文件，不存在或损坏时返回False"""
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            self.file_id = data.get("fileId")
+            self.etag = data.get("etag")
+            self.http_etag = data.get("httpEtag")
+            self.size = int(data["size"])
+            self.segments = [Segment(start, end, next) for start, end, next in data["segments"]]
+            return True
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+    
+    def matches(self, file_id, etag, size, http_etag, part_path):
+        """断点是否属于同一个远程文件，且已下载的部分(临时文件)仍在磁盘上"""
+        if file_id is not None and str(self.file_id) != str(file_id):
+            return False
+        if etag and self.etag and etag != self.etag:
+            return False
+        if http_etag and self.http_etag and http_etag != self.http_etag:
+            return False
+        if self.size != size:
+            return False
+        try:
+            return os.path.getsize(part_path) == size
+        except OSError:
+            return False
+    
+    def save(self):
+        """原子地写入断点文件"""
+        data = {
+            "fileId": self.file_id,
+            "etag": self.etag,
+            "httpEtag": self.http_etag,
+            "size": self.size,
+            "segments": [[s.start, s.end, s.next] for s in self.segments],
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+    
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class SegmentedDownloader:
+    """分段并行下载器
+    
+    先用 Range: bytes=0-0 探测服务器是否支持断点续传，支持时把文件切成多段并行下载，
+    各段直接写入预分配文件的对应偏移；服务器忽略Range时退回单连接下载。
+    数据先写入 save_path + PARTIAL_SUFFIX，全部完成后才改名为 save_path，下载失败不会破坏原有的同名文件。
+    支持Range时会在下载文件旁保存断点文件，中断后再次下载同一文件会跳过已完成的部分。
+    url_provider() 用于在下载链接过期时获取新链接。
+    """
+    
+    def __init__(self, url, save_path, segments=DEFAULT_DOWNLOAD_SEGMENTS, chunk_size=CHUNK_SIZE,
+                 min_segment_size=MIN_SEGMENT_SIZE, file_id=None, etag=None, url_provider=None):
+        self.url = url
+        self.save_path = save_path
+        self.part_path = save_path + PARTIAL_SUFFIX
+        self.segments = max(1, segments)
+        self.chunk_size = chunk_size
+        self.min_segment_size = min_segment_size
+        self.file_id = file_id
+        self.etag = etag
+        self.url_provider = url_provider
+        
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.segments)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        
+        self.total_size = 0
+        self.downloaded = 0
+        self.resumed_bytes = 0
+        self.supports_range = False
+        self.http_etag = None
+        self.checkpoint = DownloadCheckpoint(save_path)
+        self._last_checkpoint = 0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()  # 同一时间只有一个分段获取新下载链接
+        self._cancelled = threading.Event()
+        self._on_progress = None
+    
+    def cancel(self):
+        """取消下载"""
+        self._cancelled.set()
+    
+    def refresh_url(self, stale_url):
+        """下载链接过期时获取新链接，多个分段同时发现过期时只刷新一次
+        
+        获取新链接需要请求接口，只持有 _refresh_lock，不阻塞其他分段在 _lock 内更新进度；
+        后到的分段拿到 _refresh_lock 时链接已经换过，直接使用新链接。
+        """
+        if not self.url_provider:
+            return None
+        with self._refresh_lock:
+            with self._lock:
+                if self.url != stale_url:
+                    return self.url
+            new_url = self.url_provider()
+            if not new_url:
+                return None
+            with self._lock:
+                if self.url == stale_url:
+                    self.url = new_url
+                return self.url
+    
+    def probe(self):
+        """探测文件大小和Range支持，返回探测响应(服务器不支持Range时可直接用作单连接下载)"""
+        response = self.session.get(self.url, headers={"Range": "bytes=0-0"}, stream=True)
+        if response.status_code in EXPIRED_URL_STATUS and self.refresh_url(self.url):
+            response.close()
+            response = self.session.get(self.url, headers={"Range": "bytes=0-0"}, stream=True)
+        if response.status_code == 416:
+            # 空文件无法满足 bytes=0-0
+            self.supports_range = False
+            self.total_size = 0
+            return response
+        response.raise_for_status()
+        
+        # 之后的分段请求直接使用重定向后的地址
+        self.url = response.url
+        self.http_etag = response.headers.get("etag")
+        
+        match = CONTENT_RANGE_PATTERN.match(response.headers.get("content-range", ""))
+        if response.status_code == 206 and match and match.group(3) != "*":
+            self.supports_range = True
+            self.total_size = int(match.group(3))
+        else:
+            self.supports_range = False
+            self.total_size = int(response.headers.get("content-length", 0))
+        return response
+    
+    def run(self, on_progress=None):
+        """下载文件，on_progress(已下载大小, 总大小) 可能在多个线程中回调"""
+        self._on_progress = on_progress
+        try:
+            probe_response = self.probe()
+            if probe_response.status_code == 416:
+                probe_response.close()
+                self.preallocate()
+                self.finish()
+                return
+            if not self.supports_range:
+                # 无法按范围续传，断点文件已没有意义
+                self.checkpoint.remove()
+                self.download_single(probe_response)
+                self.finish()
+                return
+            probe_response.close()
+            
+            segments = self.prepare_segments()
+            remaining = [s for s in segments if not s.done]
+            try:
+                if len(remaining) <= 1:
+                    for segment in remaining:
+                        self.download_range(segment)
+                else:
+                    with ThreadPoolExecutor(max_workers=len(remaining)) as pool:
+                        futures = [pool.submit(self.download_range, segment) for segment in remaining]
+                        try:
+                            for future in futures:
+                                future.result()
+                        except Exception:
+                            self._cancelled.set()
+                            raise
+            except BaseException:
+                # 保留已完成的进度，下次继续
+                self.save_checkpoint(force=True)
+                raise
+            self.finish()
+        finally:
+            self.session.close()
+    
+    def finish(self):
+        """下载完成后把临时文件改名为目标文件并删除断点"""
+        os.replace(self.part_path, self.save_path)
+        self.checkpoint.remove()
+    
+    def prepare_segments(self):
+        """读取可用的断点继续下载，否则预分配文件并新建断点"""
+        checkpoint = self.checkpoint
+        if checkpoint.load() and checkpoint.matches(self.file_id, self.etag, self.total_size, self.http_etag, self.part_path):
+            self.resumed_bytes = sum(s.completed_bytes for s in checkpoint.segments)
+            self.add_progress(self.resumed_bytes)
+            return checkpoint.segments
+        
+        checkpoint.file_id = self.file_id
+        checkpoint.etag = self.etag
+        checkpoint.http_etag = self.http_etag
+        checkpoint.size = self.total_size
+        checkpoint.segments = [
+            Segment(start, end) for start, end in split_ranges(self.total_size, self.segments, self.min_segment_size)
+        ]
+        self.preallocate()
+        self.save_checkpoint(force=True)
+        return checkpoint.segments
+    
+    def save_checkpoint(self, force=False):
+        """按间隔保存断点文件"""
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_checkpoint < CHECKPOINT_INTERVAL:
+                return
+            self._last_checkpoint = now
+            self.checkpoint.save()
+    
+    def preallocate(self):
+        """创建与目标大小相同的文件，各分段写入自己的偏移"""
+        with open(self.part_path, "wb") as f:
+            f.truncate(self.total_size)
+    
+    def download_single(self, response):
+        """服务器不支持Range时，用单个连接顺序下载"""
+        with response, open(self.part_path, "wb") as f:
+            for chunk in response.iter_content(chunk_size=self.chunk_size):
+                if self._cancelled.is_set():
+                    raise Exception("下载已取消")
+                if chunk:
+                    f.write(chunk)
+                    self.add_progress(len(chunk))
+    
+    def open_range(self, segment):
+        """请求分段剩余的部分，链接过期时刷新一次"""
+        url = self.url
+        headers = {"Range": f"bytes={segment.next}-{segment.end}"}
+        response = self.session.get(url, headers=headers, stream=True)
+        if response.status_code in EXPIRED_URL_STATUS:
+            response.close()
+            new_url = self.refresh_url(url)
+            if new_url:
+                response = self.session.get(new_url, headers=headers, stream=True)
+        if response.status_code != 206:
+            response.close()
+            raise Exception(f"分段下载失败，HTTP状态码: {response.status_code}")
+        return response
+            
+    def download_range(self, segment):
+        """下载分段剩余的字节并写入文件对应位置"""
+        with self.open_range(segment) as response:
+            # 不使用缓冲区，写入的数据即使进程退出也已交给操作系统，断点记录不会超前于文件内容
+            with open(self.part_path, "r+b", buffering=0) as f:
+                f.seek(segment.next)
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    if self._cancelled.is_set():
+                        raise Exception("下载已取消")
+                    if not chunk:
+                        continue
+                    # 防止服务器多返回数据覆盖下一段
+                    view = memoryview(chunk)[:segment.end + 1 - segment.next]
+                    while view:
+                        written = f.write(view)
+                        view = view[written:]
+                        segment.next += written
+                        self.add_progress(written)
+                    self.save_checkpoint()
+                    if segment.done:
+                        break
+            
+        if not segment.done:
+            raise Exception(f"分段下载不完整: {segment.start}-{segment.end}")
+    
+    def add_progress(self, size):
+        with self._lock:
+            self.downloaded += size
+            # 在锁内回调，保证进度单调递增
+            if self._on_progress:
+                self._on_progress(self.downloaded, self.total_size)
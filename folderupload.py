@@ -0,0 +1,232 @@
+import os
+import copy
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from hasher import get_hash_pool
+from ratelimit import TokenBucket
+from transfers import UPLOAD
+from uploader import UploadSessionStore
+from utils import format_file_size
+
+DEFAULT_CREATE_WORKERS = 8  # 同时发出的创建上传任务请求数
+DEFAULT_CREATE_QPS = 0  # 每秒最多发出的创建文件夹/上传任务请求数，0表示只受全局按接口限速的限制
+HASH_WINDOW = 32  # 同时提交给哈希线程池的文件数
+REPORT_INTERVAL = 0.5  # 汇报进度的最短间隔(秒)
+
+
+class LocalFile:
+    __slots__ = ("path", "name", "folder", "size", "stat")
+    
+    def __init__(self, path, name, folder, stat):
+        self.path = path
+        self.name = name
+        self.folder = folder  # 相对于上传根目录的文件夹路径，根目录为 ""
+        self.size = stat.st_size
+        self.stat = stat  # 扫描时的 os.stat 结果，用于记录上传会话
+
+
+def scan_local_tree(local_dir):
+    """返回 (文件夹相对路径列表(按层次排序，不含根目录), [LocalFile])，跳过无法读取的文件"""
+    folders = []
+    files = []
+    for dir_path, dir_names, file_names in os.walk(local_dir):
+        dir_names.sort()
+        relative = os.path.relpath(dir_path, local_dir)
+        relative = "" if relative == "." else relative.replace(os.sep, "/")
+        if relative:
+            folders.append(relative)
+        for name in sorted(file_names):
+            path = os.path.join(dir_path, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append(LocalFile(path, name, relative, stat))
+    folders.sort(key=lambda folder: folder.count("/"))
+    return folders, files
+
+
+class FolderUploadReport:
+    """文件夹上传的进度和结果
+    
+    new_uploads 是自上次汇报以来需要完整上传的文件 [(类型, 名称, 本地路径, 目标文件夹ID, etag, 大小)]，
+    可以直接交给 TransferManager.add_transfers。
+    """
+    
+    def __init__(self, local_dir):
+        self.local_dir = local_dir
+        self.root_id = None
+        self.folders = 0
+        self.files = 0
+        self.total_bytes = 0
+        self.hashed_files = 0
+        self.hashed_bytes = 0
+        self.reused_files = 0
+        self.reused_bytes = 0
+        self.queued_files = 0
+        self.queued_bytes = 0
+        self.failed = []  # [(本地路径, 错误信息)]
+        self.new_uploads = []
+        self.touched_folders = set()  # 内容有变化的网盘文件夹ID
+        self.done = False
+        self.started_at = time.monotonic()
+        self.elapsed = 0.0
+    
+    @property
+    def throughput(self):
+        """已完成(秒传)的字节数按耗时折算的速度"""
+        return self.reused_bytes / self.elapsed if self.elapsed else 0.0
+    
+    def snapshot(self):
+        """复制当前进度交给界面，new_uploads 交出后清空"""
+        self.elapsed = time.monotonic() - self.started_at
+        report = copy.copy(self)
+        report.failed = list(self.failed)
+        report.touched_folders = set(self.touched_folders)
+        self.new_uploads = []
+        return report
+    
+    def summary(self):
+        name = os.path.basename(os.path.normpath(self.local_dir))
+        text = (
+            f"文件夹 {name}: {self.folders} 个文件夹，{self.files} 个文件({format_file_size(self.total_bytes)})，"
+            f"已计算MD5 {self.hashed_files} 个；秒传 {self.reused_files} 个，节省 {format_file_size(self.reused_bytes)}；"
+            f"加入上传队列 {self.queued_files} 个({format_file_size(self.queued_bytes)})"
+        )
+        if self.failed:
+            text += f"；失败 {len(self.failed)} 个"
+        if self.done:
+            text += f"；用时 {self.elapsed:.1f} 秒，等效速度 {format_file_size(int(self.throughput))}/s"
+        return text
+
+
+class FolderUploader:
+    """把本地文件夹上传到网盘，保持相同的目录结构
+    
+    先逐层创建文件夹(同一层并发)，再把所有文件交给共享的哈希线程池并发计算MD5，
+    每算完一个文件就立即并发调用创建上传任务接口：服务器已有相同内容时秒传完成，不再读取文件；
+    其余文件交给传输队列完整上传。创建请求用令牌桶限速。
+    """
+    
+    def __init__(self, api, local_dir, parent_folder_id="0", hash_pool=None,
+                 create_workers=DEFAULT_CREATE_WORKERS, qps=DEFAULT_CREATE_QPS):
+        self.api = api
+        self.local_dir = os.path.abspath(local_dir)
+        self.parent_folder_id = str(parent_folder_id)
+        self.hash_pool = hash_pool or get_hash_pool()
+        self.create_workers = max(1, create_workers)
+        self.rate_limiter = TokenBucket(qps)
+        self.folder_ids = {}  # 相对路径 -> 网盘文件夹ID
+        self.report = FolderUploadReport(self.local_dir)
+        self.sessions = UploadSessionStore()
+    
+    def ensure_folder(self, name, parent_id):
+        """创建文件夹，已存在同名文件夹时使用已有的"""
+        self.rate_limiter.acquire()
+        try:
+            return self.api.mkdir(name, parent_id)
+        except Exception:
+            for record in self.api.iter_folder(parent_id, refresh=True):
+                if record.is_folder and record.filename == name:
+                    return str(record.file_id)
+            raise
+    
+    def create_folders(self, folders, executor):
+        """按层次创建文件夹，同一层的文件夹并发创建"""
+        root_name = os.path.basename(os.path.normpath(self.local_dir))
+        self.folder_ids[""] = self.ensure_folder(root_name, self.parent_folder_id)
+        self.report.root_id = self.folder_ids[""]
+        self.report.touched_folders.add(self.parent_folder_id)
+        
+        level = []
+        for folder in folders + [None]:
+            if level and (folder is None or folder.count("/") != level[0].count("/")):
+                futures = {}
+                for path in level:
+                    parent, _, name = path.rpartition("/")
+                    futures[path] = executor.submit(self.ensure_folder, name, self.folder_ids[parent])
+                for path, future in futures.items():
+                    self.folder_ids[path] = future.result()
+                self.report.folders += len(level)
+                level = []
+            if folder is not None:
+                level.append(folder)
+    
+    def create_upload(self, local_file, md5):
+        self.rate_limiter.acquire()
+        return self.api.create_file(self.folder_ids[local_file.folder], local_file.name, md5, local_file.size)
+    
+    def run(self):
+        """执行上传，逐步返回 FolderUploadReport 快照，最后一个的 done 为True"""
+        report = self.report
+        folders, files = scan_local_tree(self.local_dir)
+        report.files = len(files)
+        report.total_bytes = sum(local_file.size for local_file in files)
+        
+        executor = ThreadPoolExecutor(max_workers=self.create_workers, thread_name_prefix="folder-upload")
+        hash_futures = {}
+        create_futures = {}
+        try:
+            self.create_folders(folders, executor)
+            yield report.snapshot()
+            
+            pending = deque(files)
+            last_report = time.monotonic()
+            while pending or hash_futures or create_futures:
+                # 只让少量文件排在哈希线程池中，文件很多时每次等待的Future数量也不会太多
+                while pending and len(hash_futures) < HASH_WINDOW:
+                    local_file = pending.popleft()
+                    hash_futures[self.hash_pool.submit(local_file.path)] = local_file
+                done, _ = wait(list(hash_futures) + list(create_futures), return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in hash_futures:
+                        local_file = hash_futures.pop(future)
+                        try:
+                            digest = future.result()
+                        except Exception as e:
+                            report.failed.append((local_file.path, str(e)))
+                            continue
+                        report.hashed_files += 1
+                        report.hashed_bytes += local_file.size
+                        create_futures[executor.submit(self.create_upload, local_file, digest.md5)] = (local_file, digest.md5)
+                        continue
+                    
+                    local_file, md5 = create_futures.pop(future)
+                    folder_id = self.folder_ids[local_file.folder]
+                    try:
+                        data = future.result()
+                    except Exception as e:
+                        report.failed.append((local_file.path, str(e)))
+                        continue
+                    report.touched_folders.add(folder_id)
+                    if data.get("reuse", False):
+                        report.reused_files += 1
+                        report.reused_bytes += local_file.size
+                    else:
+                        # 记录已创建的上传任务，上传线程找到会话后直接上传分片，不再重复创建
+                        preupload_id = data.get("preuploadID")
+                        slice_size = data.get("sliceSize")
+                        if preupload_id and slice_size:
+                            self.sessions.save(local_file.path, folder_id, local_file.stat, md5, preupload_id, slice_size)
+                        report.queued_files += 1
+                        report.queued_bytes += local_file.size
+                        report.new_uploads.append((UPLOAD, local_file.name, local_file.path, folder_id, md5, local_file.size))
+                
+                if time.monotonic() - last_report >= REPORT_INTERVAL:
+                    last_report = time.monotonic()
+                    yield report.snapshot()
+            
+            report.done = True
+            for folder_id in report.touched_folders:
+                self.api.invalidate_folder(folder_id)
+            yield report.snapshot()
+        finally:
+            for future in list(hash_futures) + list(create_futures):
+                future.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def upload_folder(api, local_dir, parent_folder_id="0", **kwargs):
+    """FolderUploader.run 的简写，用于 RequestExecutor.submit_stream"""
+    return FolderUploader(api, local_dir, parent_folder_id, **kwargs).run()
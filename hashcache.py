@@ -0,0 +1,110 @@
+import os
+import time
+import sqlite3
+import threading
+from utils import HASH_CACHE_FILE
+
+DEFAULT_MAX_ENTRIES = 200000  # 最多缓存的文件数
+DEFAULT_MAX_AGE = 90 * 24 * 3600  # 超过此时间未使用的记录会被清除(秒)
+EVICT_EVERY = 500  # 每写入多少条记录检查一次淘汰
+
+
+class HashCache:
+    """基于SQLite的文件哈希缓存
+    
+    以 (设备号, inode, 大小, 修改时间ns) 标识文件，保存整个文件的MD5。
+    文件被修改后对应记录自动失效，按条数上限和最长未使用时间淘汰旧记录。
+    """
+    
+    def __init__(self, path=HASH_CACHE_FILE, max_entries=DEFAULT_MAX_ENTRIES, max_age=DEFAULT_MAX_AGE):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS file_hash (
+                dev INTEGER NOT NULL,
+                ino INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                md5 TEXT NOT NULL,
+                path TEXT,
+                used_at REAL NOT NULL,
+                PRIMARY KEY (dev, ino)
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS file_hash_used_at ON file_hash (used_at)")
+        self.conn.commit()
+    
+    def get(self, file_path, stat=None):
+        """查询文件的MD5，没有缓存或文件已变化时返回None"""
+        stat = stat or os.stat(file_path)
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT size, mtime_ns, md5 FROM file_hash WHERE dev = ? AND ino = ?",
+                (stat.st_dev, stat.st_ino)
+            ).fetchone()
+            if row is None:
+                return None
+            size, mtime_ns, md5 = row
+            if size != stat.st_size or mtime_ns != stat.st_mtime_ns:
+                # 文件已被修改
+                self.conn.execute("DELETE FROM file_hash WHERE dev = ? AND ino = ?", (stat.st_dev, stat.st_ino))
+                self.conn.commit()
+                return None
+            self.conn.execute(
+                "UPDATE file_hash SET used_at = ?, path = ? WHERE dev = ? AND ino = ?",
+                (time.time(), os.path.abspath(file_path), stat.st_dev, stat.st_ino)
+            )
+            self.conn.commit()
+        return md5
+    
+    def put(self, file_path, md5, stat=None):
+        """保存文件哈希，stat应为计算哈希前获取的文件状态"""
+        stat = stat or os.stat(file_path)
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO file_hash (dev, ino, size, mtime_ns, md5, path, used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns, md5, os.path.abspath(file_path), time.time())
+            )
+            self.conn.commit()
+            self._writes += 1
+            if self._writes % EVICT_EVERY == 0:
+                self._evict()
+    
+    def evict(self):
+        """清除过期和超出数量上限的记录，返回清除的条数"""
+        with self._lock:
+            return self._evict()
+    
+    def _evict(self):
+        removed = self.conn.execute("DELETE FROM file_hash WHERE used_at < ?", (time.time() - self.max_age,)).rowcount
+        removed += self.conn.execute(
+            "DELETE FROM file_hash WHERE rowid IN ("
+            "SELECT rowid FROM file_hash ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        ).rowcount
+        self.conn.commit()
+        return removed
+    
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_hash_cache():
+    """获取全局共享的哈希缓存"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = HashCache()
+        return _default_cache
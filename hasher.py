@@ -0,0 +1,112 @@
+import os
+import mmap
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from hashcache import get_hash_cache
+
+HASH_BUFFER_SIZE = 8 * 1024 * 1024  # 每次送入hashlib的数据量
+DEFAULT_HASH_WORKERS = min(4, os.cpu_count() or 1)  # 同时计算哈希的文件数
+
+
+class FileDigest:
+    """文件的MD5和计算时的大小"""
+    __slots__ = ("md5", "size")
+    
+    def __init__(self, md5, size):
+        self.md5 = md5
+        self.size = size
+
+
+def _iter_blocks(f, size, buffer_size):
+    """按 buffer_size 依次返回文件内容，优先使用mmap避免额外复制"""
+    if size == 0:
+        return
+    try:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        mm = None
+    
+    if mm is not None:
+        with mm:
+            if hasattr(mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            view = memoryview(mm)
+            try:
+                for offset in range(0, len(mm), buffer_size):
+                    block = view[offset:offset + buffer_size]
+                    try:
+                        yield block
+                    finally:
+                        block.release()
+            finally:
+                view.release()
+        return
+    
+    # 无法映射时(如网络文件系统)用预分配缓冲区读取
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    while True:
+        length = f.readinto(buffer)
+        if not length:
+            break
+        yield view[:length]
+
+
+def hash_file(file_path, buffer_size=HASH_BUFFER_SIZE):
+    """用大块读取(优先mmap)一次计算整个文件的MD5
+    
+    上传接口只需要整个文件的MD5，分片大小由创建上传任务时服务器返回，不预先计算分片MD5。
+    """
+    file_md5 = hashlib.md5()
+    with open(file_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        for block in _iter_blocks(f, size, buffer_size):
+            file_md5.update(block)
+    return FileDigest(file_md5.hexdigest(), size)
+
+
+def get_file_digest(file_path, stat=None, cache=None):
+    """读取哈希缓存，文件变化时重新计算并写回缓存"""
+    cache = cache or get_hash_cache()
+    stat = stat or os.stat(file_path)
+    md5 = cache.get(file_path, stat)
+    if md5:
+        return FileDigest(md5, stat.st_size)
+    
+    digest = hash_file(file_path)
+    # 计算期间文件被修改时不写入缓存
+    if os.stat(file_path).st_mtime_ns == stat.st_mtime_ns:
+        cache.put(file_path, digest.md5, stat=stat)
+    return digest
+
+
+class HashPool:
+    """计算文件哈希的线程池，hashlib计算时会释放GIL，多个文件可以同时计算"""
+    
+    def __init__(self, workers=DEFAULT_HASH_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hash")
+    
+    def submit(self, file_path):
+        """提交一个文件，返回结果为 FileDigest 的 Future"""
+        return self.executor.submit(get_file_digest, file_path)
+    
+    def map(self, file_paths):
+        """按顺序返回多个文件的 FileDigest"""
+        return self.executor.map(get_file_digest, file_paths)
+    
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+_default_pool = None
+_default_lock = threading.Lock()
+
+
+def get_hash_pool():
+    """获取全局共享的哈希线程池"""
+    global _default_pool
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = HashPool()
+        return _default_pool
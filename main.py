@@ -2,13 +2,14 @@ import sys
 from PySide6.QtWidgets import QApplication
 from api import API_123pan
 from auth import AuthManager
+from searchindex import get_search_index
 from ui import MainWindow
 
 def main():
     app = QApplication(sys.argv)
     
     # 创建API实例
-    api = API_123pan()
+    api = API_123pan(search_index=get_search_index())
     
     # 创建认证管理器
     auth_manager = AuthManager(api)
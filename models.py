@@ -0,0 +1,199 @@
+from array import array
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex
+from utils import format_file_size, format_duration
+from records import CATEGORY_LABELS, MAX_NORMAL_STATUS, FOLDER_TYPE
+from transfers import DOWNLOAD, RUNNING, FAILED, STATE_LABELS, PRIORITY_LABELS
+
+DISPLAY_ROLE = int(Qt.DisplayRole)
+
+FILE_COLUMNS = ["文件ID", "文件名", "类型", "大小", "分类", "状态", "MD5"]
+
+
+class FileTableModel(QAbstractTableModel):
+    """文件列表的表格模型
+    
+    按列保存 FileRecord 的原始字段(整数字段用数组)，视图只为可见的行调用 data()，
+    类型、分类、状态文字和文件大小在显示时才生成。
+    每次追加一页只触发一次 beginInsertRows/endInsertRows。
+    """
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.reset_columns()
+    
+    def reset_columns(self):
+        self.file_ids = array("q")
+        self.names = []
+        self.folder_flags = bytearray()  # 1 表示文件夹
+        self.sizes = array("q")
+        self.categories = array("i")
+        self.statuses = array("i")
+        self.etags = []
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.names)
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(FILE_COLUMNS)
+    
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return FILE_COLUMNS[section]
+        return None
+    
+    def data(self, index, role=Qt.DisplayRole):
+        # 视图绘制每个单元格都会查询多种role，非显示role直接返回
+        if role != DISPLAY_ROLE:
+            return None
+        row = index.row()
+        column = index.column()
+        if column == 1:
+            return self.names[row]
+        if column == 0:
+            return str(self.file_ids[row])
+        if column == 2:
+            return "文件夹" if self.folder_flags[row] else "文件"
+        if column == 3:
+            return format_file_size(self.sizes[row])
+        if column == 4:
+            return CATEGORY_LABELS.get(self.categories[row], "未知")
+        if column == 5:
+            return "正常" if self.statuses[row] <= MAX_NORMAL_STATUS else "驳回"
+        if column == 6:
+            return self.etags[row]
+        return None
+    
+    def append_files(self, files):
+        """在末尾追加一页 FileRecord"""
+        if not files:
+            return
+        first = len(self.names)
+        self.beginInsertRows(QModelIndex(), first, first + len(files) - 1)
+        for record in files:
+            self.file_ids.append(record.file_id)
+            self.names.append(record.filename)
+            self.folder_flags.append(1 if record.type == FOLDER_TYPE else 0)
+            self.sizes.append(record.size)
+            self.categories.append(record.category)
+            self.statuses.append(record.status)
+            self.etags.append(record.etag or "")
+        self.endInsertRows()
+    
+    def set_files(self, files):
+        """替换全部文件"""
+        self.beginResetModel()
+        self.reset_columns()
+        self.endResetModel()
+        self.append_files(files)
+    
+    def clear(self):
+        self.set_files([])
+    
+    def file_id(self, row):
+        return str(self.file_ids[row])
+    
+    def file_name(self, row):
+        return self.names[row]
+    
+    def is_folder(self, row):
+        return bool(self.folder_flags[row])
+    
+    def etag(self, row):
+        return self.etags[row]
+    
+    def raw_size(self, row):
+        return self.sizes[row]
+
+
+TRANSFER_COLUMNS = ["名称", "方向", "优先级", "状态", "进度", "速度", "剩余时间"]
+
+
+class TransferTableModel(QAbstractTableModel):
+    """传输队列的表格模型，行与 TransferManager 中的传输一一对应
+    
+    进度、速度和剩余时间由管理器定时刷新，每次只发出一个覆盖这几列的 dataChanged。
+    一次加入的多个传输只插入一次，rows 记录传输ID所在的行，更新某一行时不必查找整个列表。
+    """
+    
+    def __init__(self, manager, parent=None):
+        super().__init__(parent)
+        self.manager = manager
+        self.ids = list(manager.transfers)
+        self.rows = {transfer_id: row for row, transfer_id in enumerate(self.ids)}  # 传输ID -> 行号
+        manager.added.connect(self.on_added)
+        manager.changed.connect(self.on_changed)
+        manager.removed.connect(self.on_removed)
+        manager.progressed.connect(self.on_progressed)
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.ids)
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(TRANSFER_COLUMNS)
+    
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return TRANSFER_COLUMNS[section]
+        return None
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if role != DISPLAY_ROLE:
+            return None
+        transfer = self.manager.transfers.get(self.ids[index.row()])
+        if transfer is None:
+            return None
+        column = index.column()
+        if column == 0:
+            return transfer.name
+        if column == 1:
+            return "下载" if transfer.kind == DOWNLOAD else "上传"
+        if column == 2:
+            return PRIORITY_LABELS.get(transfer.priority, "")
+        if column == 3:
+            if transfer.state == FAILED and transfer.error:
+                return f"{STATE_LABELS[FAILED]}: {transfer.error}"
+            return STATE_LABELS[transfer.state]
+        if column == 4:
+            if not transfer.size:
+                return ""
+            percent = min(100, transfer.done_bytes * 100 // transfer.size)
+            return f"{percent}% ({format_file_size(transfer.done_bytes)}/{format_file_size(transfer.size)})"
+        if column == 5:
+            return f"{format_file_size(int(transfer.speed))}/s" if transfer.state == RUNNING else ""
+        if column == 6:
+            return format_duration(transfer.eta) if transfer.state == RUNNING and transfer.eta is not None else ""
+        return None
+    
+    def transfer_id(self, row):
+        return self.ids[row]
+    
+    def on_added(self, transfer_ids):
+        if not transfer_ids:
+            return
+        first = len(self.ids)
+        self.beginInsertRows(QModelIndex(), first, first + len(transfer_ids) - 1)
+        for row, transfer_id in enumerate(transfer_ids, first):
+            self.rows[transfer_id] = row
+        self.ids.extend(transfer_ids)
+        self.endInsertRows()
+    
+    def on_changed(self, transfer_id):
+        row = self.rows.get(transfer_id)
+        if row is None:
+            return
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(TRANSFER_COLUMNS) - 1))
+    
+    def on_removed(self, transfer_id):
+        row = self.rows.pop(transfer_id, None)
+        if row is None:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.ids[row]
+        # 只有后面的行号改变
+        for index in range(row, len(self.ids)):
+            self.rows[self.ids[index]] = index
+        self.endRemoveRows()
+    
+    def on_progressed(self):
+        if self.ids:
+            self.dataChanged.emit(self.index(0, 4), self.index(len(self.ids) - 1, len(TRANSFER_COLUMNS) - 1))
@@ -0,0 +1,142 @@
+import json
+import time
+import heapq
+import itertools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from ratelimit import get_request_scheduler
+
+ASYNC_RESULT_URL = "https://open-api.123pan.com/upload/v1/file/upload_async_result"
+FIRST_POLL_DELAY = 0.25  # 上传完成后第一次查询结果前等待的秒数
+POLL_BACKOFF = 1.5  # 每次查询未完成后查询间隔乘以此系数
+MAX_POLL_INTERVAL = 5.0  # 查询间隔的上限(秒)
+POLL_TIMEOUT = 300  # 超过此时间服务器仍未处理完则放弃(秒)
+POLL_WORKERS = 4  # 同时进行的查询请求数
+
+
+class PendingResult:
+    """一个等待服务器处理的上传"""
+    __slots__ = ("access_token", "preupload_id", "future", "started_at", "interval", "polls")
+    
+    def __init__(self, access_token, preupload_id, interval):
+        self.access_token = access_token
+        self.preupload_id = preupload_id
+        self.future = Future()
+        self.started_at = time.monotonic()
+        self.interval = interval
+        self.polls = 0
+
+
+class UploadResultPoller:
+    """所有上传共用的异步上传结果查询服务
+    
+    分片上传完成后服务器可能需要异步处理，submit(access_token, preupload_id) 登记后立即返回 Future，
+    上传线程不必等待。一个后台线程按到期时间安排查询，每个上传的查询间隔从 first_delay 开始，
+    每次未完成后乘以 backoff，最长 max_interval。处理完成时 Future 的结果为 upload_async_result 返回的 data，
+    服务器返回错误或超过 timeout 秒仍未完成时结果为 None。同一个 preuploadID 重复登记时共用一个 Future。
+    """
+    
+    def __init__(self, url=ASYNC_RESULT_URL, first_delay=FIRST_POLL_DELAY, backoff=POLL_BACKOFF,
+                 max_interval=MAX_POLL_INTERVAL, timeout=POLL_TIMEOUT, workers=POLL_WORKERS, scheduler=None):
+        self.url = url
+        self.first_delay = first_delay
+        self.backoff = backoff
+        self.max_interval = max_interval
+        self.timeout = timeout
+        self.scheduler = scheduler
+        self.requests = 0  # 已发出的查询请求数
+        self._pending = {}  # preuploadID -> PendingResult
+        self._heap = []  # (下次查询时间, 序号, PendingResult)
+        self._order = itertools.count()
+        self._condition = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._thread = None
+    
+    def submit(self, access_token, preupload_id):
+        """登记等待处理结果的上传，返回 Future"""
+        with self._condition:
+            pending = self._pending.get(preupload_id)
+            if pending is not None:
+                return pending.future
+            pending = PendingResult(access_token, preupload_id, self.first_delay)
+            self._pending[preupload_id] = pending
+            self._push(pending, pending.started_at + self.first_delay)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        return pending.future
+    
+    def pending_count(self):
+        with self._condition:
+            return len(self._pending)
+    
+    def _push(self, pending, due):
+        heapq.heappush(self._heap, (due, next(self._order), pending))
+        self._condition.notify()
+    
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    self._condition.wait(self._heap[0][0] - time.monotonic() if self._heap else None)
+                _, _, pending = heapq.heappop(self._heap)
+            self._pool.submit(self._poll, pending)
+    
+    def _poll(self, pending):
+        payload = json.dumps({"preuploadID": pending.preupload_id})
+        headers = {
+            'Content-Type': 'application/json',
+            'Platform': 'open_platform',
+            'Authorization': pending.access_token
+        }
+        pending.polls += 1
+        with self._condition:
+            self.requests += 1
+        try:
+            response_data = (self.scheduler or get_request_scheduler()).send("POST", self.url, payload, headers)
+        except Exception:
+            # 网络错误时稍后再查，直到超时
+            response_data = None
+        
+        if response_data is not None:
+            if response_data.get("code") != 0:
+                self._resolve(pending, None)
+                return
+            result_data = response_data.get("data", {})
+            if result_data.get("completed", False):
+                self._resolve(pending, result_data)
+                return
+        
+        now = time.monotonic()
+        if now - pending.started_at >= self.timeout:
+            self._resolve(pending, None)
+            return
+        pending.interval = min(self.max_interval, pending.interval * self.backoff)
+        with self._condition:
+            self._push(pending, now + pending.interval)
+    
+    def _resolve(self, pending, result):
+        with self._condition:
+            self._pending.pop(pending.preupload_id, None)
+        pending.future.set_result(result)
+
+
+_default_poller = None
+_default_lock = threading.Lock()
+
+
+def get_upload_result_poller():
+    """获取全局共享的上传结果查询服务"""
+    global _default_poller
+    with _default_lock:
+        if _default_poller is None:
+            _default_poller = UploadResultPoller()
+        return _default_poller
+
+
+def configure_upload_result_poller(**kwargs):
+    """使用新参数替换全局上传结果查询服务(url, first_delay, backoff, max_interval, timeout, workers, scheduler)"""
+    global _default_poller
+    with _default_lock:
+        _default_poller = UploadResultPoller(**kwargs)
+        return _default_poller
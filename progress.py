@@ -0,0 +1,84 @@
+import math
+import time
+
+PROGRESS_EMIT_INTERVAL = 0.25  # 传输线程发出进度的最短间隔(秒)
+SPEED_SMOOTHING = 3.0  # 速度平滑的时间常数(秒)，越大越平稳
+
+
+class ProgressThrottle:
+    """合并频繁的进度回调，interval 秒内最多调用一次 emit(已完成, 总量)，完成时总是调用
+    
+    下载每读一块数据就更新一次进度，直接发出跨线程信号时界面线程忙于处理信号。
+    update 需要串行调用(SegmentedDownloader 在锁内回调)。
+    """
+    
+    def __init__(self, emit, interval=PROGRESS_EMIT_INTERVAL):
+        self.emit = emit
+        self.interval = interval
+        self.emitted = 0  # 实际调用 emit 的次数
+        self._last_emit = 0.0
+        self._pending = None
+    
+    def update(self, done, total):
+        now = time.monotonic()
+        # 总量未知(total 为0，例如没有 Content-Length 的下载)时同样合并，结束后由 flush 送出最后的进度
+        if not (total and done >= total) and now - self._last_emit < self.interval:
+            self._pending = (done, total)
+            return
+        self._send(now, done, total)
+    
+    def flush(self):
+        """送出尚未发出的最后一次进度"""
+        if self._pending is not None:
+            self._send(time.monotonic(), *self._pending)
+    
+    def _send(self, now, done, total):
+        self._last_emit = now
+        self._pending = None
+        self.emitted += 1
+        self.emit(done, total)
+
+
+class ProgressAggregator:
+    """按固定频率采样各传输的已完成字节数，计算平滑后的速度和剩余时间
+    
+    速度按指数加权平均，时间常数为 smoothing 秒，不因单次采样的波动跳变；
+    剩余时间为剩余字节数除以平滑后的速度，速度为0时为None。
+    """
+    
+    def __init__(self, smoothing=SPEED_SMOOTHING):
+        self.smoothing = smoothing
+        self._bytes = {}  # 键 -> 上次采样时的已完成字节数
+        self._speeds = {}  # 键 -> 平滑后的速度(字节/秒)
+        self._last_tick = time.monotonic()
+    
+    def reset(self, key):
+        """传输开始(或从断点继续)时调用，下一次采样只作为基准，断点前已完成的字节数不计入速度"""
+        self._bytes[key] = None
+        self._speeds.pop(key, None)
+    
+    def remove(self, key):
+        self._bytes.pop(key, None)
+        self._speeds.pop(key, None)
+    
+    def sample(self, counters, now=None):
+        """counters 为 {键: (已完成字节数, 总字节数)}，返回 {键: (速度, 剩余秒数)}"""
+        now = time.monotonic() if now is None else now
+        elapsed = max(now - self._last_tick, 1e-3)
+        self._last_tick = now
+        weight = 1 - math.exp(-elapsed / self.smoothing) if self.smoothing else 1.0
+        results = {}
+        for key, (done, total) in counters.items():
+            last = self._bytes.get(key)
+            self._bytes[key] = done
+            if last is None:
+                results[key] = (0.0, None)
+                continue
+            instant = max(0, done - last) / elapsed
+            # 第一次计算出的速度直接作为初始值
+            speed = self._speeds.get(key, instant)
+            speed += (instant - speed) * weight
+            self._speeds[key] = speed
+            remaining = max(0, total - done)
+            results[key] = (speed, remaining / speed if speed > 0 and total else None)
+        return results
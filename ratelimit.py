@@ -0,0 +1,235 @@
+import json
+import time
+import random
+import threading
+from urllib.parse import urlparse
+from transport import get_transport
+
+
+class TokenBucket:
+    """令牌桶限速器，平均每秒 rate 个请求，最多允许 burst 个突发请求
+    
+    rate 为 0 或 None 时不限速。
+    """
+    
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, rate or 1)
+        self.tokens = self.burst
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+    
+    def try_acquire(self, tokens=1):
+        """有足够令牌时立即取走并返回True，否则返回False"""
+        if not self.rate:
+            return True
+        with self._lock:
+            self._refill(time.monotonic())
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True
+            return False
+    
+    def reserve(self, tokens=1):
+        """预支令牌，返回需要等待的秒数，多个调用者按到达顺序排队"""
+        if not self.rate:
+            return 0
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= tokens
+            return -self.tokens / self.rate if self.tokens < 0 else 0
+    
+    def acquire(self, tokens=1):
+        """取走令牌，不足时阻塞等待，返回等待的秒数"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+RATE_LIMIT_CODES = (429,)  # 表示请求过于频繁的HTTP状态码和接口返回的code
+DEFAULT_ENDPOINT_QPS = 10  # 未列出的接口每秒最多发出的请求数
+# 各接口每秒最多发出的请求数，0表示不限制
+ENDPOINT_QPS = {
+    "/api/v1/access_token": 1,
+    "/api/v1/user/info": 1,
+    "/api/v2/file/list": 10,
+    "/api/v1/file/download_info": 10,
+    "/upload/v1/file/mkdir": 5,
+    "/upload/v1/file/create": 5,
+    "/upload/v1/file/get_upload_url": 20,
+    "/upload/v1/file/upload_complete": 10,
+    "/upload/v1/file/upload_async_result": 10,
+}
+MIN_ENDPOINT_QPS = 0.5  # 退避后速率的下限
+DECREASE_FACTOR = 0.7  # 被限流时速率乘以此系数
+BACKOFF_BASE = 1.0  # 降低速率后仍被限流时暂停的秒数，继续被限流时翻倍
+MAX_BACKOFF = 30.0  # 最长暂停秒数
+RECOVERY_STEP = 0.1  # 每次恢复的速率占上限的比例
+RECOVERY_INTERVAL = 1.0  # 恢复速率的最短间隔(秒)，也是把多个限流响应视为同一次限流的时间窗口
+MAX_RATE_LIMIT_RETRIES = 10  # 被限流后最多重试的次数
+
+
+def is_rate_limited(status, data_dict):
+    if status in RATE_LIMIT_CODES:
+        return True
+    return isinstance(data_dict, dict) and data_dict.get("code") in RATE_LIMIT_CODES
+
+
+class EndpointLimiter:
+    """单个接口的令牌桶，被限流时降低速率，降低后仍被限流时再暂停一段时间，之后每秒恢复一点速率直到上限
+    
+    同时发出的请求常常一起被限流，RECOVERY_INTERVAL 内收到的多个限流响应只算一次。
+    """
+    
+    def __init__(self, qps):
+        self.max_rate = qps
+        # 不允许突发，任意1秒内的请求数都不超过当前速率
+        self.bucket = TokenBucket(qps, burst=1)
+        self.paused_until = 0.0
+        self.consecutive = 0  # 连续被限流的次数
+        self.changed_at = 0.0  # 上次调整速率的时间
+        self.requests = 0
+        self.rate_limited = 0
+        self.waited = 0.0
+        self._lock = threading.Lock()
+    
+    def reserve(self):
+        """预约一次请求，返回发送前需要等待的秒数"""
+        with self._lock:
+            self.requests += 1
+            pause = max(0.0, self.paused_until - time.monotonic())
+        wait = pause + self.bucket.reserve()
+        with self._lock:
+            self.waited += wait
+        return wait
+    
+    def on_success(self):
+        with self._lock:
+            self.consecutive = 0
+            now = time.monotonic()
+            if self.max_rate and self.bucket.rate < self.max_rate and now - self.changed_at >= RECOVERY_INTERVAL:
+                self.bucket.rate = min(self.max_rate, self.bucket.rate + self.max_rate * RECOVERY_STEP)
+                self.changed_at = now
+    
+    def on_rate_limited(self, retry_after=None):
+        """降低速率，必要时暂停，返回暂停的秒数"""
+        with self._lock:
+            self.rate_limited += 1
+            now = time.monotonic()
+            if now - self.changed_at < RECOVERY_INTERVAL:
+                return max(0.0, self.paused_until - now)
+            self.changed_at = now
+            self.consecutive += 1
+            if self.max_rate:
+                self.bucket.rate = max(MIN_ENDPOINT_QPS, self.bucket.rate * DECREASE_FACTOR)
+            if retry_after:
+                backoff = retry_after
+            elif self.consecutive > 1 or not self.max_rate:
+                # 加入随机抖动，避免多个进程在同一时刻恢复
+                backoff = min(MAX_BACKOFF, BACKOFF_BASE * 2 ** max(0, self.consecutive - 2)) * random.uniform(0.5, 1.0)
+            else:
+                backoff = 0.0
+            self.paused_until = max(self.paused_until, now + backoff)
+            return backoff
+
+
+class RequestScheduler:
+    """按接口限速的请求调度器
+    
+    每个接口(URL路径)有自己的令牌桶，所有线程(列表遍历、上传、下载链接预取等)共享同一个调度器，
+    总请求速率不会超过接口的限制。接口返回限流(HTTP 429 或 code 429)时该接口降低速率，
+    持续被限流时按指数退避暂停(带随机抖动，优先使用 Retry-After)，然后重试同一请求，之后逐步恢复速率。
+    """
+    
+    def __init__(self, limits=None, default_qps=DEFAULT_ENDPOINT_QPS, max_retries=MAX_RATE_LIMIT_RETRIES):
+        self.limits = dict(ENDPOINT_QPS if limits is None else limits)
+        self.default_qps = default_qps
+        self.max_retries = max_retries
+        self._endpoints = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def endpoint(url):
+        return urlparse(url).path
+    
+    def limiter(self, endpoint):
+        with self._lock:
+            limiter = self._endpoints.get(endpoint)
+            if limiter is None:
+                limiter = EndpointLimiter(self.limits.get(endpoint, self.default_qps))
+                self._endpoints[endpoint] = limiter
+            return limiter
+    
+    def send(self, method, url, body=None, headers=None, transport=None):
+        """按接口限速发送请求，被限流时退避重试，返回解析后的JSON"""
+        transport = transport or get_transport()
+        limiter = self.limiter(self.endpoint(url))
+        for attempt in range(self.max_retries + 1):
+            wait = limiter.reserve()
+            if wait > 0:
+                time.sleep(wait)
+            rate_limited, data_dict = self.handle_response(limiter, transport.request(method, url, body, headers))
+            if not rate_limited:
+                return data_dict
+        raise self.exhausted(url)
+    
+    def handle_response(self, limiter, res):
+        """解析响应，返回 (是否被限流, JSON)；被限流时该接口退避，之后的请求在预约时等待"""
+        try:
+            data_dict = json.loads(res.data)
+        except ValueError:
+            if res.status not in RATE_LIMIT_CODES:
+                raise
+            data_dict = None
+        if is_rate_limited(res.status, data_dict):
+            limiter.on_rate_limited(retry_after_seconds(res))
+            return True, None
+        limiter.on_success()
+        return False, data_dict
+    
+    def exhausted(self, url):
+        return Exception(f"请求过于频繁，已重试 {self.max_retries} 次: {self.endpoint(url)}")
+    
+    def stats(self):
+        """返回 {接口: (当前速率, 速率上限, 请求数, 被限流次数, 累计等待秒数)}"""
+        with self._lock:
+            endpoints = dict(self._endpoints)
+        return {
+            endpoint: (limiter.bucket.rate, limiter.max_rate, limiter.requests, limiter.rate_limited, limiter.waited)
+            for endpoint, limiter in endpoints.items()
+        }
+
+
+def retry_after_seconds(res):
+    value = res.getheader("Retry-After")
+    try:
+        return min(MAX_BACKOFF, float(value)) if value else None
+    except ValueError:
+        return None
+
+
+_default_scheduler = None
+_default_lock = threading.Lock()
+
+
+def get_request_scheduler():
+    """获取全局共享的请求调度器"""
+    global _default_scheduler
+    with _default_lock:
+        if _default_scheduler is None:
+            _default_scheduler = RequestScheduler()
+        return _default_scheduler
+
+
+def configure_request_scheduler(**kwargs):
+    """使用新参数替换全局请求调度器(limits, default_qps, max_retries)"""
+    global _default_scheduler
+    with _default_lock:
+        _default_scheduler = RequestScheduler(**kwargs)
+        return _default_scheduler
@@ -0,0 +1,63 @@
+from utils import format_file_size
+
+FOLDER_TYPE = 1  # 开放平台中 type=1 表示文件夹
+CATEGORY_LABELS = {0: "未知", 1: "音频", 2: "视频", 3: "图片"}
+MAX_NORMAL_STATUS = 100  # status 大于此值表示文件被驳回
+
+
+class FileRecord:
+    """文件列表中的一个文件
+    
+    只保存接口返回的原始字段(整数和字符串)，类型、分类、状态等显示文字和
+    可读的文件大小在需要时才生成。
+    """
+    __slots__ = ("file_id", "filename", "type", "size", "etag", "status", "parent_file_id", "category", "trashed")
+    
+    def __init__(self, file_id, filename, type=0, size=0, etag=None, status=0, parent_file_id=0, category=0, trashed=0):
+        self.file_id = file_id
+        self.filename = filename
+        self.type = type
+        self.size = size
+        self.etag = etag
+        self.status = status
+        self.parent_file_id = parent_file_id
+        self.category = category
+        self.trashed = trashed
+    
+    @classmethod
+    def from_api(cls, file):
+        """由 /api/v2/file/list 返回的单个文件生成"""
+        return cls(
+            file.get("fileId"),
+            file.get("filename"),
+            file.get("type") or 0,
+            file.get("size") or 0,
+            file.get("etag"),
+            file.get("status") or 0,
+            file.get("parentFileId"),
+            file.get("category") or 0,
+            file.get("trashed") or 0,
+        )
+    
+    @property
+    def is_folder(self):
+        return self.type == FOLDER_TYPE
+    
+    @property
+    def type_label(self):
+        return "文件夹" if self.type == FOLDER_TYPE else "文件"
+    
+    @property
+    def size_label(self):
+        return format_file_size(self.size)
+    
+    @property
+    def category_label(self):
+        return CATEGORY_LABELS.get(self.category, "未知")
+    
+    @property
+    def status_label(self):
+        return "正常" if self.status <= MAX_NORMAL_STATUS else "驳回"
+    
+    def __repr__(self):
+        return f"FileRecord({self.file_id!r}, {self.filename!r})"
@@ -0,0 +1,265 @@
+import os
+import re
+import time
+import hashlib
+import sqlite3
+import threading
+from records import FileRecord, FOLDER_TYPE
+from utils import SEARCH_INDEX_FILE
+
+DEFAULT_SEARCH_LIMIT = 500  # 每次搜索最多返回的条数
+MIN_TRIGRAM_LENGTH = 3  # 少于3个字符的关键字无法使用trigram索引，退回逐行匹配
+
+SIZE_UNITS = {"": 1, "B": 1, "K": 1024, "KB": 1024, "M": 1024 ** 2, "MB": 1024 ** 2,
+              "G": 1024 ** 3, "GB": 1024 ** 3, "T": 1024 ** 4, "TB": 1024 ** 4}
+SIZE_PATTERN = re.compile(r"^(\d+(?:\.\d+)?)\s*([KMGT]?B?)$", re.IGNORECASE)
+MD5_PATTERN = re.compile(r"^[0-9a-fA-F]{32}$")
+
+
+def parse_size(text):
+    """把 "100MB"、"1.5G"、"2048" 之类的大小转换为字节数"""
+    match = SIZE_PATTERN.match(text.strip())
+    if not match:
+        raise ValueError(f"无法识别的大小: {text}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+
+
+def parse_query(text):
+    """解析搜索框中的内容
+    
+    支持 ext:mp4、size:>100MB、size:<1GB、size:10MB..1GB、md5:<etag>(32位十六进制会自动识别)，
+    其余文字作为文件名中的子串。返回 search() 的关键字参数。
+    """
+    query = {"text": None, "ext": None, "min_size": None, "max_size": None, "etag": None}
+    words = []
+    for token in text.split():
+        key, _, value = token.partition(":")
+        key = key.lower()
+        if value and key == "ext":
+            query["ext"] = value.lstrip(".").lower()
+        elif value and key in ("md5", "etag"):
+            query["etag"] = value.lower()
+        elif value and key == "size":
+            if ".." in value:
+                low, _, high = value.partition("..")
+                query["min_size"] = parse_size(low) if low else None
+                query["max_size"] = parse_size(high) if high else None
+            elif value.startswith(">"):
+                query["min_size"] = parse_size(value.lstrip(">="))
+            elif value.startswith("<"):
+                query["max_size"] = parse_size(value.lstrip("<="))
+            else:
+                query["min_size"] = query["max_size"] = parse_size(value)
+        elif MD5_PATTERN.match(token):
+            query["etag"] = token.lower()
+        else:
+            words.append(token)
+    if words:
+        query["text"] = " ".join(words)
+    return query
+
+
+def file_extension(filename):
+    _, ext = os.path.splitext(filename or "")
+    return ext[1:].lower()
+
+
+class SearchIndex:
+    """已浏览过的网盘文件的本地搜索索引
+    
+    文件列表每返回一页就写入索引(文件名用SQLite FTS5 trigram索引，扩展名、大小、etag用普通索引)，
+    完整列出一个文件夹后删除其中已不存在的文件。查询只访问本地数据库，不发送网络请求。
+    每个账号使用单独的数据库文件(set_account 切换)，切换账号不需要清空索引。
+    """
+    
+    def __init__(self, path=SEARCH_INDEX_FILE, account=None):
+        self.base_path = path
+        self.account = account
+        self.path = self.account_path(account)
+        self._lock = threading.Lock()
+        self._scans = {}  # 文件夹ID -> (从第一页开始列出的时间, 期待的下一页游标)，连续列完最后一页时用于删除已不存在的文件
+        self.conn = self._connect(self.path)
+    
+    def account_path(self, account):
+        """账号对应的数据库文件，未知账号使用 base_path"""
+        if not account or self.base_path == ":memory:":
+            return self.base_path
+        root, ext = os.path.splitext(self.base_path)
+        return f"{root}_{hashlib.md5(str(account).encode()).hexdigest()[:16]}{ext}"
+    
+    def set_account(self, account):
+        """切换到账号对应的索引，之后的写入和查询只涉及该账号的文件"""
+        path = self.account_path(account)
+        with self._lock:
+            self.account = account
+            if path == self.path:
+                return
+            self.conn.close()
+            self._scans.clear()
+            self.path = path
+            self.conn = self._connect(path)
+    
+    @staticmethod
+    def _connect(path):
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                file_id INTEGER PRIMARY KEY,
+                parent_id INTEGER NOT NULL,
+                filename TEXT NOT NULL,
+                ext TEXT NOT NULL,
+                type INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                etag TEXT,
+                status INTEGER NOT NULL,
+                category INTEGER NOT NULL,
+                seen_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS files_parent ON files (parent_id);
+            CREATE INDEX IF NOT EXISTS files_ext ON files (ext, size);
+            CREATE INDEX IF NOT EXISTS files_size ON files (size);
+            CREATE INDEX IF NOT EXISTS files_etag ON files (etag);
+            CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(
+                filename, content='files', content_rowid='file_id', tokenize='trigram'
+            );
+            CREATE TRIGGER IF NOT EXISTS files_ai AFTER INSERT ON files BEGIN
+                INSERT INTO files_fts (rowid, filename) VALUES (new.file_id, new.filename);
+            END;
+            CREATE TRIGGER IF NOT EXISTS files_ad AFTER DELETE ON files BEGIN
+                INSERT INTO files_fts (files_fts, rowid, filename) VALUES ('delete', old.file_id, old.filename);
+            END;
+            CREATE TRIGGER IF NOT EXISTS files_au AFTER UPDATE OF filename ON files
+            WHEN old.filename IS NOT new.filename BEGIN
+                INSERT INTO files_fts (files_fts, rowid, filename) VALUES ('delete', old.file_id, old.filename);
+                INSERT INTO files_fts (rowid, filename) VALUES (new.file_id, new.filename);
+            END;
+        """)
+        conn.commit()
+        return conn
+    
+    def update_page(self, folder_id, records, last_file_id=None, next_file_id=None):
+        """写入一页列表结果
+        
+        last_file_id 为本页请求的游标(第一页为空)，next_file_id 为接口返回的下一页游标。
+        同一文件夹从第一页连续列到最后一页、每一页都经过这里后，删除本次没有出现的文件；
+        中间有页取自列表缓存(游标接不上)时放弃本次删除，未经过的页中的文件仍然保留。
+        """
+        folder_id = int(folder_id)
+        now = time.time()
+        last_page = not next_file_id or next_file_id == -1
+        with self._lock:
+            if not last_file_id:
+                scan_started = now
+            else:
+                scan_started, expected = self._scans.get(folder_id, (None, None))
+                if expected != str(last_file_id):
+                    scan_started = None
+            if scan_started is None or last_page:
+                self._scans.pop(folder_id, None)
+            else:
+                self._scans[folder_id] = (scan_started, str(next_file_id))
+            self.conn.executemany(
+                "INSERT INTO files (file_id, parent_id, filename, ext, type, size, etag, status, category, seen_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (file_id) DO UPDATE SET parent_id = excluded.parent_id, filename = excluded.filename, "
+                "ext = excluded.ext, type = excluded.type, size = excluded.size, etag = excluded.etag, "
+                "status = excluded.status, category = excluded.category, seen_at = excluded.seen_at",
+                [(record.file_id, folder_id, record.filename, file_extension(record.filename), record.type,
+                  record.size, (record.etag or "").lower() or None, record.status, record.category, now)
+                 for record in records]
+            )
+            if last_page and scan_started is not None:
+                self.conn.execute("DELETE FROM files WHERE parent_id = ? AND seen_at < ?", (folder_id, scan_started))
+            self.conn.commit()
+    
+    def search(self, text=None, ext=None, min_size=None, max_size=None, etag=None, limit=DEFAULT_SEARCH_LIMIT):
+        """按文件名子串、扩展名、大小范围、etag组合查询，返回 [FileRecord]"""
+        conditions = []
+        params = []
+        source = "files"
+        if text and len(text) >= MIN_TRIGRAM_LENGTH:
+            # 让全文索引作为外层循环，否则SQLite可能按扩展名索引逐行执行MATCH；有etag时etag索引更快
+            join = "JOIN" if etag else "CROSS JOIN"
+            source = f"files_fts {join} files ON files.file_id = files_fts.rowid"
+            conditions.append("files_fts MATCH ?")
+            params.append('"' + text.replace('"', '""') + '"')
+        elif text:
+            conditions.append("files.filename LIKE ? ESCAPE '\\'")
+            params.append("%" + re.sub(r"([%_\\])", r"\\\1", text) + "%")
+        if ext:
+            conditions.append("files.ext = ?")
+            params.append(ext.lstrip(".").lower())
+        if min_size is not None:
+            conditions.append("files.size >= ?")
+            params.append(min_size)
+        if max_size is not None:
+            conditions.append("files.size <= ?")
+            params.append(max_size)
+        if etag:
+            conditions.append("files.etag = ?")
+            params.append(etag.lower())
+        if not conditions:
+            return []
+        
+        sql = (
+            f"SELECT files.file_id, files.filename, files.type, files.size, files.etag, files.status, "
+            f"files.parent_id, files.category FROM {source} WHERE {' AND '.join(conditions)} LIMIT ?"
+        )
+        params.append(limit)
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [FileRecord(*row) for row in rows]
+    
+    def query(self, text, limit=DEFAULT_SEARCH_LIMIT):
+        """按搜索框语法查询，见 parse_query"""
+        return self.search(limit=limit, **parse_query(text))
+    
+    def folder_chain(self, folder_id):
+        """由索引中的父文件夹关系返回从根目录到该文件夹的 [(文件夹ID, 路径)]，路径以/结尾
+        
+        中间有未浏览过的文件夹时返回None。
+        """
+        names = []
+        current_id = int(folder_id)
+        with self._lock:
+            while current_id:
+                row = self.conn.execute(
+                    "SELECT parent_id, filename FROM files WHERE file_id = ? AND type = ?", (current_id, FOLDER_TYPE)
+                ).fetchone()
+                if row is None:
+                    return None
+                names.append((current_id, row[1]))
+                current_id = row[0]
+        chain = [("0", "/")]
+        for chain_id, name in reversed(names):
+            chain.append((str(chain_id), chain[-1][1] + name + "/"))
+        return chain
+    
+    def count(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+    
+    def clear(self):
+        with self._lock:
+            self._scans.clear()
+            self.conn.execute("DELETE FROM files")
+            self.conn.commit()
+    
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+_default_index = None
+_default_lock = threading.Lock()
+
+
+def get_search_index():
+    """获取全局共享的搜索索引"""
+    global _default_index
+    with _default_lock:
+        if _default_index is None:
+            _default_index = SearchIndex()
+        return _default_index
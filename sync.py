@@ -0,0 +1,406 @@
+import os
+import time
+import sqlite3
+import threading
+from collections import deque
+from concurrent.futures import wait, FIRST_COMPLETED
+from downloader import CHECKPOINT_SUFFIX, PARTIAL_SUFFIX
+from hasher import get_hash_pool
+from transfers import DOWNLOAD, UPLOAD
+from utils import SYNC_STATE_FILE, format_file_size
+from walker import TreeWalker
+
+SYNC_HASH_WINDOW = 64  # 同时提交给哈希线程池的文件数
+STATE_FLUSH_SIZE = 500  # 传输完成的文件累积多少条后写入同步记录
+# 下载器留在目录中的断点文件(及其写入中的临时文件)和下载中的临时文件，不参与同步
+DOWNLOAD_ARTIFACT_SUFFIXES = (CHECKPOINT_SUFFIX, CHECKPOINT_SUFFIX + ".tmp", PARTIAL_SUFFIX)
+
+
+class SyncState:
+    """基于SQLite的同步记录
+    
+    对每一对 (本地目录, 网盘文件夹) 保存上次同步后每个文件的本地大小、修改时间、MD5 以及网盘文件ID和etag。
+    下次同步时大小和修改时间都没有变化的本地文件不再计算MD5，etag没有变化的网盘文件视为未修改。
+    """
+    
+    def __init__(self, path=SYNC_STATE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS sync_files (
+                pair TEXT NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                md5 TEXT NOT NULL,
+                file_id INTEGER,
+                etag TEXT NOT NULL,
+                synced_at REAL NOT NULL,
+                PRIMARY KEY (pair, path)
+            ) WITHOUT ROWID
+        """)
+        self.conn.commit()
+    
+    def load(self, pair):
+        """返回 {相对路径: (大小, 修改时间ns, MD5, 文件ID, etag)}"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT path, size, mtime_ns, md5, file_id, etag FROM sync_files WHERE pair = ?", (pair,)
+            ).fetchall()
+        return {row[0]: row[1:] for row in rows}
+    
+    def update(self, pair, rows):
+        """写入 [(相对路径, 大小, 修改时间ns, MD5, 文件ID, etag)]"""
+        now = time.time()
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO sync_files (pair, path, size, mtime_ns, md5, file_id, etag, synced_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(pair, path, size, mtime_ns, md5, file_id, etag, now)
+                 for path, size, mtime_ns, md5, file_id, etag in rows]
+            )
+            self.conn.commit()
+    
+    def remove(self, pair, paths):
+        with self._lock:
+            self.conn.executemany("DELETE FROM sync_files WHERE pair = ? AND path = ?", [(pair, path) for path in paths])
+            self.conn.commit()
+    
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+_default_state = None
+_default_lock = threading.Lock()
+
+
+def get_sync_state():
+    """获取全局共享的同步记录"""
+    global _default_state
+    with _default_lock:
+        if _default_state is None:
+            _default_state = SyncState()
+        return _default_state
+
+
+def is_download_artifact(name):
+    """下载器的断点文件和下载中的临时文件"""
+    return name.endswith(DOWNLOAD_ARTIFACT_SUFFIXES)
+
+
+def scan_local_files(local_dir):
+    """返回 {相对路径: (本地路径, 大小, 修改时间ns)}，相对路径用/分隔，不跟随符号链接
+    
+    跳过下载器的断点文件、临时文件，以及旁边有断点文件(尚未下载完成)的文件。
+    """
+    files = {}
+    pending = set()  # 有断点文件的相对路径
+    stack = [("", local_dir)]
+    while stack:
+        relative, dir_path = stack.pop()
+        try:
+            entries = os.scandir(dir_path)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                entry_relative = f"{relative}/{entry.name}" if relative else entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append((entry_relative, entry.path))
+                    elif is_download_artifact(entry.name):
+                        if entry.name.endswith(CHECKPOINT_SUFFIX):
+                            pending.add(entry_relative[:-len(CHECKPOINT_SUFFIX)])
+                    elif entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        files[entry_relative] = (entry.path, stat.st_size, stat.st_mtime_ns)
+                except OSError:
+                    continue
+    for entry_relative in pending:
+        files.pop(entry_relative, None)
+    return files
+
+
+def normalize_etag(etag):
+    return (etag or "").lower()
+
+
+class SyncPlan:
+    """一次同步的比较结果
+    
+    uploads 为网盘中没有的本地文件，overwrites 为本地修改过、需要覆盖网盘同名文件的文件，
+    两者都是 [(相对路径, 本地路径, 大小, MD5)]；downloads 为 [(相对路径, FileRecord)]。
+    两边都修改过且内容不同的文件放在 conflicts 中，不做任何传输；一边删除的文件只记录，不删除另一边。
+    """
+    
+    def __init__(self, local_dir, remote_folder_id):
+        self.local_dir = local_dir
+        self.remote_folder_id = remote_folder_id
+        self.local_files = 0
+        self.remote_files = 0
+        self.unchanged = 0
+        self.hashed_files = 0
+        self.hashed_bytes = 0
+        self.uploads = []
+        self.overwrites = []
+        self.downloads = []
+        self.matched = 0  # 没有同步记录但两边内容相同的文件，只补充记录
+        self.conflicts = []  # 相对路径
+        self.local_deleted = []  # 同步后在本地删除的文件
+        self.remote_deleted = []  # 同步后在网盘删除的文件
+        self.failed = []  # [(相对路径, 错误信息)]
+        self.transfers = []  # [(传输项, 覆盖同名文件, 记录信息)]，由 SyncEngine.prepare 生成
+        self.elapsed = 0.0
+    
+    @property
+    def upload_bytes(self):
+        return sum(size for _, _, size, _ in self.uploads + self.overwrites)
+    
+    @property
+    def download_bytes(self):
+        return sum(record.size for _, record in self.downloads)
+    
+    @property
+    def empty(self):
+        return not self.transfers
+    
+    def summary(self):
+        name = os.path.basename(os.path.normpath(self.local_dir))
+        text = (
+            f"同步 {name}: 本地 {self.local_files} 个文件，网盘 {self.remote_files} 个文件，"
+            f"未变化 {self.unchanged + self.matched} 个；"
+            f"上传 {len(self.uploads) + len(self.overwrites)} 个({format_file_size(self.upload_bytes)})，"
+            f"下载 {len(self.downloads)} 个({format_file_size(self.download_bytes)})"
+        )
+        if self.hashed_files:
+            text += f"；计算MD5 {self.hashed_files} 个({format_file_size(self.hashed_bytes)})"
+        if self.conflicts:
+            text += f"；冲突 {len(self.conflicts)} 个"
+        if self.local_deleted or self.remote_deleted:
+            text += f"；本地已删除 {len(self.local_deleted)} 个，网盘已删除 {len(self.remote_deleted)} 个(未同步删除)"
+        if self.failed:
+            text += f"；失败 {len(self.failed)} 个"
+        return text + f"；用时 {self.elapsed:.1f} 秒"
+
+
+class SyncEngine:
+    """本地目录与网盘文件夹的双向增量同步
+    
+    并发遍历网盘文件夹(使用列表返回的etag和大小)，扫描本地目录，再与上次的同步记录比较：
+    只有大小或修改时间变化了的本地文件才计算MD5，etag变化了的网盘文件才下载，
+    两边都变化时按MD5判断内容是否相同。需要传输的文件交给 TransferManager，
+    每个传输完成后写入同步记录，下次同步只处理之后变化的文件。
+    run() 在后台线程中执行，queue() 在界面线程中执行。
+    """
+    
+    def __init__(self, api, local_dir, remote_folder_id="0", state=None, hash_pool=None, **walker_options):
+        self.api = api
+        self.local_dir = os.path.abspath(local_dir)
+        self.remote_folder_id = str(remote_folder_id)
+        self.pair = f"{self.local_dir}|{self.remote_folder_id}"
+        self.state = state or get_sync_state()
+        self.hash_pool = hash_pool or get_hash_pool()
+        self.walker_options = walker_options
+        self.remote_folders = {"": self.remote_folder_id}  # 相对路径 -> 网盘文件夹ID
+        self.manager = None
+        self._queued = {}  # 传输ID -> (类型, 相对路径, 本地路径, MD5, 文件ID)
+        self._finished_rows = []
+    
+    def scan_remote(self):
+        """并发遍历网盘文件夹，返回 {相对路径: FileRecord}，同时记录子文件夹ID"""
+        files = {}
+        walker = TreeWalker(self.api, root_id=self.remote_folder_id, root_path="/", **self.walker_options)
+        for path, record in walker.walk():
+            relative = path.strip("/")
+            if any(part in ("", ".", "..") for part in relative.split("/")):
+                continue  # 不写到本地目录之外
+            if record.is_folder:
+                self.remote_folders[relative] = str(record.file_id)
+            else:
+                files[relative] = record
+        return files
+    
+    def hash_files(self, candidates, plan):
+        """用共享的哈希线程池计算 [(相对路径, 本地路径, 大小)] 的MD5，返回 {相对路径: MD5}"""
+        digests = {}
+        pending = deque(candidates)
+        running = {}
+        while pending or running:
+            while pending and len(running) < SYNC_HASH_WINDOW:
+                relative, path, size = pending.popleft()
+                running[self.hash_pool.submit(path)] = (relative, size)
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                relative, size = running.pop(future)
+                try:
+                    digests[relative] = future.result().md5
+                except Exception as e:
+                    plan.failed.append((relative, str(e)))
+                    continue
+                plan.hashed_files += 1
+                plan.hashed_bytes += size
+        return digests
+    
+    def compare(self):
+        """比较两边和同步记录，返回 SyncPlan"""
+        started = time.monotonic()
+        plan = SyncPlan(self.local_dir, self.remote_folder_id)
+        remote = self.scan_remote()
+        local = scan_local_files(self.local_dir)
+        rows = self.state.load(self.pair)
+        plan.local_files = len(local)
+        plan.remote_files = len(remote)
+        
+        to_hash = []  # 本地有变化，需要MD5才能决定的文件
+        for relative, (path, size, mtime_ns) in local.items():
+            record = remote.get(relative)
+            row = rows.get(relative)
+            local_changed = row is None or row[0] != size or row[1] != mtime_ns
+            if record is None:
+                if local_changed:
+                    to_hash.append((relative, path, size))
+                else:
+                    plan.remote_deleted.append(relative)
+                continue
+            remote_changed = row is None or row[4] != normalize_etag(record.etag)
+            if not local_changed and not remote_changed:
+                plan.unchanged += 1
+            elif not local_changed:
+                plan.downloads.append((relative, record))
+            elif remote_changed and record.size != size:
+                plan.conflicts.append(relative)
+            else:
+                to_hash.append((relative, path, size))
+        
+        for relative, record in remote.items():
+            if relative in local:
+                continue
+            row = rows.get(relative)
+            if row is None or row[4] != normalize_etag(record.etag):
+                plan.downloads.append((relative, record))
+            else:
+                plan.local_deleted.append(relative)
+        
+        stale = [relative for relative in rows if relative not in local and relative not in remote]
+        if stale:
+            self.state.remove(self.pair, stale)
+        
+        matched_rows = []
+        digests = self.hash_files(to_hash, plan)
+        for relative, path, size in to_hash:
+            md5 = digests.get(relative)
+            if md5 is None:
+                continue
+            record = remote.get(relative)
+            if record is None:
+                plan.uploads.append((relative, path, size, md5))
+            elif md5 == normalize_etag(record.etag):
+                _, _, mtime_ns = local[relative]
+                matched_rows.append((relative, size, mtime_ns, md5, record.file_id, md5))
+            elif relative in rows and rows[relative][4] == normalize_etag(record.etag):
+                plan.overwrites.append((relative, path, size, md5))
+            else:
+                plan.conflicts.append(relative)
+        if matched_rows:
+            self.state.update(self.pair, matched_rows)
+        plan.matched = len(matched_rows)
+        plan.elapsed = time.monotonic() - started
+        return plan
+    
+    def ensure_remote_folder(self, relative):
+        """按需逐级创建网盘文件夹，返回文件夹ID"""
+        folder_id = self.remote_folders.get(relative)
+        if folder_id is None:
+            parent, _, name = relative.rpartition("/")
+            folder_id = self.api.mkdir(name, self.ensure_remote_folder(parent))
+            self.remote_folders[relative] = folder_id
+        return folder_id
+    
+    def prepare(self, plan):
+        """创建需要的网盘文件夹和本地目录，生成 TransferManager.add_transfers 使用的传输项"""
+        for entries, overwrite in ((plan.uploads, False), (plan.overwrites, True)):
+            for relative, path, size, md5 in entries:
+                folder, _, name = relative.rpartition("/")
+                try:
+                    folder_id = self.ensure_remote_folder(folder)
+                except Exception as e:
+                    plan.failed.append((relative, str(e)))
+                    continue
+                plan.transfers.append(((UPLOAD, name, path, folder_id, md5, size), overwrite, (relative, md5)))
+        for relative, record in plan.downloads:
+            local_path = os.path.join(self.local_dir, *relative.split("/"))
+            try:
+                os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            except OSError as e:
+                plan.failed.append((relative, str(e)))
+                continue
+            etag = normalize_etag(record.etag)
+            item = (DOWNLOAD, record.filename, local_path, record.file_id, record.etag, record.size)
+            plan.transfers.append((item, False, (relative, etag)))
+    
+    def run(self):
+        """比较并准备传输，在后台线程中执行，返回 SyncPlan"""
+        plan = self.compare()
+        self.prepare(plan)
+        return plan
+    
+    def queue(self, plan, manager):
+        """把计划中的传输加入传输队列，每个传输完成后写入同步记录"""
+        self.manager = manager
+        for overwrite in (False, True):
+            entries = [(item, info) for item, item_overwrite, info in plan.transfers if item_overwrite == overwrite]
+            if not entries:
+                continue
+            added = manager.add_transfers([item for item, _ in entries], overwrite=overwrite)
+            for transfer, (item, (relative, md5)) in zip(added, entries):
+                kind, _, local_path, remote_id, _, _ = item
+                self._queued[transfer.transfer_id] = (kind, relative, local_path, md5, remote_id if kind == DOWNLOAD else None)
+        if self._queued:
+            manager.finished.connect(self.on_transfer_finished)
+            manager.removed.connect(self.on_transfer_removed)
+    
+    def on_transfer_finished(self, transfer_id, success, result):
+        entry = self._queued.pop(transfer_id, None)
+        if entry is None:
+            return
+        kind, relative, local_path, md5, file_id = entry
+        if success:
+            try:
+                stat = os.stat(local_path)
+            except OSError:
+                stat = None
+            if stat is not None:
+                # 上传成功时返回新文件的ID
+                file_id = file_id if kind == DOWNLOAD else result
+                file_id = int(file_id) if str(file_id).isdigit() else None
+                self._finished_rows.append((relative, stat.st_size, stat.st_mtime_ns, md5, file_id, md5))
+        if len(self._finished_rows) >= STATE_FLUSH_SIZE:
+            self.flush()
+        self.check_finished()
+    
+    def on_transfer_removed(self, transfer_id):
+        """传输被移出队列时不再等待，下次同步会重新比较"""
+        if self._queued.pop(transfer_id, None) is not None:
+            self.check_finished()
+    
+    @property
+    def active(self):
+        """是否还有加入队列的传输没有完成"""
+        return bool(self._queued)
+    
+    def check_finished(self):
+        if self._queued:
+            return
+        self.flush()
+        self.manager.finished.disconnect(self.on_transfer_finished)
+        self.manager.removed.disconnect(self.on_transfer_removed)
+    
+    def flush(self):
+        """写入已完成传输的同步记录"""
+        if self._finished_rows:
+            self.state.update(self.pair, self._finished_rows)
+            self._finished_rows = []
@@ -1,124 +1,217 @@
 import os
 import json
-import http.client
-import requests
-import hashlib
-import math
-import time
-from PySide6.QtCore import QThread, Signal
+import asyncio
+import itertools
+import threading
+from PySide6.QtCore import Qt, QObject, QRunnable, QThread, QThreadPool, Signal, Slot
+from transport import get_transport
+from ratelimit import get_request_scheduler
+from hasher import get_hash_pool
+from poller import get_upload_result_poller
+from downloader import SegmentedDownloader, DEFAULT_DOWNLOAD_SEGMENTS
+from progress import ProgressThrottle, PROGRESS_EMIT_INTERVAL
+from uploader import SliceUploader, UploadSessionStore, FileWindow, split_slices, DEFAULT_UPLOAD_WORKERS
+
+API_URL = "https://open-api.123pan.com"
+DOWNLOAD_ATTEMPTS = 3  # 下载失败后从断点重试的次数(含第一次)
+DUPLICATE_OVERWRITE = 2  # 创建上传任务时覆盖网盘中的同名文件
 
 class DownloadThread(QThread):
-    progress_signal = Signal(int, int)  # 下载进度信号 (已下载大小, 总大小)
+    progress_signal = Signal("qint64", "qint64")  # 下载进度信号 (已下载大小, 总大小)，最多每 progress_interval 秒一次
     finished_signal = Signal(bool, str)  # 完成信号 (是否成功, 错误信息)
     
-    def __init__(self, url, save_path):
+    def __init__(self, url, save_path, segments=DEFAULT_DOWNLOAD_SEGMENTS, file_id=None, etag=None,
+                 url_provider=None, max_attempts=DOWNLOAD_ATTEMPTS, progress_interval=PROGRESS_EMIT_INTERVAL):
         super().__init__()
         self.url = url
         self.save_path = save_path
-        
+        self.segments = segments  # 并行下载的分段数
+        self.file_id = file_id
+        self.etag = etag
+        self.url_provider = url_provider  # 下载链接过期时获取新链接
+        self.max_attempts = max_attempts
+        self.progress_interval = progress_interval
+        self.downloader = None
+        self.cancelled = False
+    
+    def cancel(self):
+        """停止下载，保留断点文件"""
+        self.cancelled = True
+        if self.downloader:
+            self.downloader.cancel()
+    
     def run(self):
-        try:
-            response = requests.get(self.url, stream=True)
-            total_size = int(response.headers.get('content-length', 0))
-            
-            with open(self.save_path, 'wb') as f:
-                downloaded = 0
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        downloaded += len(chunk)
-                        # 发送进度信号
-                        self.progress_signal.emit(downloaded, total_size)
-                
+        error = ""
+        # 每读一块数据都会更新进度，合并后再发出信号，界面线程不必处理成千上万个信号
+        progress = ProgressThrottle(self.progress_signal.emit, self.progress_interval)
+        for attempt in range(self.max_attempts):
+            if self.cancelled:
+                error = "下载已取消"
+                break
+            try:
+                if not self.url:
+                    # 没有给出链接时(如排队的下载)在开始时获取
+                    self.url = self.url_provider() if self.url_provider else None
+                    if not self.url:
+                        raise Exception("获取下载链接失败")
+                # 服务器支持Range时分段并行下载，否则单连接下载；中断后从断点文件继续
+                self.downloader = SegmentedDownloader(
+                    self.url, self.save_path, self.segments,
+                    file_id=self.file_id, etag=self.etag, url_provider=self.url_provider
+                )
+                if self.cancelled:
+                    self.downloader.cancel()
+                self.downloader.run(progress.update)
+                progress.flush()
                 self.finished_signal.emit(True, "")
-        except Exception as e:
-            self.finished_signal.emit(False, str(e))
+                return
+            except Exception as e:
+                error = str(e)
+                # 重试时换用最新的下载链接
+                if self.downloader and self.downloader.url:
+                    self.url = self.downloader.url
+        progress.flush()
+        self.finished_signal.emit(False, error)
 
 
 class UploadThread(QThread):
     progress_signal = Signal(int, int, str)  # 上传进度信号 (当前分片, 总分片数, 状态信息)
     finished_signal = Signal(bool, str, str)  # 完成信号 (是否成功, 文件ID或错误信息, 文件名)
+    processing_signal = Signal()  # 分片已全部上传、等待服务器处理，线程随即结束，完成信号稍后由查询服务发出
     
-    def __init__(self, file_path, access_token, parent_folder_id="0"):
+    def __init__(self, file_path, access_token, parent_folder_id="0", workers=DEFAULT_UPLOAD_WORKERS, duplicate=None):
         super().__init__()
         self.file_path = file_path
         self.access_token = access_token
         self.parent_folder_id = parent_folder_id
-        
+        self.workers = workers  # 同时上传的分片数
+        self.duplicate = duplicate  # 同名文件的处理方式，None时由服务器决定
+        self.uploader = None
+        self.cancelled = False
+    
+    def cancel(self):
+        """停止上传，已确认的分片记录在上传会话中，下次从断点继续"""
+        self.cancelled = True
+        if self.uploader:
+            self.uploader.cancel()
+    
     def run(self):
+        # 续传的会话已失效时清除会话后从头再来，用循环重试而不是递归调用
+        while self.upload():
+            pass
+    
+    def upload(self):
+        """上传一次，续传的会话已失效、需要重新创建上传任务时返回True"""
         try:
-            # 获取文件信息
-            md5, size, name = self.get_file_info(self.file_path)
-            if not md5:
+            name = os.path.basename(self.file_path)
+            try:
+                stat = os.stat(self.file_path)
+            except OSError:
                 self.finished_signal.emit(False, f"无法读取文件: {self.file_path}", "")
                 return
                 
-            self.progress_signal.emit(0, 100, f"正在创建上传任务: {name}")
-            
-            # 创建上传任务
-            conn = http.client.HTTPSConnection("open-api.123pan.com")
-            payload = json.dumps({
-                "parentFileID": self.parent_folder_id,
-                "filename": name,
-                "etag": md5,
-                "size": size
-            })
-            headers = {
-                'Content-Type': 'application/json',
-                'Platform': 'open_platform',
-                'Authorization': self.access_token
-            }
+            # 查找上次未完成的上传，文件未变化时跳过计算MD5和创建任务
+            sessions = UploadSessionStore()
+            session = sessions.find(self.file_path, self.parent_folder_id, stat)
+            resumed = session is not None
             
             try:
-                conn.request("POST", "/upload/v1/file/create", payload, headers)
-                res = conn.getresponse()
-                data = res.read()
-                response_data = json.loads(data.decode("utf-8"))
+                if resumed:
+                    preupload_id = session["preuploadID"]
+                    slice_size = session["sliceSize"]
+                    uploaded = set(session["uploaded"])
+                    self.progress_signal.emit(0, 100, f"继续上次未完成的上传: {name}")
+                else:
+                    # 获取文件信息
+                    md5, size, name = self.get_file_info(self.file_path)
+                    if not md5:
+                        self.finished_signal.emit(False, f"无法读取文件: {self.file_path}", "")
+                        return
                 
-                # 检查响应是否有效
-                if response_data is None or "data" not in response_data:
-                    self.finished_signal.emit(False, f"API返回无效响应: {data.decode('utf-8')}", name)
-                    return
+                    self.progress_signal.emit(0, 100, f"正在创建上传任务: {name}")
                     
-                # 检查是否秒传
-                if response_data.get("data", {}).get("reuse", False):
-                    file_id = response_data.get("data", {}).get("fileID")
-                    self.progress_signal.emit(100, 100, "文件秒传成功")
-                    self.finished_signal.emit(True, str(file_id), name)
-                    return
+                    # 创建上传任务
+                    payload = {
+                        "parentFileID": self.parent_folder_id,
+                        "filename": name,
+                        "etag": md5,
+                        "size": size
+                    }
+                    if self.duplicate:
+                        payload["duplicate"] = self.duplicate
+                    payload = json.dumps(payload)
+                    headers = {
+                        'Content-Type': 'application/json',
+                        'Platform': 'open_platform',
+                        'Authorization': self.access_token
+                    }
+                    
+                    response_data = get_request_scheduler().send("POST", f"{API_URL}/upload/v1/file/create", payload, headers)
+                    
+                    # 检查响应是否有效
+                    if response_data is None or "data" not in response_data:
+                        self.finished_signal.emit(False, f"API返回无效响应: {response_data}", name)
+                        return
                 
-                # 非秒传情况，提取preuploadID和sliceSize
-                preupload_id = response_data.get("data", {}).get("preuploadID")
-                slice_size = response_data.get("data", {}).get("sliceSize")
+                    # 检查是否秒传
+                    if response_data.get("data", {}).get("reuse", False):
+                        file_id = response_data.get("data", {}).get("fileID")
+                        self.progress_signal.emit(100, 100, "文件秒传成功")
+                        self.finished_signal.emit(True, str(file_id), name)
+                        return
+                    
+                    # 非秒传情况，提取preuploadID和sliceSize
+                    preupload_id = response_data.get("data", {}).get("preuploadID")
+                    slice_size = response_data.get("data", {}).get("sliceSize")
+                    
+                    if not preupload_id or not slice_size:
+                        self.finished_signal.emit(False, "获取上传参数失败", name)
+                        return
+                    
+                    # 保存上传会话，程序中断后可以继续
+                    sessions.save(self.file_path, self.parent_folder_id, stat, md5, preupload_id, slice_size)
+                    uploaded = set()
                 
-                if not preupload_id or not slice_size:
-                    self.finished_signal.emit(False, "获取上传参数失败", name)
+                if self.cancelled:
+                    self.finished_signal.emit(False, "上传已取消", name)
                     return
                 
-                # 计算分片数量
-                total_slices = math.ceil(size / slice_size)
-                self.progress_signal.emit(0, total_slices, f"准备分片上传，共{total_slices}个分片")
+                # 计算分片，跳过已确认上传的分片
+                slices = split_slices(stat.st_size, slice_size)
+                total_slices = len(slices)
+                remaining = [s for s in slices if s.slice_no not in uploaded]
+                skipped = total_slices - len(remaining)
+                uploaded_this_run = []
+                done_slices = [skipped]  # 已按顺序完成的分片数，重试时用于汇报进度
+                self.progress_signal.emit(skipped, total_slices, f"准备分片上传，共{total_slices}个分片，剩余{len(remaining)}个，并发数{self.workers}")
                 
-                # 上传所有分片
-                all_slices_uploaded = True
-                for slice_no in range(1, total_slices + 1):
-                    self.progress_signal.emit(slice_no, total_slices, f"正在上传第 {slice_no}/{total_slices} 个分片...")
-                    
-                    # 获取上传URL
-                    presigned_url = self.get_upload_url(self.access_token, preupload_id, slice_no)
-                    if not presigned_url:
-                        all_slices_uploaded = False
-                        break
-                    
-                    # 计算分片的起始位置
-                    start_pos = (slice_no - 1) * slice_size
-                    
-                    # 上传分片
-                    if not self.upload_slice(presigned_url, self.file_path, start_pos, slice_size):
-                        all_slices_uploaded = False
-                        break
-                    
-                    self.progress_signal.emit(slice_no, total_slices, f"第 {slice_no}/{total_slices} 个分片上传成功")
+                def slice_uploaded(slice_no):
+                    uploaded_this_run.append(slice_no)
+                    sessions.mark_uploaded(self.file_path, self.parent_folder_id, slice_no)
+                
+                def slices_progress(done, total):
+                    done_slices[0] = skipped + done
+                    self.progress_signal.emit(skipped + done, total_slices, f"已上传 {skipped + done}/{total_slices} 个分片")
+                
+                def slice_retry(slice_no, retries, reason):
+                    self.progress_signal.emit(done_slices[0], total_slices,
+                                              f"分片{slice_no}{reason}，正在重试(第{retries}/{self.uploader.retry_budget}次)")
+                
+                # 并发上传剩余分片，进度按分片顺序汇报
+                self.uploader = SliceUploader(
+                    lambda slice_no: self.get_upload_url(self.access_token, preupload_id, slice_no),
+                    lambda url, start_pos, length: self.upload_slice(url, self.file_path, start_pos, length),
+                    workers=self.workers
+                )
+                if self.cancelled:
+                    self.uploader.cancel()
+                all_slices_uploaded = self.uploader.run(remaining, slices_progress, slice_uploaded, slice_retry)
+                
+                if not all_slices_uploaded and resumed and not uploaded_this_run and not self.cancelled:
+                    # 续传时一个分片都没传成功，多半是preuploadID已过期，清除会话后重新上传
+                    sessions.remove(self.file_path, self.parent_folder_id)
+                    self.progress_signal.emit(0, 100, "上传会话已失效，重新创建上传任务")
+                    return True
                 
                 if all_slices_uploaded:
                     self.progress_signal.emit(total_slices, total_slices, "所有分片上传成功，正在完成上传...")
@@ -127,16 +220,14 @@ class UploadThread(QThread):
                     complete_result = self.complete_upload(self.access_token, preupload_id)
                     
                     if complete_result:
+                        # 服务器已接收全部分片，不再需要续传记录
+                        sessions.remove(self.file_path, self.parent_folder_id)
                         if complete_result.get("async", False):
                             self.progress_signal.emit(total_slices, total_slices, "等待服务器处理...")
-                            # 异步轮询获取上传结果
-                            final_result = self.check_upload_result(self.access_token, preupload_id)
-                            
-                            if final_result and final_result.get("completed", False):
-                                file_id = final_result.get("fileID")
-                                self.finished_signal.emit(True, str(file_id), name)
-                            else:
-                                self.finished_signal.emit(False, "文件上传可能未完成，请稍后检查", name)
+                            # 由共享的查询服务轮询上传结果，线程不再等待，结果到达时发出完成信号
+                            future = get_upload_result_poller().submit(self.access_token, preupload_id)
+                            self.processing_signal.emit()
+                            future.add_done_callback(lambda f: self.emit_async_result(f.result(), name))
                         else:
                             # 无需异步查询，直接获取文件ID
                             completed = complete_result.get("completed", False)
@@ -147,9 +238,12 @@ class UploadThread(QThread):
                             else:
                                 self.finished_signal.emit(False, "文件上传未完成，请稍后检查", name)
                     else:
+                        if resumed:
+                            # 续传的会话无法完成，下次从头上传
+                            sessions.remove(self.file_path, self.parent_folder_id)
                         self.finished_signal.emit(False, "完成上传请求失败", name)
                 else:
-                    self.finished_signal.emit(False, "分片上传失败", name)
+                    self.finished_signal.emit(False, f"{self.uploader.error or '分片上传失败'}，再次上传该文件将从断点继续", name)
             
             except Exception as e:
                 self.finished_signal.emit(False, f"上传过程中发生错误: {str(e)}", name)
@@ -158,31 +252,28 @@ class UploadThread(QThread):
             self.finished_signal.emit(False, f"上传线程发生错误: {str(e)}", "")
     
     def get_file_info(self, file_path):
-        # 计算 MD5
-        md5_hash = hashlib.md5()
         try:
-            with open(file_path, "rb") as f:
-                # 分块读取
-                for chunk in iter(lambda: f.read(4096), b""):
-                    md5_hash.update(chunk)
-        except FileNotFoundError:
+            stat = os.stat(file_path)
+        except OSError:
             return None, None, None
         
-        # 获取大小
-        file_size = os.path.getsize(file_path)
-        
         # 提取文件名
         file_name = os.path.basename(file_path)
         
+        # 在共享的哈希线程池中用大块读取算出MD5，文件未变化时直接使用缓存
+        try:
+            digest = get_hash_pool().submit(file_path).result()
+        except FileNotFoundError:
+            return None, None, None
+        
         return (
-            md5_hash.hexdigest(),
-            file_size,
+            digest.md5,
+            stat.st_size,
             file_name
         )
     
     def get_upload_url(self, access_token, preupload_id, slice_no):
         """获取分片上传地址"""
-        conn = http.client.HTTPSConnection("open-api.123pan.com")
         payload = json.dumps({
             "preuploadID": preupload_id,
             "sliceNo": slice_no
@@ -192,10 +283,7 @@ class UploadThread(QThread):
             'Platform': 'open_platform',
             'Authorization': access_token
         }
-        conn.request("POST", "/upload/v1/file/get_upload_url", payload, headers)
-        res = conn.getresponse()
-        data = res.read()
-        response_data = json.loads(data.decode("utf-8"))
+        response_data = get_request_scheduler().send("POST", f"{API_URL}/upload/v1/file/get_upload_url", payload, headers)
         
         if response_data.get("code") == 0:
             return response_data.get("data", {}).get("presignedURL")
@@ -203,36 +291,20 @@ class UploadThread(QThread):
             return None
     
     def upload_slice(self, presigned_url, file_path, start_pos, slice_size):
-        """上传文件分片"""
-        # 从URL中提取主机名和路径
-        url_parts = presigned_url.replace("https://", "").split("/", 1)
-        host = url_parts[0]
-        path = "/" + url_parts[1] if len(url_parts) > 1 else "/"
-        
-        conn = http.client.HTTPSConnection(host)
-        
-        # 读取指定位置的文件分片
-        with open(file_path, "rb") as f:
-            f.seek(start_pos)
-            slice_data = f.read(slice_size)
-        
-        headers = {
-            'Content-Type': 'application/octet-stream'
-        }
+        """上传文件分片，返回HTTP状态码，由 SliceUploader 判断是否需要重试"""
+        # 直接从文件流式发送分片，不把整个分片读入内存
+        with FileWindow(file_path, start_pos, slice_size) as body:
+            headers = {
+                'Content-Type': 'application/octet-stream',
+                'Content-Length': str(len(body))
+            }
         
-        conn.request("PUT", path, slice_data, headers)
-        res = conn.getresponse()
+            res = get_transport().request("PUT", presigned_url, body, headers)
         
-        # 检查上传状态
-        if res.status == 200:
-            return True
-        else:
-            data = res.read()
-            return False
+        return res.status
     
     def complete_upload(self, access_token, preupload_id):
         """通知服务器上传完成"""
-        conn = http.client.HTTPSConnection("open-api.123pan.com")
         payload = json.dumps({
             "preuploadID": preupload_id
         })
@@ -241,40 +313,221 @@ class UploadThread(QThread):
             'Platform': 'open_platform',
             'Authorization': access_token
         }
-        conn.request("POST", "/upload/v1/file/upload_complete", payload, headers)
-        res = conn.getresponse()
-        data = res.read()
-        response_data = json.loads(data.decode("utf-8"))
+        response_data = get_request_scheduler().send("POST", f"{API_URL}/upload/v1/file/upload_complete", payload, headers)
         
         if response_data.get("code") == 0:
             return response_data.get("data", {})
         else:
             return None
     
-    def check_upload_result(self, access_token, preupload_id, max_retries=30, retry_interval=1):
-        """异步轮询获取上传结果"""
-        conn = http.client.HTTPSConnection("open-api.123pan.com")
-        payload = json.dumps({
-            "preuploadID": preupload_id
-        })
-        headers = {
-            'Content-Type': 'application/json',
-            'Platform': 'open_platform',
-            'Authorization': access_token
-        }
-        
-        for retry in range(max_retries):
-            conn.request("POST", "/upload/v1/file/upload_async_result", payload, headers)
-            res = conn.getresponse()
-            data = res.read()
-            response_data = json.loads(data.decode("utf-8"))
-            
-            if response_data.get("code") == 0:
-                result_data = response_data.get("data", {})
-                if result_data.get("completed", False):
-                    return result_data
-                time.sleep(retry_interval)
+    def emit_async_result(self, final_result, name):
+        """查询服务得到结果后发出完成信号(在查询服务的线程中调用)"""
+        if final_result and final_result.get("completed", False):
+            file_id = final_result.get("fileID")
+            self.finished_signal.emit(True, str(file_id), name)
+        else:
+            self.finished_signal.emit(False, "文件上传可能未完成，请稍后检查", name)
+
+
+class RequestSignals(QObject):
+    finished = Signal(int, bool, object)  # 完成信号 (任务ID, 是否成功, 结果或错误信息)
+    item = Signal(int, object)  # 流式任务的中间结果 (任务ID, 结果)
+
+
+class RequestTask(QRunnable):
+    """在线程池中执行一次阻塞调用
+    
+    stream=True 时 fn 返回迭代器，每一项通过 item 信号送出，任务被作废后停止迭代。
+    """
+    
+    def __init__(self, task_id, fn, args, kwargs, stream=False):
+        super().__init__()
+        self.task_id = task_id
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.stream = stream
+        self.cancelled = False
+        self.signals = RequestSignals()
+    
+    def run(self):
+        try:
+            if self.stream:
+                result = None
+                iterator = iter(self.fn(*self.args, **self.kwargs))
+                try:
+                    for item in iterator:
+                        if self.cancelled:
+                            break
+                        self.signals.item.emit(self.task_id, item)
+                finally:
+                    # 提前结束时让生成器清理(如取消预取)
+                    close = getattr(iterator, "close", None)
+                    if close:
+                        close()
             else:
-                return None
-        
-        return None
\ No newline at end of file
+                result = self.fn(*self.args, **self.kwargs)
+            self.signals.finished.emit(self.task_id, True, result)
+        except Exception as e:
+            self.signals.finished.emit(self.task_id, False, str(e))
+
+
+class RequestExecutor(QObject):
+    """在后台线程执行阻塞的API请求，结果通过信号回到GUI线程
+    
+    每个请求属于一个频道(如"list_files")，同一频道每次提交都会产生新的代号，
+    旧代号的请求如果还没开始就直接取消，已经发出的请求结果到达后丢弃，不会覆盖界面。
+    """
+    
+    def __init__(self, parent=None, max_threads=4):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self.generations = {}  # 频道 -> 最新代号
+        self._tasks = {}  # 任务ID -> (频道, 代号, 任务, 成功回调, 失败回调, 中间结果回调)
+        self._queued = {}  # 频道 -> 尚未开始执行的任务
+        self._task_ids = itertools.count(1)
+    
+    def submit(self, channel, fn, *args, on_result=None, on_error=None, **kwargs):
+        """提交请求，返回本次的代号"""
+        return self._start(channel, fn, args, kwargs, on_result, on_error)
+    
+    def submit_stream(self, channel, fn, *args, on_item=None, on_result=None, on_error=None, **kwargs):
+        """提交返回迭代器的请求(如 API_123pan.iter_folder_pages)，每一项到达时调用 on_item，返回本次的代号"""
+        return self._start(channel, fn, args, kwargs, on_result, on_error, on_item)
+    
+    def _start(self, channel, fn, args, kwargs, on_result, on_error, on_item=None):
+        generation = self.cancel(channel)
+        task_id = next(self._task_ids)
+        task = RequestTask(task_id, fn, args, kwargs, stream=on_item is not None)
+        task.setAutoDelete(False)
+        task.signals.finished.connect(self._on_finished)
+        task.signals.item.connect(self._on_item)
+        self._tasks[task_id] = (channel, generation, task, on_result, on_error, on_item)
+        self._queued[channel] = task
+        self.pool.start(task)
+        return generation
+    
+    def cancel(self, channel):
+        """作废频道中已提交的请求，返回新的代号"""
+        generation = self.generations.get(channel, 0) + 1
+        self.generations[channel] = generation
+        queued = self._queued.pop(channel, None)
+        if queued is not None and self.pool.tryTake(queued):
+            self._tasks.pop(queued.task_id, None)
+        # 正在执行的流式任务在下一项之前停止
+        for task_channel, _, task, *_ in self._tasks.values():
+            if task_channel == channel:
+                task.cancelled = True
+        return generation
+    
+    def is_current(self, channel, generation):
+        return self.generations.get(channel) == generation
+    
+    @Slot(int, bool, object)
+    def _on_finished(self, task_id, success, value):
+        entry = self._tasks.pop(task_id, None)
+        if entry is None:
+            return
+        channel, generation, task, on_result, on_error, _ = entry
+        if self._queued.get(channel) is task:
+            del self._queued[channel]
+        if not self.is_current(channel, generation):
+            # 用户已经离开，丢弃过期的结果
+            return
+        if success:
+            if on_result:
+                on_result(value)
+        elif on_error:
+            on_error(value)
+    
+    @Slot(int, object)
+    def _on_item(self, task_id, value):
+        entry = self._tasks.get(task_id)
+        if entry is None:
+            return
+        channel, generation, task, _, _, on_item = entry
+        if self._queued.get(channel) is task:
+            del self._queued[channel]
+        if self.is_current(channel, generation) and on_item:
+            on_item(value)
+    
+    def wait(self, msecs=-1):
+        """等待所有请求结束(退出程序时使用)"""
+        return self.pool.waitForDone(msecs)
+
+
+class AsyncExecutor(QObject):
+    """在后台线程运行一个asyncio事件循环，执行 AsyncAPI_123pan 的协程，结果通过信号回到GUI线程
+    
+    频道和代号的规则与 RequestExecutor 相同：同一频道再次提交或 cancel() 时取消旧协程，
+    已经得到的旧结果丢弃。所有协程共用一个线程，适合同时发出大量请求。
+    MainWindow 没有使用它，界面中的请求都经过 RequestExecutor；这是给基于Qt的脚本或扩展使用异步客户端的入口。
+    """
+    finished = Signal(int, bool, object)  # 完成信号 (任务ID, 是否成功, 结果或错误信息)
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="asyncio", daemon=True)
+        self.thread.start()
+        self.generations = {}  # 频道 -> 最新代号
+        self._tasks = {}  # 任务ID -> (频道, 代号, concurrent.futures.Future, 成功回调, 失败回调)
+        self._task_ids = itertools.count(1)
+        # 取消时完成回调在GUI线程中直接调用，也排队处理，避免在遍历任务时修改
+        self.finished.connect(self._on_finished, Qt.QueuedConnection)
+    
+    def run(self, coro):
+        """在事件循环中执行协程，返回 concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+    
+    def submit(self, channel, coro_fn, *args, on_result=None, on_error=None, **kwargs):
+        """提交 coro_fn(*args, **kwargs)，返回本次的代号"""
+        generation = self.cancel(channel)
+        task_id = next(self._task_ids)
+        future = self.run(coro_fn(*args, **kwargs))
+        self._tasks[task_id] = (channel, generation, future, on_result, on_error)
+        future.add_done_callback(lambda f: self._emit_result(task_id, f))
+        return generation
+    
+    def _emit_result(self, task_id, future):
+        # 在事件循环线程中调用，信号以排队方式送到GUI线程
+        if future.cancelled():
+            self.finished.emit(task_id, False, "已取消")
+        elif future.exception() is not None:
+            self.finished.emit(task_id, False, str(future.exception()))
+        else:
+            self.finished.emit(task_id, True, future.result())
+    
+    def cancel(self, channel):
+        """取消频道中已提交的协程，返回新的代号"""
+        generation = self.generations.get(channel, 0) + 1
+        self.generations[channel] = generation
+        for task_channel, _, future, *_ in list(self._tasks.values()):
+            if task_channel == channel:
+                future.cancel()
+        return generation
+    
+    def is_current(self, channel, generation):
+        return self.generations.get(channel) == generation
+    
+    @Slot(int, bool, object)
+    def _on_finished(self, task_id, success, value):
+        entry = self._tasks.pop(task_id, None)
+        if entry is None:
+            return
+        channel, generation, _, on_result, on_error = entry
+        if not self.is_current(channel, generation):
+            return
+        if success:
+            if on_result:
+                on_result(value)
+        elif on_error:
+            on_error(value)
+    
+    def stop(self, timeout=5):
+        """取消所有协程并停止事件循环(退出程序时使用)"""
+        for _, _, future, *_ in list(self._tasks.values()):
+            future.cancel()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout)
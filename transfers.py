@@ -0,0 +1,547 @@
+import os
+import json
+import time
+import heapq
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from PySide6.QtCore import QObject, QTimer, Signal
+from downloader import DEFAULT_DOWNLOAD_SEGMENTS
+from progress import ProgressAggregator
+from uploader import DEFAULT_UPLOAD_WORKERS
+from threads import DownloadThread, UploadThread, DUPLICATE_OVERWRITE
+from utils import TRANSFER_QUEUE_FILE
+from walker import TreeWalker
+
+DEFAULT_MAX_ACTIVE_TRANSFERS = 3  # 同时进行的传输数
+DEFAULT_FAST_LANE_SLOTS = 8  # 快速通道中同时传输的小文件数
+SMALL_FILE_SIZE = 4 * 1024 * 1024  # 不超过此大小的文件走快速通道
+THROUGHPUT_INTERVAL = 500  # 采样进度、刷新速度和剩余时间的间隔(毫秒)
+URL_PREFETCH_COUNT = 32  # 提前获取下载链接的排队下载数
+FOLDER_BATCH_SIZE = 200  # 遍历文件夹时每批加入队列的文件数
+STOP_TIMEOUT = 10.0  # 停止时等待传输线程结束的总时间上限(秒)
+SAVE_DELAY = 5000  # 队列变化后写入队列文件的延迟(毫秒)，期间的多次变化只写一次
+
+DOWNLOAD = "download"
+UPLOAD = "upload"
+
+QUEUED = "queued"
+RUNNING = "running"
+PAUSED = "paused"
+DONE = "done"
+FAILED = "failed"
+STATE_LABELS = {QUEUED: "排队中", RUNNING: "传输中", PAUSED: "已暂停", DONE: "已完成", FAILED: "失败"}
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+PRIORITY_LABELS = {PRIORITY_HIGH: "高", PRIORITY_NORMAL: "普通", PRIORITY_LOW: "低"}
+
+
+class Transfer:
+    """队列中的一个上传或下载
+    
+    下载时 remote_id 为文件ID、local_path 为保存位置；上传时 remote_id 为目标文件夹ID、local_path 为本地文件，
+    overwrite 为真时覆盖网盘中的同名文件。
+    """
+    __slots__ = ("transfer_id", "kind", "name", "local_path", "remote_id", "etag", "size", "priority",
+                 "connections", "state", "done_bytes", "error", "speed", "eta", "overwrite")
+    
+    def __init__(self, transfer_id, kind, name, local_path, remote_id, etag=None, size=0,
+                 priority=PRIORITY_NORMAL, connections=None, state=QUEUED, overwrite=False):
+        self.transfer_id = transfer_id
+        self.kind = kind
+        self.name = name
+        self.local_path = local_path
+        self.remote_id = str(remote_id)
+        self.etag = etag
+        self.size = size
+        self.priority = priority
+        self.connections = connections or (DEFAULT_DOWNLOAD_SEGMENTS if kind == DOWNLOAD else DEFAULT_UPLOAD_WORKERS)
+        self.state = state
+        self.done_bytes = 0
+        self.error = ""
+        self.speed = 0.0  # 平滑后的速度(字节/秒)
+        self.eta = None  # 预计剩余秒数
+        self.overwrite = overwrite
+    
+    @property
+    def finished(self):
+        return self.state in (DONE, FAILED)
+    
+    @property
+    def small(self):
+        return self.size <= SMALL_FILE_SIZE
+    
+    def to_dict(self):
+        return {
+            "kind": self.kind,
+            "name": self.name,
+            "localPath": self.local_path,
+            "remoteId": self.remote_id,
+            "etag": self.etag,
+            "size": self.size,
+            "priority": self.priority,
+            "connections": self.connections,
+            "state": self.state,
+            "error": self.error,
+            "overwrite": self.overwrite,
+        }
+    
+    @classmethod
+    def from_dict(cls, transfer_id, data):
+        state = data.get("state", QUEUED)
+        transfer = cls(
+            transfer_id, data["kind"], data["name"], data["localPath"], data["remoteId"],
+            etag=data.get("etag"), size=data.get("size", 0), priority=data.get("priority", PRIORITY_NORMAL),
+            connections=data.get("connections"), overwrite=data.get("overwrite", False),
+            # 上次退出时正在进行的传输重新排队，下载和上传都会从断点继续
+            state=QUEUED if state == RUNNING else state
+        )
+        transfer.error = data.get("error", "")
+        return transfer
+
+
+class TransferQueueStore:
+    """传输队列的持久化记录，程序重启后恢复未完成的传输"""
+    
+    def __init__(self, path=TRANSFER_QUEUE_FILE):
+        self.path = path
+    
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+    
+    def save(self, transfers):
+        self.write([transfer.to_dict() for transfer in transfers])
+    
+    def write(self, items):
+        """写入 Transfer.to_dict() 的列表，可在后台线程调用"""
+        tmp_path = self.path + ".tmp"
+        data = json.dumps(items, ensure_ascii=False)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+
+def iter_folder_downloads(api, folder_id, folder_name, save_dir, batch_size=FOLDER_BATCH_SIZE):
+    """遍历网盘文件夹，在 save_dir 下建立相同的目录结构，分批返回 add_transfers 使用的下载项
+    
+    用于 RequestExecutor.submit_stream，遍历在后台线程中进行，每批文件到达后即可开始下载。
+    """
+    root = os.path.join(save_dir, folder_name)
+    os.makedirs(root, exist_ok=True)
+    batch = []
+    for path, record in TreeWalker(api, root_id=folder_id).walk():
+        parts = path.strip("/").split("/")
+        if any(part in ("", ".", "..") for part in parts):
+            continue  # 不写到目标目录之外
+        local_path = os.path.join(root, *parts)
+        if record.is_folder:
+            os.makedirs(local_path, exist_ok=True)
+            continue
+        batch.append((DOWNLOAD, record.filename, local_path, record.file_id, record.etag, record.size))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class TransferManager(QObject):
+    """上传下载队列
+    
+    所有传输排成一个队列，最多 max_active 个同时进行，按优先级(相同时按加入顺序)启动；
+    另有 fast_lane_slots 个只给小文件使用的快速通道，成千上万个小文件不会排在大文件后面。
+    每个传输自己的连接数(下载分段数或上传并发分片数)在加入时指定。
+    排在前面的下载会提前批量获取下载链接，开始下载时不必再等待一次请求。
+    暂停时取消正在进行的传输，继续时重新排队，下载的断点文件和上传会话保证从断点继续。
+    上传的分片传完后如需服务器异步处理，由共享的查询服务等待结果，不再占用同时传输数。
+    未完成的传输保存在队列文件中(变化后延迟 SAVE_DELAY 在后台线程写入)，start() 之前不会启动任何传输(如尚未登录)。
+    排队的传输按 (优先级, 传输ID) 放在小文件和其他文件两个堆中，调度时只查看堆顶，不必每次排序整个队列。
+    """
+    added = Signal(list)  # 一次加入的传输ID列表
+    changed = Signal(int)  # 传输ID，状态或优先级变化
+    removed = Signal(int)  # 传输ID
+    progressed = Signal()  # 定时刷新进度和速度
+    throughput = Signal(float, float)  # 下载、上传的总速度(字节/秒)
+    finished = Signal(int, bool, str)  # 传输ID、是否成功、结果或错误信息
+    
+    def __init__(self, api, parent=None, max_active=DEFAULT_MAX_ACTIVE_TRANSFERS, store=None,
+                 fast_lane_slots=DEFAULT_FAST_LANE_SLOTS):
+        super().__init__(parent)
+        self.api = api
+        self.max_active = max(1, max_active)
+        self.fast_lane_slots = max(0, fast_lane_slots)
+        self.store = store or TransferQueueStore()
+        self.transfers = {}  # 传输ID -> Transfer，按加入顺序
+        self.enabled = False
+        self._threads = {}  # 传输ID -> 正在运行的线程
+        self._processing = {}  # 传输ID -> 分片已传完、等待服务器处理结果的上传线程
+        self._fast_lane = set()  # 占用快速通道的传输ID
+        self._stopping = {}  # 传输ID -> 线程结束后的状态(暂停、重新排队或移除)
+        self._queued = set()  # 排队中的传输ID
+        self._small_queue = []  # 排队的小文件 (优先级, 传输ID) 堆，不在 _queued 中或优先级已改变的项在堆顶时丢弃
+        self._large_queue = []  # 其他排队传输的堆
+        self.progress = ProgressAggregator()  # 定时采样已传输字节数，计算速度和剩余时间
+        self._ids = itertools.count(1)
+        
+        for data in self.store.load():
+            try:
+                transfer = Transfer.from_dict(next(self._ids), data)
+            except (KeyError, TypeError):
+                continue
+            self.transfers[transfer.transfer_id] = transfer
+            if transfer.state == QUEUED:
+                self.enqueue(transfer)
+        
+        self._save_pool = ThreadPoolExecutor(max_workers=1)  # 按顺序在后台写入队列文件
+        self.save_timer = QTimer(self)
+        self.save_timer.setSingleShot(True)
+        self.save_timer.setInterval(SAVE_DELAY)
+        self.save_timer.timeout.connect(self.save_now)
+        
+        self.timer = QTimer(self)
+        self.timer.setInterval(THROUGHPUT_INTERVAL)
+        self.timer.timeout.connect(self.update_throughput)
+        self.timer.start()
+    
+    # ===== 队列操作 =====
+    
+    def add_download(self, file_id, name, save_path, etag=None, size=0, priority=PRIORITY_NORMAL, connections=None):
+        return self.add_transfers([(DOWNLOAD, name, save_path, file_id, etag, size)], priority, connections)[0]
+    
+    def add_upload(self, file_path, parent_folder_id="0", priority=PRIORITY_NORMAL, connections=None):
+        return self.add_uploads([file_path], parent_folder_id, priority, connections)[0]
+    
+    def add_uploads(self, file_paths, parent_folder_id="0", priority=PRIORITY_NORMAL, connections=None):
+        items = []
+        for file_path in file_paths:
+            try:
+                size = os.path.getsize(file_path)
+            except OSError:
+                size = 0
+            items.append((UPLOAD, os.path.basename(file_path), file_path, parent_folder_id, None, size))
+        return self.add_transfers(items, priority, connections)
+    
+    def add_transfers(self, items, priority=PRIORITY_NORMAL, connections=None, overwrite=False):
+        """一次加入多个传输 [(类型, 名称, 本地路径, 远程ID, etag, 大小)]，只保存一次队列文件"""
+        added = []
+        for kind, name, local_path, remote_id, etag, size in items:
+            transfer = Transfer(next(self._ids), kind, name, local_path, remote_id, etag, size, priority, connections,
+                                overwrite=overwrite)
+            self.transfers[transfer.transfer_id] = transfer
+            self.enqueue(transfer)
+            added.append(transfer)
+        # 整批只发出一次信号，表格一次插入所有行
+        self.added.emit([transfer.transfer_id for transfer in added])
+        self.save()
+        self.schedule()
+        return added
+    
+    def pause(self, transfer_ids):
+        for transfer_id in transfer_ids:
+            transfer = self.transfers.get(transfer_id)
+            if transfer is None or transfer.finished or transfer.state == PAUSED:
+                continue
+            if transfer_id in self._threads:
+                self.stop_thread(transfer_id, PAUSED)
+            else:
+                transfer.state = PAUSED
+                self._queued.discard(transfer_id)
+                self.changed.emit(transfer_id)
+        self.save()
+    
+    def resume(self, transfer_ids):
+        """继续已暂停的传输，失败的传输重新开始(从断点继续)"""
+        for transfer_id in transfer_ids:
+            if self._stopping.get(transfer_id) == PAUSED:
+                # 还在停止中，结束后直接重新排队
+                self._stopping[transfer_id] = QUEUED
+                continue
+            transfer = self.transfers.get(transfer_id)
+            if transfer is None or transfer.state not in (PAUSED, FAILED):
+                continue
+            transfer.error = ""
+            self.enqueue(transfer)
+            self.changed.emit(transfer_id)
+        self.save()
+        self.schedule()
+    
+    def set_priority(self, transfer_ids, priority):
+        for transfer_id in transfer_ids:
+            transfer = self.transfers.get(transfer_id)
+            if transfer is not None and transfer.priority != priority:
+                transfer.priority = priority
+                if transfer_id in self._queued:
+                    # 旧优先级的堆项会在到达堆顶时丢弃
+                    self.enqueue(transfer)
+                self.changed.emit(transfer_id)
+        self.save()
+        self.schedule()
+    
+    def remove(self, transfer_ids):
+        """从队列中移除，正在进行的传输先停止(已下载的部分和断点文件保留)"""
+        for transfer_id in transfer_ids:
+            if transfer_id not in self.transfers:
+                continue
+            if transfer_id in self._threads:
+                self.stop_thread(transfer_id, None)
+            else:
+                self.forget(transfer_id)
+        self.save()
+    
+    def clear_finished(self):
+        self.remove([transfer_id for transfer_id, transfer in self.transfers.items() if transfer.state == DONE])
+    
+    def set_fast_lane_slots(self, slots):
+        self.fast_lane_slots = max(0, slots)
+        self.schedule()
+    
+    def set_max_active(self, max_active):
+        self.max_active = max(1, max_active)
+        self.schedule()
+    
+    def start(self):
+        """允许启动传输(登录后调用)"""
+        self.enabled = True
+        self.schedule()
+    
+    def stop(self, timeout=STOP_TIMEOUT):
+        """停止所有传输并重新排队，start() 后继续(退出登录或关闭程序时调用)
+        
+        取消后最多等待 timeout 秒让线程结束，避免关闭程序时销毁仍在运行的线程。
+        线程的完成信号到达后(如仍在运行)按 _stopping 中记录的状态重新排队。
+        """
+        self.enabled = False
+        for transfer_id in list(self._threads):
+            self.stop_thread(transfer_id, QUEUED)
+        deadline = time.monotonic() + timeout
+        for transfer_id, thread in list(self._threads.items()):
+            if thread.wait(max(0, int((deadline - time.monotonic()) * 1000))):
+                # 已结束的线程不必等完成信号再释放
+                del self._threads[transfer_id]
+                self._fast_lane.discard(transfer_id)
+                thread.deleteLater()
+        self.save_now(wait=True)
+    
+    def save(self):
+        """安排写入队列文件，SAVE_DELAY 内的多次调用合并为一次"""
+        if not self.save_timer.isActive():
+            self.save_timer.start()
+    
+    def save_now(self, wait=False):
+        """立即写入队列文件，wait 为真时等待写入完成(关闭程序时)"""
+        self.save_timer.stop()
+        # 在界面线程生成快照，写文件在后台线程进行；已完成的传输不再保存
+        items = [transfer.to_dict() for transfer in self.transfers.values() if transfer.state != DONE]
+        future = self._save_pool.submit(self._write, items)
+        if wait:
+            future.result()
+    
+    def _write(self, items):
+        try:
+            self.store.write(items)
+        except OSError:
+            pass
+    
+    # ===== 调度 =====
+    
+    def counts(self):
+        """返回 (进行中, 排队中) 的传输数"""
+        return len(self._threads) + len(self._processing), len(self._queued)
+    
+    def enqueue(self, transfer):
+        """把传输设为排队中并放入对应的堆"""
+        transfer.state = QUEUED
+        self._queued.add(transfer.transfer_id)
+        queue = self._small_queue if transfer.small else self._large_queue
+        heapq.heappush(queue, (transfer.priority, transfer.transfer_id))
+        if len(queue) > 2 * len(self._queued) + 1024:
+            # 失效的项太多时重建，堆的大小与排队数同阶
+            queue[:] = [entry for entry in queue if self.is_queued_entry(queue, entry)]
+            heapq.heapify(queue)
+    
+    def is_queued_entry(self, queue, entry):
+        """堆项是否仍有效：传输还在排队，优先级和所在的堆(下载后得知大小可能改变)都未变"""
+        priority, transfer_id = entry
+        if transfer_id not in self._queued:
+            return False
+        transfer = self.transfers[transfer_id]
+        return transfer.priority == priority and transfer.small == (queue is self._small_queue)
+    
+    def peek_queue(self, queue):
+        """返回堆中排在最前的排队传输，丢弃堆顶已失效的项"""
+        while queue:
+            if self.is_queued_entry(queue, queue[0]):
+                return queue[0]
+            heapq.heappop(queue)
+        return None
+    
+    def next_queued(self):
+        """返回按优先级排在最前的排队传输所在的堆，没有排队的传输时返回None"""
+        small = self.peek_queue(self._small_queue)
+        large = self.peek_queue(self._large_queue)
+        if small is None and large is None:
+            return None
+        if large is None or (small is not None and small < large):
+            return self._small_queue
+        return self._large_queue
+    
+    def first_queued(self, count):
+        """按启动顺序返回排在最前的 count 个排队传输，不移出队列"""
+        taken = []
+        while len(taken) < count:
+            queue = self.next_queued()
+            if queue is None:
+                break
+            entry = heapq.heappop(queue)
+            if not taken or taken[-1][1] != entry:
+                taken.append((queue, entry))
+        for queue, entry in taken:
+            heapq.heappush(queue, entry)
+        return [self.transfers[transfer_id] for _, (_, transfer_id) in taken]
+    
+    def schedule(self):
+        """按优先级启动排队的传输，直到达到同时传输数上限
+        
+        小文件先占用快速通道，普通通道按优先级启动两个堆中排在最前的传输。
+        """
+        if not self.enabled or not self.api.token:
+            return
+        while len(self._fast_lane) < self.fast_lane_slots and self.peek_queue(self._small_queue):
+            self.launch(self.transfers[self._small_queue[0][1]], fast_lane=True)
+        while self.max_active - (len(self._threads) - len(self._fast_lane)) > 0:
+            queue = self.next_queued()
+            if queue is None:
+                break
+            self.launch(self.transfers[queue[0][1]])
+        self.prefetch_urls(self.first_queued(URL_PREFETCH_COUNT))
+    
+    def prefetch_urls(self, waiting):
+        """为即将开始的下载批量预取下载链接，链接缓存在 API_123pan 中，已缓存的不再请求"""
+        self.api.prefetch_download_urls([transfer.remote_id for transfer in waiting if transfer.kind == DOWNLOAD])
+    
+    def url_provider(self, file_id):
+        """第一次调用在开始下载时，可以使用缓存或正在进行的预取；之后的调用说明链接已失效，重新获取"""
+        calls = itertools.count()
+        return lambda: self.api.get_download_url(file_id, refresh=next(calls) > 0)
+    
+    def launch(self, transfer, fast_lane=False):
+        transfer_id = transfer.transfer_id
+        self._queued.discard(transfer_id)
+        transfer.state = RUNNING
+        transfer.error = ""
+        transfer.done_bytes = 0
+        self.progress.reset(transfer_id)
+        if transfer.kind == DOWNLOAD:
+            # 下载线程开始时通过 url_provider 获取链接，不阻塞界面线程
+            thread = DownloadThread(
+                None, transfer.local_path, segments=transfer.connections, file_id=transfer.remote_id,
+                etag=transfer.etag, url_provider=self.url_provider(transfer.remote_id)
+            )
+            thread.progress_signal.connect(lambda done, total: self.on_progress(transfer_id, done, total))
+            thread.finished_signal.connect(lambda success, error: self.on_finished(transfer_id, success, error))
+        else:
+            thread = UploadThread(transfer.local_path, self.api.token, transfer.remote_id, workers=transfer.connections,
+                                  duplicate=DUPLICATE_OVERWRITE if transfer.overwrite else None)
+            thread.progress_signal.connect(
+                lambda current, total, text: self.on_progress(transfer_id, transfer.size * current // total if total else 0, transfer.size)
+            )
+            thread.processing_signal.connect(lambda: self.on_processing(transfer_id))
+            thread.finished_signal.connect(lambda success, result, _: self.on_finished(transfer_id, success, result))
+        self._threads[transfer_id] = thread
+        if fast_lane:
+            self._fast_lane.add(transfer_id)
+        self.changed.emit(transfer_id)
+        thread.start()
+    
+    def stop_thread(self, transfer_id, next_state):
+        self._stopping[transfer_id] = next_state
+        self._threads[transfer_id].cancel()
+    
+    def forget(self, transfer_id):
+        self.transfers.pop(transfer_id, None)
+        self._queued.discard(transfer_id)
+        self.progress.remove(transfer_id)
+        self.removed.emit(transfer_id)
+    
+    def on_progress(self, transfer_id, done, total):
+        transfer = self.transfers.get(transfer_id)
+        if transfer is not None:
+            transfer.done_bytes = done
+            if total:
+                transfer.size = total
+    
+    def on_processing(self, transfer_id):
+        """上传线程已结束、等待服务器处理结果，让出传输名额"""
+        thread = self._threads.pop(transfer_id, None)
+        if thread is None:
+            return
+        self._fast_lane.discard(transfer_id)
+        self._processing[transfer_id] = thread
+        self.progress.remove(transfer_id)
+        transfer = self.transfers.get(transfer_id)
+        if transfer is not None:
+            transfer.speed = 0.0
+            transfer.eta = None
+        self.schedule()
+    
+    def on_finished(self, transfer_id, success, result):
+        thread = self._threads.pop(transfer_id, None)
+        if thread is None:
+            thread = self._processing.pop(transfer_id, None)
+        self._fast_lane.discard(transfer_id)
+        if thread is not None:
+            thread.wait()
+            thread.deleteLater()
+        self.progress.remove(transfer_id)
+        transfer = self.transfers.get(transfer_id)
+        if transfer is None:
+            return
+        transfer.speed = 0.0
+        transfer.eta = None
+        stopping = transfer_id in self._stopping
+        next_state = self._stopping.pop(transfer_id, None)
+        if success:
+            transfer.state = DONE
+            transfer.done_bytes = transfer.size
+        elif stopping and next_state is None:
+            self.forget(transfer_id)
+        elif stopping and next_state == QUEUED:
+            self.enqueue(transfer)
+        elif stopping:
+            transfer.state = next_state
+        else:
+            transfer.state = FAILED
+            transfer.error = result
+        if transfer_id in self.transfers:
+            self.changed.emit(transfer_id)
+        if success or not stopping:
+            self.finished.emit(transfer_id, success, result)
+        self.save()
+        self.schedule()
+    
+    def update_throughput(self):
+        """采样正在进行的传输的进度，计算每个传输平滑后的速度、剩余时间和总的速度
+        
+        传输线程只更新已传输字节数，界面按 THROUGHPUT_INTERVAL 统一刷新，与进度更新的频率无关。
+        """
+        counters = {}
+        for transfer_id in self._threads:
+            transfer = self.transfers[transfer_id]
+            counters[transfer_id] = (transfer.done_bytes, transfer.size)
+        download_speed = upload_speed = 0.0
+        for transfer_id, (speed, eta) in self.progress.sample(counters).items():
+            transfer = self.transfers[transfer_id]
+            transfer.speed = speed
+            transfer.eta = eta
+            if transfer.kind == DOWNLOAD:
+                download_speed += transfer.speed
+            else:
+                upload_speed += transfer.speed
+        if self._threads:
+            self.progressed.emit()
+        self.throughput.emit(download_speed, upload_speed)
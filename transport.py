@@ -0,0 +1,315 @@
+import http.client
+import socket
+import ssl
+import threading
+import time
+from urllib.parse import urlsplit
+
+# 默认连接池参数
+DEFAULT_POOL_SIZE = 10  # 每个主机保留的空闲连接数
+DEFAULT_IDLE_TIMEOUT = 60  # 空闲连接的最长保留时间(秒)
+DEFAULT_TIMEOUT = 60  # 套接字超时(秒)
+SEND_BLOCK_SIZE = 256 * 1024  # 请求体为文件对象时每次读取发送的大小
+
+# 复用连接时可能遇到的"服务器已关闭连接"错误，遇到时换一个新连接重试一次
+STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    ConnectionResetError,
+    ConnectionAbortedError,
+    BrokenPipeError,
+)
+
+
+class Response:
+    """已读取完毕的HTTP响应"""
+    
+    def __init__(self, status, reason, headers, data):
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.data = data
+    
+    def getheader(self, name, default=None):
+        """获取响应头(不区分大小写)"""
+        return self.headers.get(name.lower(), default)
+
+
+class KeepAliveHTTPConnection(http.client.HTTPConnection):
+    """关闭Nagle算法的HTTP连接，避免请求头和请求体分两次发送时的延迟确认等待"""
+    
+    def connect(self):
+        super().connect()
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+class SessionReusingHTTPSConnection(http.client.HTTPSConnection):
+    """握手时复用同一主机上次TLS会话的HTTPS连接"""
+    
+    def __init__(self, host, port=None, session_store=None, **kwargs):
+        super().__init__(host, port, **kwargs)
+        self.session_store = session_store
+        self.session_reused = False
+    
+    def connect(self):
+        self.tcp_connect()
+        
+        server_hostname = self._tunnel_host or self.host
+        session = self.session_store.get() if self.session_store else None
+        try:
+            self.sock = self._context.wrap_socket(self.sock, server_hostname=server_hostname, session=session)
+        except ssl.SSLError:
+            if session is None:
+                raise
+            # 会话已失效，重新完整握手
+            self.tcp_connect()
+            self.sock = self._context.wrap_socket(self.sock, server_hostname=server_hostname)
+        
+        self.session_reused = self.sock.session_reused
+    
+    def tcp_connect(self):
+        http.client.HTTPConnection.connect(self)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+class TLSSessionStore:
+    """保存某个主机最近一次的TLS会话"""
+    
+    def __init__(self):
+        self._session = None
+        self._lock = threading.Lock()
+    
+    def get(self):
+        with self._lock:
+            return self._session
+    
+    def set(self, session):
+        if session is None:
+            return
+        with self._lock:
+            self._session = session
+
+
+class ConnectionPool:
+    """单个主机的keep-alive连接池"""
+    
+    def __init__(self, scheme, host, port, pool_size=DEFAULT_POOL_SIZE, idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                 timeout=DEFAULT_TIMEOUT, ssl_context=None):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+        self.session_store = TLSSessionStore()
+        
+        self._idle = []  # [(连接, 放回时间)]，后进先出
+        self._lock = threading.Lock()
+        
+        # 统计信息
+        self.created = 0
+        self.reused = 0
+        self.tls_sessions_reused = 0
+    
+    def new_connection(self):
+        """创建新连接(尚未建立TCP连接，首次请求时才连接)"""
+        if self.scheme == "https":
+            conn = SessionReusingHTTPSConnection(
+                self.host, self.port, session_store=self.session_store,
+                timeout=self.timeout, context=self.ssl_context, blocksize=SEND_BLOCK_SIZE
+            )
+        else:
+            conn = KeepAliveHTTPConnection(self.host, self.port, timeout=self.timeout, blocksize=SEND_BLOCK_SIZE)
+        with self._lock:
+            self.created += 1
+        return conn
+    
+    def acquire(self):
+        """取出一个连接，返回 (连接, 是否为复用的连接)"""
+        now = time.monotonic()
+        expired = []
+        conn = None
+        with self._lock:
+            while self._idle:
+                candidate, released_at = self._idle.pop()
+                if now - released_at > self.idle_timeout:
+                    expired.append(candidate)
+                    continue
+                conn = candidate
+                self.reused += 1
+                break
+            # 栈底的连接比栈顶更旧，一并清理
+            while self._idle and now - self._idle[0][1] > self.idle_timeout:
+                expired.append(self._idle.pop(0)[0])
+        
+        for stale in expired:
+            stale.close()
+        
+        if conn is not None:
+            return conn, True
+        return self.new_connection(), False
+    
+    def release(self, conn, reusable=True):
+        """归还连接，不可复用或池已满时直接关闭"""
+        if reusable and conn.sock is not None:
+            with self._lock:
+                if len(self._idle) < self.pool_size:
+                    self._idle.append((conn, time.monotonic()))
+                    return
+        conn.close()
+    
+    def note_handshake(self, conn):
+        """新连接完成首个请求后，保存TLS会话供下次握手复用"""
+        if not isinstance(conn, SessionReusingHTTPSConnection) or conn.sock is None:
+            return
+        # TLS 1.3的会话票据在握手之后才下发，所以读到响应后再保存
+        self.session_store.set(conn.sock.session)
+        if conn.session_reused:
+            with self._lock:
+                self.tls_sessions_reused += 1
+    
+    def evict_idle(self):
+        """关闭超过空闲时间的连接"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [conn for conn, released_at in self._idle if now - released_at > self.idle_timeout]
+            self._idle = [(conn, released_at) for conn, released_at in self._idle if now - released_at <= self.idle_timeout]
+        for conn in expired:
+            conn.close()
+        return len(expired)
+    
+    def close(self):
+        """关闭所有空闲连接"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            conn.close()
+
+
+class Transport:
+    """按主机划分连接池的HTTP传输层，GUI和各工作线程共用"""
+    
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                 timeout=DEFAULT_TIMEOUT, ssl_context=None):
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.ssl_context = ssl_context or ssl.create_default_context()
+        self._pools = {}
+        self._lock = threading.Lock()
+    
+    def get_pool(self, scheme, host, port=None):
+        """获取(或创建)指定主机的连接池"""
+        if port is None:
+            port = 443 if scheme == "https" else 80
+        key = (scheme, host, port)
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = ConnectionPool(
+                    scheme, host, port,
+                    pool_size=self.pool_size,
+                    idle_timeout=self.idle_timeout,
+                    timeout=self.timeout,
+                    ssl_context=self.ssl_context
+                )
+                self._pools[key] = pool
+            return pool
+    
+    def request(self, method, url, body=None, headers=None):
+        """发送请求并读取完整响应，url为完整地址(https://host/path)
+        
+        body 可以是 bytes/str，也可以是带 read 方法的文件对象(需在headers中给出Content-Length)。
+        """
+        parts = urlsplit(url)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        pool = self.get_pool(parts.scheme or "https", parts.hostname, parts.port)
+        
+        conn, reused = pool.acquire()
+        try:
+            res = self._send(conn, method, path, body, headers)
+        except STALE_CONNECTION_ERRORS:
+            pool.release(conn, reusable=False)
+            if not reused:
+                raise
+            # 服务器已关闭空闲连接，换新连接重试一次
+            if hasattr(body, "seek"):
+                body.seek(0)
+            conn, reused = pool.new_connection(), False
+            try:
+                res = self._send(conn, method, path, body, headers)
+            except Exception:
+                pool.release(conn, reusable=False)
+                raise
+        except Exception:
+            pool.release(conn, reusable=False)
+            raise
+        
+        try:
+            data = res.read()
+        except Exception:
+            pool.release(conn, reusable=False)
+            raise
+        if not reused:
+            pool.note_handshake(conn)
+        pool.release(conn, reusable=not res.will_close)
+        
+        response_headers = {name.lower(): value for name, value in res.getheaders()}
+        return Response(res.status, res.reason, response_headers, data)
+    
+    def _send(self, conn, method, path, body, headers):
+        conn.request(method, path, body, headers or {})
+        return conn.getresponse()
+    
+    def evict_idle(self):
+        """清理所有连接池中超时的空闲连接"""
+        with self._lock:
+            pools = list(self._pools.values())
+        return sum(pool.evict_idle() for pool in pools)
+    
+    def stats(self):
+        """各主机的连接统计 {(scheme, host, port): {...}}"""
+        with self._lock:
+            pools = list(self._pools.items())
+        return {
+            key: {
+                "created": pool.created,
+                "reused": pool.reused,
+                "tls_sessions_reused": pool.tls_sessions_reused,
+            }
+            for key, pool in pools
+        }
+    
+    def close(self):
+        """关闭所有连接"""
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools = {}
+        for pool in pools:
+            pool.close()
+
+
+_default_transport = None
+_default_lock = threading.Lock()
+
+
+def get_transport():
+    """获取全局共享的传输层"""
+    global _default_transport
+    with _default_lock:
+        if _default_transport is None:
+            _default_transport = Transport()
+        return _default_transport
+
+
+def configure_transport(**kwargs):
+    """使用新参数替换全局传输层(pool_size, idle_timeout, timeout, ssl_context)"""
+    global _default_transport
+    with _default_lock:
+        old, _default_transport = _default_transport, Transport(**kwargs)
+    if old is not None:
+        old.close()
+    return _default_transport
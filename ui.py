@@ -1,9 +1,15 @@
+import os
 from PySide6.QtWidgets import (QMainWindow, QPushButton, QVBoxLayout, QStyle,
-                              QWidget, QLabel, QFileDialog, QTableWidget, QTableWidgetItem,
-                              QHBoxLayout, QHeaderView, QMessageBox, QProgressBar)
-from PySide6.QtCore import Qt
+                              QWidget, QLabel, QFileDialog, QTableView, QLineEdit,
+                              QHBoxLayout, QHeaderView, QMessageBox, QSpinBox)
+from PySide6.QtCore import Qt, QTimer
 from auth import LoginDialog
-from threads import DownloadThread, UploadThread
+from folderupload import upload_folder
+from models import FileTableModel, TransferTableModel
+from searchindex import parse_query, DEFAULT_SEARCH_LIMIT
+from sync import SyncEngine
+from threads import RequestExecutor
+from transfers import TransferManager, iter_folder_downloads, DOWNLOAD, UPLOAD, PRIORITY_HIGH, PRIORITY_NORMAL
 from utils import save_credentials, format_file_size
 
 class MainWindow(QMainWindow):
@@ -20,6 +26,16 @@ class MainWindow(QMainWindow):
         self.current_path = "/"
         self.last_file_id = None  # 用于分页
         self.folder_history = []  # 文件夹导航历史
+        self.search_results = None  # 搜索模式下表格中的 [FileRecord]，None 表示正在浏览文件夹
+        
+        # 阻塞的API请求放到后台线程执行，避免界面卡顿
+        self.request_executor = RequestExecutor(self)
+        
+        # 所有上传下载排队执行，限制同时进行的传输数
+        self.transfer_manager = TransferManager(api, self)
+        self.sync_engines = []  # 还有传输未完成的同步
+        self.transfer_manager.finished.connect(self.on_transfer_finished)
+        self.transfer_manager.throughput.connect(self.update_transfer_summary)
         
         self.setup_ui()
         self.auto_login()
@@ -58,7 +74,10 @@ class MainWindow(QMainWindow):
         
         # 添加文件表格
         self.file_table = self.create_file_table()
-        main_layout.addWidget(self.file_table)
+        main_layout.addWidget(self.file_table, 3)
+        
+        # 传输队列
+        main_layout.addWidget(self.create_transfer_panel(), 1)
         
         # 状态标签
         self.status_label = QLabel("准备就绪")
@@ -94,17 +113,17 @@ class MainWindow(QMainWindow):
             QPushButton:pressed {
                 background-color: #d0d0d0;
             }
-            QTableWidget {
+            QTableView {
                 border: 1px solid #e0e0e0;
                 border-radius: 8px;
                 background-color: #ffffff;
                 gridline-color: #f0f0f0;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 4px;
                 border-bottom: 1px solid #f0f0f0;
             }
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #e5f3ff;
                 color: #000000;
             }
@@ -162,7 +181,7 @@ class MainWindow(QMainWindow):
         # 刷新按钮
         refresh_button = QPushButton("刷新列表")
         refresh_button.setIcon(self.style().standardIcon(QStyle.SP_BrowserReload))
-        refresh_button.clicked.connect(lambda: self.list_files())
+        refresh_button.clicked.connect(lambda: self.list_files(refresh=True))
         button_layout.addWidget(refresh_button)
         
         # 上传按钮
@@ -171,24 +190,52 @@ class MainWindow(QMainWindow):
         upload_button.clicked.connect(self.upload_file)
         button_layout.addWidget(upload_button)
         
+        # 上传文件夹按钮
+        upload_folder_button = QPushButton("上传文件夹")
+        upload_folder_button.setIcon(self.style().standardIcon(QStyle.SP_DirIcon))
+        upload_folder_button.clicked.connect(self.upload_folder)
+        button_layout.addWidget(upload_folder_button)
+        
+        # 同步文件夹按钮
+        sync_button = QPushButton("同步文件夹")
+        sync_button.setIcon(self.style().standardIcon(QStyle.SP_BrowserReload))
+        sync_button.clicked.connect(self.sync_folder)
+        button_layout.addWidget(sync_button)
+        
         # 下载按钮
         download_button = QPushButton("下载文件")
         download_button.setIcon(self.style().standardIcon(QStyle.SP_ArrowDown))
         download_button.clicked.connect(self.download_file)
         button_layout.addWidget(download_button)
         
+        # 搜索框，停止输入一小段时间后才查询本地索引
+        self.search_box = QLineEdit()
+        self.search_box.setPlaceholderText("搜索已浏览过的文件，如: 报告 ext:pdf size:>10MB md5:...")
+        self.search_box.setClearButtonEnabled(True)
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(250)
+        self.search_timer.timeout.connect(self.run_search)
+        self.search_box.textChanged.connect(self.search_timer.start)
+        self.search_box.returnPressed.connect(self.run_search)
+        button_layout.addWidget(self.search_box, 1)
+        
         return button_layout
     
     def create_file_table(self):
         """创建文件表格"""
-        file_table = QTableWidget(0, 7)
-        file_table.setHorizontalHeaderLabels(["文件ID", "文件名", "类型", "大小", "分类", "状态", "MD5"])
+        self.file_model = FileTableModel(self)
+        file_table = QTableView()
+        file_table.setModel(self.file_model)
         file_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
-        file_table.setSelectionBehavior(QTableWidget.SelectRows)
-        file_table.setEditTriggers(QTableWidget.NoEditTriggers)
-        file_table.cellDoubleClicked.connect(self.on_file_double_clicked)
+        file_table.setSelectionBehavior(QTableView.SelectRows)
+        file_table.setEditTriggers(QTableView.NoEditTriggers)
+        file_table.doubleClicked.connect(self.on_file_double_clicked)
         file_table.setAlternatingRowColors(True)
         file_table.verticalHeader().setVisible(False)
+        # 固定行高，视图不必逐行计算高度，只绘制可见的行
+        file_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        file_table.verticalHeader().setDefaultSectionSize(file_table.fontMetrics().height() + 12)
         return file_table
     
     def create_pagination_layout(self):
@@ -198,10 +245,64 @@ class MainWindow(QMainWindow):
         self.next_page_button.setIcon(self.style().standardIcon(QStyle.SP_ArrowRight))
         self.next_page_button.clicked.connect(lambda: self.list_files(use_last_id=True))
         self.next_page_button.setVisible(False)  # 默认隐藏
+        self.load_all_button = QPushButton("全部加载")
+        self.load_all_button.clicked.connect(self.load_all_files)
+        self.load_all_button.setVisible(False)
         pagination_layout.addStretch()
         pagination_layout.addWidget(self.next_page_button)
+        pagination_layout.addWidget(self.load_all_button)
         return pagination_layout
     
+    def create_transfer_panel(self):
+        """创建传输队列面板"""
+        panel = QWidget()
+        layout = QVBoxLayout(panel)
+        layout.setContentsMargins(0, 0, 0, 0)
+        
+        header_layout = QHBoxLayout()
+        self.transfer_summary_label = QLabel()
+        header_layout.addWidget(self.transfer_summary_label, 1)
+        header_layout.addWidget(QLabel("同时传输:"))
+        self.max_active_box = QSpinBox()
+        self.max_active_box.setRange(1, 10)
+        self.max_active_box.setValue(self.transfer_manager.max_active)
+        self.max_active_box.valueChanged.connect(self.transfer_manager.set_max_active)
+        header_layout.addWidget(self.max_active_box)
+        header_layout.addWidget(QLabel("小文件通道:"))
+        self.fast_lane_box = QSpinBox()
+        self.fast_lane_box.setRange(0, 32)
+        self.fast_lane_box.setValue(self.transfer_manager.fast_lane_slots)
+        self.fast_lane_box.valueChanged.connect(self.transfer_manager.set_fast_lane_slots)
+        header_layout.addWidget(self.fast_lane_box)
+        
+        buttons = [
+            ("暂停", lambda: self.transfer_manager.pause(self.selected_transfer_ids())),
+            ("继续", lambda: self.transfer_manager.resume(self.selected_transfer_ids())),
+            ("优先", lambda: self.transfer_manager.set_priority(self.selected_transfer_ids(), PRIORITY_HIGH)),
+            ("取消优先", lambda: self.transfer_manager.set_priority(self.selected_transfer_ids(), PRIORITY_NORMAL)),
+            ("移除", lambda: self.transfer_manager.remove(self.selected_transfer_ids())),
+            ("清除已完成", self.transfer_manager.clear_finished),
+        ]
+        for text, handler in buttons:
+            button = QPushButton(text)
+            button.clicked.connect(handler)
+            header_layout.addWidget(button)
+        layout.addLayout(header_layout)
+        
+        self.transfer_model = TransferTableModel(self.transfer_manager, self)
+        self.transfer_table = QTableView()
+        self.transfer_table.setModel(self.transfer_model)
+        self.transfer_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.transfer_table.setSelectionBehavior(QTableView.SelectRows)
+        self.transfer_table.setEditTriggers(QTableView.NoEditTriggers)
+        self.transfer_table.verticalHeader().setVisible(False)
+        self.transfer_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.transfer_table.verticalHeader().setDefaultSectionSize(self.transfer_table.fontMetrics().height() + 12)
+        layout.addWidget(self.transfer_table)
+        
+        self.update_transfer_summary(0, 0)
+        return panel
+    
     # ===== 认证和用户信息相关方法 =====
     
     def auto_login(self):
@@ -212,6 +313,7 @@ class MainWindow(QMainWindow):
             self.update_login_button()
             self.update_user_info()
             self.list_files()
+            self.transfer_manager.start()
             self.status_label.setText(f"自动登录成功，token有效期剩余{message}")
     
     def login(self):
@@ -231,22 +333,43 @@ class MainWindow(QMainWindow):
                     
                     # 登录
                     self.status_label.setText("正在登录...")
-                    success, message = self.auth_manager.login_with_credentials(client_id, client_secret)
-                    
-                    if success:
-                        self.is_logged_in = True
-                        self.update_login_button()
-                        self.update_user_info()
-                        self.list_files()
-                        self.status_label.setText(message)
-                    else:
-                        self.status_label.setText(message)
-                        QMessageBox.warning(self, "登录失败", message)
+                    self.login_button.setEnabled(False)
+                    self.request_executor.submit(
+                        "login", self.auth_manager.login_with_credentials, client_id, client_secret,
+                        on_result=self.on_login_finished,
+                        on_error=lambda error: self.on_login_finished((False, f"登录失败: {error}"))
+                    )
                 else:
                     QMessageBox.warning(self, "登录失败", "Client ID 和 Client Secret 不能为空")
     
+    def on_login_finished(self, result):
+        """登录请求完成"""
+        success, message = result
+        self.login_button.setEnabled(True)
+        
+        if success:
+            self.is_logged_in = True
+            self.update_login_button()
+            self.update_user_info()
+            self.list_files()
+            self.transfer_manager.start()
+            self.status_label.setText(message)
+        else:
+            self.status_label.setText(message)
+            QMessageBox.warning(self, "登录失败", message)
+    
     def logout(self):
         """退出登录"""
+        # 作废还未返回的请求
+        for channel in ("user_info", "list_files", "search"):
+            self.request_executor.cancel(channel)
+        self.leave_search()
+        for channel in list(self.request_executor.generations):
+            if channel.startswith(("download_folder:", "upload_folder:", "sync_folder:")):
+                self.request_executor.cancel(channel)
+        # 正在进行的传输重新排队，再次登录后继续
+        self.transfer_manager.stop()
+        
         # 清除token
         self.auth_manager.logout()
         self.is_logged_in = False
@@ -254,7 +377,7 @@ class MainWindow(QMainWindow):
         # 更新UI
         self.update_login_button()
         self.user_info_label.setText("未登录")
-        self.file_table.setRowCount(0)
+        self.file_model.clear()
         self.status_label.setText("已退出登录")
         
         # 重置文件夹状态
@@ -274,23 +397,28 @@ class MainWindow(QMainWindow):
             return
         
         self.status_label.setText("正在获取用户信息...")
-        try:
-            spaceUsed, spacePermanent, directTraffic = self.api.get_user_info()
-            self.user_info_label.setText(
-                f'已用空间：{spaceUsed:.2f} GB | 总空间：{spacePermanent:.2f} TB | 剩余直链流量：{directTraffic:.2f} GB'
-            )
-            self.status_label.setText("获取用户信息成功")
-        except Exception as e:
-            self.status_label.setText(f"获取用户信息失败: {e}")
+        self.request_executor.submit(
+            "user_info", self.api.get_user_info,
+            on_result=self.show_user_info,
+            on_error=lambda error: self.status_label.setText(f"获取用户信息失败: {error}")
+        )
+    
+    def show_user_info(self, info):
+        """显示用户信息"""
+        spaceUsed, spacePermanent, directTraffic = info
+        self.user_info_label.setText(
+            f'已用空间：{spaceUsed:.2f} GB | 总空间：{spacePermanent:.2f} TB | 剩余直链流量：{directTraffic:.2f} GB'
+        )
     
     # ===== 文件操作相关方法 =====
     
-    def list_files(self, use_last_id=False):
-        """获取并显示文件列表"""
+    def list_files(self, use_last_id=False, refresh=False):
+        """获取并显示文件列表，refresh=True时跳过列表缓存"""
         if not self.is_logged_in:
             QMessageBox.warning(self, "错误", "请先登录")
             return
-
+        self.leave_search()
+        
         # 每次刷新时更新用户信息
         self.update_user_info()
         # 确定使用哪个last_file_id
@@ -299,69 +427,175 @@ class MainWindow(QMainWindow):
             last_id = self.last_file_id
         
         self.status_label.setText(f"正在获取文件列表，文件夹ID: {self.current_folder_id}...")
-        try:
-            files, last_file_id = self.api.get_file_list(self.current_folder_id, last_id)
+        # 快速切换文件夹时，之前文件夹的列表结果会被丢弃
+        self.request_executor.submit(
+            "list_files", self.api.get_file_list, self.current_folder_id, last_id, refresh=refresh,
+            on_result=lambda result: self.show_file_list(result, use_last_id),
+            on_error=self.on_list_files_failed
+        )
+    
+    def show_file_list(self, result, use_last_id):
+        """显示获取到的文件列表"""
+        files, last_file_id = result
+        if files:
+            # 如果是加载下一页，则追加到现有列表
+            if use_last_id:
+                self.append_files(files)
+            else:
+                self.display_files(files)
             
-            if files:
-                # 如果是加载下一页，则追加到现有列表
-                if use_last_id:
-                    self.append_files(files)
-                else:
-                    self.display_files(files)
-                
-                # 保存最后一个文件ID用于下一页
-                self.last_file_id = last_file_id
-                
-                # 根据是否有更多文件显示或隐藏"下一页"按钮
-                if last_file_id and last_file_id != -1:
-                    self.next_page_button.setVisible(True)
-                    self.status_label.setText(f"显示部分文件，还有更多文件")
-                else:
-                    self.next_page_button.setVisible(False)
-                    self.status_label.setText("已显示全部文件")
+            # 保存最后一个文件ID用于下一页
+            self.last_file_id = last_file_id
+            
+            # 根据是否有更多文件显示或隐藏"下一页"按钮
+            if last_file_id and last_file_id != -1:
+                self.set_pagination_visible(True)
+                self.status_label.setText(f"显示部分文件，还有更多文件")
             else:
-                self.status_label.setText("文件夹为空或获取失败")
-                self.next_page_button.setVisible(False)
-        except Exception as e:
-            self.status_label.setText(f"获取文件列表失败: {e}")
-            self.next_page_button.setVisible(False)
+                self.set_pagination_visible(False)
+                self.status_label.setText("已显示全部文件")
+        else:
+            if not use_last_id:
+                self.file_model.clear()
+            self.status_label.setText("文件夹为空或获取失败")
+            self.set_pagination_visible(False)
+    
+    def set_pagination_visible(self, visible):
+        """显示或隐藏"下一页"和"全部加载"按钮"""
+        self.next_page_button.setVisible(visible)
+        self.load_all_button.setVisible(visible)
+    
+    def load_all_files(self):
+        """从当前位置起加载文件夹剩余的全部文件，每收到一页就追加到表格"""
+        if not self.is_logged_in or not self.last_file_id or self.last_file_id == -1:
+            return
+        
+        self.set_pagination_visible(False)
+        self.status_label.setText("正在加载全部文件...")
+        # 与普通翻页使用同一频道，切换文件夹时会停止加载
+        self.request_executor.submit_stream(
+            "list_files", self.api.iter_folder_pages, self.current_folder_id, last_file_id=self.last_file_id,
+            on_item=self.on_all_files_page,
+            on_result=lambda _: self.on_all_files_loaded(),
+            on_error=self.on_list_files_failed
+        )
+    
+    def on_all_files_page(self, files):
+        """全部加载时收到一页文件"""
+        self.append_files(files)
+        self.status_label.setText(f"正在加载全部文件，已显示 {self.file_model.rowCount()} 个")
+    
+    def on_all_files_loaded(self):
+        """全部文件加载完成"""
+        self.last_file_id = -1
+        self.status_label.setText(f"已显示全部文件，共 {self.file_model.rowCount()} 个")
+    
+    def on_list_files_failed(self, error):
+        """获取文件列表失败"""
+        self.status_label.setText(f"获取文件列表失败: {error}")
+        self.set_pagination_visible(False)
     
     def display_files(self, files):
         """在表格中显示文件列表"""
-        self.file_table.setRowCount(0)  # 清空表格
-        self.append_files(files)
+        self.file_model.set_files(files)
     
     def append_files(self, files):
         """将文件追加到表格末尾"""
-        current_row_count = self.file_table.rowCount()
-        
-        for row, file in enumerate(files):
-            row_index = current_row_count + row
-            self.file_table.insertRow(row_index)
-            self.file_table.setItem(row_index, 0, QTableWidgetItem(str(file["fileId"])))
-            self.file_table.setItem(row_index, 1, QTableWidgetItem(file["filename"]))
-            self.file_table.setItem(row_index, 2, QTableWidgetItem(file["type"]))
-            self.file_table.setItem(row_index, 3, QTableWidgetItem(file["size"]))
-            self.file_table.setItem(row_index, 4, QTableWidgetItem(file["category"]))
-            self.file_table.setItem(row_index, 5, QTableWidgetItem(file["status"]))
-            self.file_table.setItem(row_index, 6, QTableWidgetItem(file["etag"] or ""))
-    
-    def on_file_double_clicked(self, row, column):
+        self.file_model.append_files(files)
+    
+    def on_file_double_clicked(self, index):
         """处理文件表格的双击事件"""
         if not self.is_logged_in:
             return
-            
-        file_id = self.file_table.item(row, 0).text()
-        file_type = self.file_table.item(row, 2).text()
-        file_name = self.file_table.item(row, 1).text()
         
-        if file_type == "文件夹":
+        row = index.row()
+        if self.search_results is not None:
+            self.open_search_result(self.search_results[row])
+            return
+        file_id = self.file_model.file_id(row)
+        file_name = self.file_model.file_name(row)
+        
+        if self.file_model.is_folder(row):
             # 如果是文件夹，则进入该文件夹
             self.enter_folder(file_id, file_name)
         else:
             # 如果是文件，可以实现预览或下载功能
             self.status_label.setText(f"选择了文件: {file_name}")
     
+    # ===== 搜索相关方法 =====
+    
+    def run_search(self):
+        """在本地索引中搜索，搜索框清空时回到当前文件夹"""
+        self.search_timer.stop()
+        text = self.search_box.text().strip()
+        if not text:
+            if self.search_results is not None:
+                self.search_results = None
+                self.request_executor.cancel("search")
+                self.list_files()
+            return
+        if not self.is_logged_in:
+            return
+        
+        search_index = self.api.search_index
+        if search_index is None:
+            self.status_label.setText("搜索索引不可用")
+            return
+        try:
+            query = parse_query(text)
+        except ValueError as e:
+            self.status_label.setText(str(e))
+            return
+        
+        # 搜索结果替换表格内容，作废还未返回的文件夹列表
+        self.request_executor.cancel("list_files")
+        self.request_executor.submit(
+            "search", search_index.search, **query,
+            on_result=self.show_search_results,
+            on_error=lambda error: self.status_label.setText(f"搜索失败: {error}")
+        )
+    
+    def show_search_results(self, records):
+        """显示搜索结果"""
+        self.search_results = records
+        self.display_files(records)
+        self.set_pagination_visible(False)
+        if len(records) >= DEFAULT_SEARCH_LIMIT:
+            self.status_label.setText(f"显示前 {len(records)} 个搜索结果，双击可定位到所在文件夹")
+        else:
+            self.status_label.setText(f"在已浏览过的文件中找到 {len(records)} 个，双击可定位到所在文件夹")
+    
+    def leave_search(self):
+        """退出搜索模式，清空搜索框"""
+        if self.search_results is None:
+            return
+        self.search_results = None
+        self.request_executor.cancel("search")
+        self.search_box.blockSignals(True)
+        self.search_box.clear()
+        self.search_box.blockSignals(False)
+    
+    def open_search_result(self, record):
+        """打开搜索结果：文件夹直接进入，文件定位到所在的文件夹"""
+        folder_id = record.file_id if record.is_folder else record.parent_file_id
+        chain = self.api.search_index.folder_chain(folder_id)
+        self.leave_search()
+        
+        # 用索引中的上级文件夹重建导航历史，路径导航和返回按钮可以直接使用
+        if chain:
+            self.folder_history = chain[:-1]
+            self.current_folder_id, self.current_path = chain[-1]
+        else:
+            self.folder_history.append((self.current_folder_id, self.current_path))
+            self.current_folder_id = str(folder_id)
+            # 上级文件夹还没有浏览过，路径未知
+            self.current_path = f"/…/{record.filename}/" if record.is_folder else "/…/"
+        self.update_path_navigation()
+        self.last_file_id = None
+        self.list_files()
+        if not record.is_folder:
+            self.status_label.setText(f"已定位到 {record.filename} 所在的文件夹")
+    
     # ===== 文件夹导航相关方法 =====
     
     def enter_folder(self, folder_id, folder_name):
@@ -530,137 +764,172 @@ class MainWindow(QMainWindow):
         self.list_files()
     
     def upload_file(self):
-        """上传文件"""
+        """把选中的文件加入上传队列"""
         if not self.is_logged_in:
             QMessageBox.warning(self, "错误", "请先登录")
             return
-            
-        # 选择要上传的文件
-        file_path, _ = QFileDialog.getOpenFileName(self, "选择要上传的文件")
-        if not file_path:
-            return
         
-        file_name = os.path.basename(file_path)
-        self.status_label.setText(f"准备上传文件: {file_name}")
-        
-        # 创建进度条
-        self.upload_progress_bar = QProgressBar()
-        self.upload_progress_bar.setRange(0, 100)
-        self.upload_progress_bar.setValue(0)
-        self.upload_progress_bar.setTextVisible(True)
-        self.upload_progress_bar.setFormat("%p% - " + file_name)
-        
-        # 添加进度条到主布局
-        central_widget = self.centralWidget()
-        main_layout = central_widget.layout()
-        main_layout.insertWidget(main_layout.count()-1, self.upload_progress_bar)  # 在状态标签之前插入
-        
-        # 创建并启动上传线程
-        self.upload_thread = UploadThread(file_path, self.auth_manager.token, self.current_folder_id)
-        self.upload_thread.progress_signal.connect(self.update_upload_progress)
-        self.upload_thread.finished_signal.connect(self.upload_finished)
-        self.upload_thread.start()
-    
-    def update_upload_progress(self, current, total, status_text):
-        """更新上传进度"""
-        if total > 0:
-            progress = int((current / total) * 100)
-            self.upload_progress_bar.setValue(progress)
-            self.status_label.setText(status_text)
-    
-    def upload_finished(self, success, result, file_name):
-        """上传完成处理"""
-        # 移除进度条
-        if hasattr(self, 'upload_progress_bar'):
-            central_widget = self.centralWidget()
-            main_layout = central_widget.layout()
-            main_layout.removeWidget(self.upload_progress_bar)
-            self.upload_progress_bar.deleteLater()
-            self.upload_progress_bar = None
+        # 选择要上传的文件，可以多选
+        file_paths, _ = QFileDialog.getOpenFileNames(self, "选择要上传的文件")
+        if not file_paths:
+            return
         
-        if success:
-            self.status_label.setText(f"文件 {file_name} 上传成功，文件ID: {result}")
-            # 刷新文件列表
-            self.list_files()
-        else:
-            self.status_label.setText(f"文件上传失败: {result}")
+        self.transfer_manager.add_uploads(file_paths, self.current_folder_id)
+        self.status_label.setText(f"已将 {len(file_paths)} 个文件加入上传队列")
     
-    def download_file(self):
-        """下载文件"""
+    def upload_folder(self):
+        """上传整个文件夹：先创建目录并尝试秒传，其余文件加入上传队列"""
         if not self.is_logged_in:
             QMessageBox.warning(self, "错误", "请先登录")
             return
-            
-        selected_rows = self.file_table.selectedIndexes()
-        if not selected_rows:
-            QMessageBox.warning(self, "错误", "请先选择要下载的文件")
-            return
         
-        # 获取选中的行
-        row = selected_rows[0].row()
-        file_id = self.file_table.item(row, 0).text()
-        file_name = self.file_table.item(row, 1).text()
-        file_type = self.file_table.item(row, 2).text()
+        local_dir = QFileDialog.getExistingDirectory(self, "选择要上传的文件夹")
+        if not local_dir:
+            return
         
-        if file_type == "文件夹":
-            QMessageBox.warning(self, "错误", "不能直接下载文件夹")
+        self.status_label.setText(f"正在扫描文件夹: {local_dir}")
+        self.request_executor.submit_stream(
+            f"upload_folder:{local_dir}", upload_folder, self.api, local_dir, self.current_folder_id,
+            on_item=self.on_folder_upload_progress,
+            on_error=lambda error: self.status_label.setText(f"上传文件夹失败: {error}")
+        )
+    
+    def on_folder_upload_progress(self, report):
+        """文件夹上传的进度，需要完整上传的文件加入上传队列"""
+        if report.new_uploads:
+            self.transfer_manager.add_transfers(report.new_uploads)
+        self.status_label.setText(report.summary())
+        if report.done:
+            if self.current_folder_id in report.touched_folders and self.search_results is None:
+                self.list_files()
+            if report.failed:
+                details = "\n".join(f"{path}: {error}" for path, error in report.failed[:20])
+                QMessageBox.warning(self, "部分文件上传失败", details)
+    
+    def sync_folder(self):
+        """把本地文件夹与当前网盘文件夹双向同步，只传输新增或修改过的文件"""
+        if not self.is_logged_in:
+            QMessageBox.warning(self, "错误", "请先登录")
             return
         
-        # 选择保存位置
-        save_path, _ = QFileDialog.getSaveFileName(self, "保存文件", file_name)
-        if not save_path:
+        local_dir = QFileDialog.getExistingDirectory(self, "选择要与当前网盘文件夹同步的本地文件夹")
+        if not local_dir:
             return
         
-        self.status_label.setText(f"准备下载文件: {file_name}")
+        engine = SyncEngine(self.api, local_dir, self.current_folder_id)
+        self.status_label.setText(f"正在比较 {local_dir} 与网盘文件夹")
+        self.request_executor.submit(
+            f"sync_folder:{engine.pair}", engine.run,
+            on_result=lambda plan: self.on_sync_planned(engine, plan),
+            on_error=lambda error: self.status_label.setText(f"同步文件夹失败: {error}")
+        )
+    
+    def on_sync_planned(self, engine, plan):
+        """比较完成，确认后把需要传输的文件加入传输队列"""
+        self.status_label.setText(plan.summary())
+        if plan.conflicts:
+            details = "\n".join(plan.conflicts[:20])
+            QMessageBox.warning(self, "同步冲突", f"以下文件在本地和网盘都被修改过，没有同步:\n{details}")
+        if plan.empty:
+            return
+        answer = QMessageBox.question(self, "同步文件夹", plan.summary() + "\n\n是否开始传输？")
+        if answer != QMessageBox.Yes:
+            return
+        engine.queue(plan, self.transfer_manager)
+        self.sync_engines = [e for e in self.sync_engines if e.active] + [engine]
+    
+    def download_file(self):
+        """把选中的文件和文件夹加入下载队列"""
+        if not self.is_logged_in:
+            QMessageBox.warning(self, "错误", "请先登录")
+            return
         
-        try:
-            # 1. 获取下载链接
-            download_url = self.api.get_download_url(file_id)
-            if not download_url:
-                self.status_label.setText("获取下载链接失败")
-                return
-            
-            # 2. 创建进度条
-            self.progress_bar = QProgressBar()
-            self.progress_bar.setRange(0, 100)
-            self.progress_bar.setValue(0)
-            self.progress_bar.setTextVisible(True)
-            self.progress_bar.setFormat("%p% - " + file_name)
-            
-            # 添加进度条到主布局
-            central_widget = self.centralWidget()
-            main_layout = central_widget.layout()
-            main_layout.insertWidget(main_layout.count()-1, self.progress_bar)  # 在状态标签之前插入
-            
-            # 3. 创建并启动下载线程
-            self.download_thread = DownloadThread(download_url, save_path)
-            self.download_thread.progress_signal.connect(self.update_download_progress)
-            self.download_thread.finished_signal.connect(lambda success, error: self.download_finished(success, error, file_name, save_path))
-            self.download_thread.start()
-            
-            self.status_label.setText(f"正在下载: {file_name}")
+        rows = sorted(index.row() for index in self.file_table.selectionModel().selectedRows())
+        if not rows:
+            QMessageBox.warning(self, "错误", "请先选择要下载的文件")
+            return
         
-        except Exception as e:
-            self.status_label.setText(f"下载过程中发生错误: {e}")
-
-    def update_download_progress(self, downloaded, total):
-        """更新下载进度"""
-        if total > 0:
-            progress = int((downloaded / total) * 100)
-            self.progress_bar.setValue(progress)
-            self.status_label.setText(f"下载进度: {progress}% ({format_file_size(downloaded)}/{format_file_size(total)})")
-
-    def download_finished(self, success, error, file_name, save_path):
-        """下载完成处理"""
-        # 移除进度条
-        if hasattr(self, 'progress_bar'):
-            central_widget = self.centralWidget()
-            main_layout = central_widget.layout()
-            main_layout.removeWidget(self.progress_bar)
-            self.progress_bar.deleteLater()
-            self.progress_bar = None
+        file_rows = [row for row in rows if not self.file_model.is_folder(row)]
+        folder_rows = [row for row in rows if self.file_model.is_folder(row)]
         
-        if success:
-            self.status_label.setText(f"文件 {file_name} 下载成功，保存至: {save_path}")
+        # 选择保存位置，多个文件或包含文件夹时选择保存目录
+        if len(rows) == 1 and file_rows:
+            save_path, _ = QFileDialog.getSaveFileName(self, "保存文件", self.file_model.file_name(file_rows[0]))
+            if not save_path:
+                return
+            save_paths = [save_path]
+            save_dir = None
         else:
-            self.status_label.setText(f"文件下载失败: {error}")
\ No newline at end of file
+            save_dir = QFileDialog.getExistingDirectory(self, "选择保存目录")
+            if not save_dir:
+                return
+            save_paths = [os.path.join(save_dir, self.file_model.file_name(row)) for row in file_rows]
+        
+        # 同一位置留有断点文件时会继续上次的下载
+        if file_rows:
+            self.transfer_manager.add_transfers([
+                (DOWNLOAD, self.file_model.file_name(row), save_path, self.file_model.file_id(row),
+                 self.file_model.etag(row), self.file_model.raw_size(row))
+                for row, save_path in zip(file_rows, save_paths)
+            ])
+        for row in folder_rows:
+            self.download_folder(self.file_model.file_id(row), self.file_model.file_name(row), save_dir)
+        
+        message = f"已将 {len(file_rows)} 个文件加入下载队列"
+        if folder_rows:
+            message += f"，正在列出 {len(folder_rows)} 个文件夹中的文件"
+        self.status_label.setText(message)
+    
+    def download_folder(self, folder_id, folder_name, save_dir):
+        """在后台遍历文件夹，每列出一批文件就加入下载队列"""
+        counter = {"files": 0}
+        
+        def add_batch(items):
+            self.transfer_manager.add_transfers(items)
+            counter["files"] += len(items)
+            self.status_label.setText(f"正在列出文件夹 {folder_name}，已加入 {counter['files']} 个文件")
+        
+        # 每个文件夹使用自己的频道，同时下载多个文件夹时互不取消
+        self.request_executor.submit_stream(
+            f"download_folder:{folder_id}", iter_folder_downloads, self.api, folder_id, folder_name, save_dir,
+            on_item=add_batch,
+            on_result=lambda _: self.status_label.setText(f"文件夹 {folder_name} 共 {counter['files']} 个文件已加入下载队列"),
+            on_error=lambda error: self.status_label.setText(f"列出文件夹 {folder_name} 失败: {error}")
+        )
+    
+    # ===== 传输队列相关方法 =====
+    
+    def selected_transfer_ids(self):
+        return [self.transfer_model.transfer_id(index.row()) for index in self.transfer_table.selectionModel().selectedRows()]
+    
+    def on_transfer_finished(self, transfer_id, success, result):
+        """一个传输完成或失败"""
+        transfer = self.transfer_manager.transfers.get(transfer_id)
+        if transfer is None:
+            return
+        if transfer.kind == UPLOAD:
+            if success:
+                self.status_label.setText(f"文件 {transfer.name} 上传成功，文件ID: {result}")
+                # 清除目标文件夹的列表缓存，正在查看该文件夹时刷新
+                self.api.invalidate_folder(transfer.remote_id)
+                if transfer.remote_id == self.current_folder_id and self.search_results is None:
+                    self.list_files()
+            else:
+                self.status_label.setText(f"文件 {transfer.name} 上传失败: {result}")
+        elif success:
+            self.status_label.setText(f"文件 {transfer.name} 下载成功，保存至: {transfer.local_path}")
+        else:
+            self.status_label.setText(f"文件 {transfer.name} 下载失败: {result}")
+    
+    def update_transfer_summary(self, download_speed, upload_speed):
+        """显示传输队列的总体情况"""
+        active, queued = self.transfer_manager.counts()
+        self.transfer_summary_label.setText(
+            f"传输中 {active} 个 | 排队 {queued} 个 | "
+            f"下载 {format_file_size(int(download_speed))}/s | 上传 {format_file_size(int(upload_speed))}/s"
+        )
+    
+    def closeEvent(self, event):
+        # 停止传输并等待线程结束，保存队列，下次启动后继续未完成的传输
+        self.transfer_manager.stop()
+        super().closeEvent(event)
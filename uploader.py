@@ -0,0 +1,436 @@
+import os
+import json
+import atexit
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from utils import UPLOAD_SESSION_FILE
+
+DEFAULT_UPLOAD_WORKERS = 4  # 同时上传的分片数
+DEFAULT_URL_PREFETCH = 2  # 提前获取上传地址的分片数
+SLICE_BUFFER_SIZE = 256 * 1024  # 每个上传中的分片使用的读缓冲区大小
+DEFAULT_BUFFER_BUDGET = 64 * 1024 * 1024  # 所有上传共用的读缓冲区内存上限
+DEFAULT_RETRY_BUDGET = 20  # 一个文件的所有分片合计最多重试的次数
+SLICE_RETRY_BASE = 0.5  # 分片第一次重试前等待的秒数，之后每次翻倍
+SLICE_RETRY_MAX = 30  # 分片重试等待的上限(秒)
+SESSION_FLUSH_DELAY = 1.0  # 分片确认合并写入会话文件的间隔(秒)
+
+# 分片上传返回这些状态码时稍后重试
+RETRYABLE_SLICE_STATUS = (408, 425, 429, 500, 502, 503, 504)
+# 上传地址过期时对象存储返回的状态码，需要重新获取上传地址
+EXPIRED_UPLOAD_URL_STATUS = (401, 403)
+# 本地文件出错时重试没有意义
+FATAL_SLICE_ERRORS = (FileNotFoundError, PermissionError, IsADirectoryError)
+
+SLICE_RETRY = "retry"  # 稍后用同一地址重试
+SLICE_REFRESH = "refresh"  # 重新获取上传地址后重试
+SLICE_FATAL = "fatal"  # 不可重试，放弃上传
+
+
+class Slice:
+    """文件分片 (分片序号从1开始)"""
+    __slots__ = ("slice_no", "start", "size")
+    
+    def __init__(self, slice_no, start, size):
+        self.slice_no = slice_no
+        self.start = start
+        self.size = size
+
+
+def split_slices(file_size, slice_size):
+    """按分片大小切分文件，返回分片列表"""
+    slices = []
+    slice_no = 1
+    for start in range(0, file_size, slice_size):
+        slices.append(Slice(slice_no, start, min(slice_size, file_size - start)))
+        slice_no += 1
+    return slices
+
+
+class BufferBudget:
+    """限制所有上传同时占用的缓冲区内存，超出上限时等待其他分片释放"""
+    
+    def __init__(self, limit=DEFAULT_BUFFER_BUDGET):
+        self.limit = limit
+        self.in_use = 0
+        self.peak = 0
+        self._condition = threading.Condition()
+    
+    def acquire(self, size):
+        size = min(size, self.limit)
+        with self._condition:
+            while self.in_use + size > self.limit:
+                self._condition.wait()
+            self.in_use += size
+            self.peak = max(self.peak, self.in_use)
+        return size
+    
+    def release(self, size):
+        with self._condition:
+            self.in_use -= size
+            self._condition.notify_all()
+
+
+_default_budget = BufferBudget()
+
+
+def get_buffer_budget():
+    """获取全局共享的缓冲区内存预算"""
+    return _default_budget
+
+
+class FileWindow:
+    """文件中 [start, start + size) 范围的只读文件对象，用作分片的请求体
+    
+    http.client 会反复调用 read(blocksize) 并立即发送，因此只需一个固定大小的缓冲区循环使用，
+    无论分片多大，每个上传中的分片只占用 buffer_size 字节内存。缓冲区从 budget 中申请。
+    """
+    
+    def __init__(self, file_path, start, size, buffer_size=SLICE_BUFFER_SIZE, budget=None):
+        self.file_path = file_path
+        self.start = start
+        self.size = max(0, min(size, os.path.getsize(file_path) - start))
+        self.position = 0
+        self.budget = budget or get_buffer_budget()
+        self.file = open(file_path, "rb")
+        self.file.seek(start)
+        self.buffer_size = self.budget.acquire(min(buffer_size, self.size) or 1)
+        self.buffer = bytearray(self.buffer_size)
+        self.view = memoryview(self.buffer)
+    
+    def __len__(self):
+        return self.size
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def read(self, n=-1):
+        """读取下一块数据，返回的内容在下次调用 read 前有效"""
+        remaining = self.size - self.position
+        if remaining <= 0:
+            return b""
+        if n is None or n < 0 or n > self.buffer_size:
+            n = self.buffer_size
+        n = min(n, remaining)
+        length = self.file.readinto(self.view[:n])
+        if not length:
+            return b""
+        self.position += length
+        return self.view[:length]
+    
+    def seek(self, offset, whence=0):
+        """只用于重发请求前回到开头"""
+        if whence == 1:
+            offset += self.position
+        elif whence == 2:
+            offset += self.size
+        self.position = max(0, min(offset, self.size))
+        self.file.seek(self.start + self.position)
+        return self.position
+    
+    def tell(self):
+        return self.position
+    
+    def close(self):
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        self.view.release()
+        self.buffer = None
+        self.budget.release(self.buffer_size)
+
+
+def classify_slice_result(result):
+    """判断分片上传的结果，成功返回None，否则返回 SLICE_RETRY / SLICE_REFRESH / SLICE_FATAL
+    
+    result 为 upload_slice 返回的HTTP状态码或是否成功，或者上传时抛出的异常。
+    """
+    if isinstance(result, BaseException):
+        return SLICE_FATAL if isinstance(result, FATAL_SLICE_ERRORS) else SLICE_RETRY
+    if result is True or result in (200, 201, 204):
+        return None
+    if result is False or result in RETRYABLE_SLICE_STATUS:
+        return SLICE_RETRY
+    if result in EXPIRED_UPLOAD_URL_STATUS:
+        return SLICE_REFRESH
+    return SLICE_FATAL
+
+
+def retry_delay(attempt):
+    """第 attempt 次重试前等待的秒数，指数增长并带随机抖动，避免所有分片同时重试"""
+    return min(SLICE_RETRY_MAX, SLICE_RETRY_BASE * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+
+
+class SliceUploader:
+    """并发分片上传器
+    
+    同时保持 workers 个分片在上传，并提前获取后续分片的上传地址。
+    get_upload_url(slice_no) 返回上传地址(接口返回错误时返回None)，
+    upload_slice(url, start, size) 返回HTTP状态码或是否上传成功，两者都会在线程池中调用。
+    
+    单个分片失败时按 classify_slice_result 分类：网络错误和5xx等按指数退避重试，
+    上传地址过期时重新获取地址，其他错误放弃整个上传。获取上传地址出错或没有返回地址时同样退避后重新获取。所有分片合计最多重试 retry_budget 次。
+    """
+    
+    def __init__(self, get_upload_url, upload_slice, workers=DEFAULT_UPLOAD_WORKERS, url_prefetch=DEFAULT_URL_PREFETCH,
+                 retry_budget=DEFAULT_RETRY_BUDGET):
+        self.get_upload_url = get_upload_url
+        self.upload_slice = upload_slice
+        self.workers = max(1, workers)
+        self.url_prefetch = max(0, url_prefetch)
+        self.retry_budget = retry_budget
+        self.retries = 0  # 已重试的次数
+        self.error = ""  # 放弃上传的原因
+        self._cancelled = threading.Event()
+    
+    def cancel(self):
+        """取消上传，已在进行中的分片会传完"""
+        self._cancelled.set()
+    
+    def run(self, slices, on_progress=None, on_slice_uploaded=None, on_retry=None):
+        """上传所有分片，全部成功返回True，失败时原因记录在 error 中
+        
+        on_progress(已按顺序完成的分片数, 总分片数) 在调用 run 的线程中按顺序回调，
+        on_slice_uploaded(分片序号) 在每个分片上传成功后回调，
+        on_retry(分片序号, 已重试次数, 原因) 在安排重试时回调。
+        """
+        total = len(slices)
+        pending = deque(slices)
+        ready = deque()  # 已拿到上传地址、等待上传的 (分片, 地址)
+        delayed = []  # 等待重试的 (重试时间, 分片, 地址)，地址为None时需重新获取
+        attempts = {}  # 分片序号 -> 已重试次数
+        url_futures = {}
+        put_futures = {}
+        finished_slices = set()
+        in_order = 0  # 从第1个分片起连续完成的分片数
+        ordered_numbers = [s.slice_no for s in slices]
+        
+        def schedule_retry(item, url, reason, backoff=True):
+            """安排分片重试，超出重试次数时返回False"""
+            if self.retries >= self.retry_budget:
+                self.error = f"分片{item.slice_no}{reason}，已达到重试上限({self.retry_budget}次)"
+                return False
+            self.retries += 1
+            attempts[item.slice_no] = attempts.get(item.slice_no, 0) + 1
+            delay = retry_delay(attempts[item.slice_no]) if backoff else 0
+            delayed.append((time.monotonic() + delay, item, url))
+            if on_retry:
+                on_retry(item.slice_no, self.retries, reason)
+            return True
+        
+        url_pool = ThreadPoolExecutor(max_workers=min(self.workers, self.url_prefetch + 1))
+        put_pool = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            while pending or ready or delayed or url_futures or put_futures:
+                if self._cancelled.is_set():
+                    self.error = "上传已取消"
+                    return False
+                
+                # 到时间的重试回到队列前面
+                now = time.monotonic()
+                for entry in [e for e in delayed if e[0] <= now]:
+                    delayed.remove(entry)
+                    _, item, url = entry
+                    if url:
+                        ready.appendleft((item, url))
+                    else:
+                        pending.appendleft(item)
+                
+                # 提前获取上传地址，最多领先 workers + url_prefetch 个分片
+                while pending and len(url_futures) + len(ready) + len(put_futures) < self.workers + self.url_prefetch:
+                    item = pending.popleft()
+                    url_futures[url_pool.submit(self.get_upload_url, item.slice_no)] = item
+                
+                while ready and len(put_futures) < self.workers:
+                    item, url = ready.popleft()
+                    put_futures[put_pool.submit(self.upload_slice, url, item.start, item.size)] = (item, url)
+                
+                timeout = max(0.0, min(e[0] for e in delayed) - time.monotonic()) if delayed else None
+                if not url_futures and not put_futures:
+                    # 只剩等待重试的分片
+                    self._cancelled.wait(timeout)
+                    continue
+                done, _ = wait(list(url_futures) + list(put_futures), timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in url_futures:
+                        item = url_futures.pop(future)
+                        try:
+                            url = future.result()
+                        except Exception as e:
+                            # 获取地址时网络出错，稍后重新获取
+                            if not schedule_retry(item, None, f"获取上传地址失败({e})"):
+                                return False
+                            continue
+                        if not url:
+                            # 接口返回错误(临时故障或被限流)，按退避稍后重新获取
+                            if not schedule_retry(item, None, "获取上传地址失败"):
+                                return False
+                            continue
+                        ready.append((item, url))
+                        continue
+                    
+                    item, url = put_futures.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = e
+                    failure = classify_slice_result(result)
+                    if isinstance(result, BaseException):
+                        detail = f"({result})"
+                    elif isinstance(result, bool):
+                        detail = ""
+                    else:
+                        detail = f"(HTTP状态码 {result})"
+                    if failure == SLICE_FATAL:
+                        self.error = f"分片{item.slice_no}上传失败{detail}"
+                        return False
+                    if failure == SLICE_REFRESH:
+                        if not schedule_retry(item, None, "的上传地址已过期", backoff=False):
+                            return False
+                        continue
+                    if failure == SLICE_RETRY:
+                        if not schedule_retry(item, url, f"上传失败{detail}"):
+                            return False
+                        continue
+                    finished_slices.add(item.slice_no)
+                    if on_slice_uploaded:
+                        on_slice_uploaded(item.slice_no)
+                    
+                    advanced = False
+                    while in_order < total and ordered_numbers[in_order] in finished_slices:
+                        in_order += 1
+                        advanced = True
+                    if advanced and on_progress:
+                        on_progress(in_order, total)
+            return True
+        finally:
+            for future in list(url_futures) + list(put_futures):
+                future.cancel()
+            url_pool.shutdown(wait=True)
+            put_pool.shutdown(wait=True)
+
+
+class UploadSessionStore:
+    """未完成分片上传的持久化记录
+    
+    保存preuploadID、分片大小、本地文件标识(路径、大小、修改时间)和已确认上传的分片，
+    程序重启后可跳过已上传的分片继续上传。所有实例共用同一份内存中的记录和锁，会话文件只在第一次使用时读取。
+    创建和删除会话时立即写入文件；分片确认很频繁，flush_delay 秒内的多次确认合并为一次写入，
+    程序退出时写入剩余的确认。
+    """
+    _lock = threading.Lock()
+    _cache = {}  # 会话文件路径 -> {会话键: 会话}
+    _timers = {}  # 会话文件路径 -> 等待写入的 threading.Timer
+    
+    def __init__(self, path=UPLOAD_SESSION_FILE, flush_delay=SESSION_FLUSH_DELAY):
+        self.path = path
+        self.flush_delay = flush_delay
+    
+    @staticmethod
+    def session_key(file_path, parent_folder_id):
+        return f"{os.path.abspath(file_path)}|{parent_folder_id}"
+    
+    def _sessions(self):
+        """内存中的会话记录，需要在锁内调用"""
+        sessions = self._cache.get(self.path)
+        if sessions is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    sessions = json.load(f)
+            except (OSError, ValueError):
+                sessions = {}
+            # 已确认的分片在内存中用集合保存，大文件每次确认也只需常数时间
+            for session in sessions.values():
+                session["uploaded"] = set(session.get("uploaded", ()))
+            self._cache[self.path] = sessions
+        return sessions
+    
+    def _dump(self):
+        """立即写入文件并取消等待中的合并写入，需要在锁内调用"""
+        timer = self._timers.pop(self.path, None)
+        if timer is not None:
+            timer.cancel()
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(self._sessions(), ensure_ascii=False, default=sorted))
+        os.replace(tmp_path, self.path)
+    
+    def _schedule_dump(self):
+        """flush_delay 秒后写入文件，已安排时不重复安排，需要在锁内调用"""
+        if self.path in self._timers:
+            return
+        timer = threading.Timer(self.flush_delay, self.flush)
+        timer.daemon = True
+        self._timers[self.path] = timer
+        timer.start()
+    
+    def flush(self):
+        """写入尚未保存的分片确认"""
+        with self._lock:
+            if self.path in self._timers:
+                self._dump()
+    
+    @classmethod
+    def flush_all(cls):
+        """写入所有会话文件中尚未保存的分片确认"""
+        for path in list(cls._timers):
+            cls(path).flush()
+    
+    def find(self, file_path, parent_folder_id, stat):
+        """查找与本地文件匹配的上传会话，文件已变化时删除旧会话并返回None"""
+        key = self.session_key(file_path, parent_folder_id)
+        with self._lock:
+            sessions = self._sessions()
+            session = sessions.get(key)
+            if session is None:
+                return None
+            if session.get("size") != stat.st_size or session.get("mtimeNs") != stat.st_mtime_ns:
+                del sessions[key]
+                self._dump()
+                return None
+            # 返回副本，之后的分片确认不会改变调用者拿到的记录
+            return dict(session, uploaded=set(session["uploaded"]))
+    
+    def save(self, file_path, parent_folder_id, stat, md5, preupload_id, slice_size):
+        """记录新创建的上传会话"""
+        key = self.session_key(file_path, parent_folder_id)
+        with self._lock:
+            self._sessions()[key] = {
+                "path": os.path.abspath(file_path),
+                "parentFileID": parent_folder_id,
+                "size": stat.st_size,
+                "mtimeNs": stat.st_mtime_ns,
+                "etag": md5,
+                "preuploadID": preupload_id,
+                "sliceSize": slice_size,
+                "uploaded": set(),
+                "createdAt": int(time.time()),
+            }
+            self._dump()
+    
+    def mark_uploaded(self, file_path, parent_folder_id, slice_no):
+        """记录服务器已确认的分片，稍后与其他确认合并写入"""
+        key = self.session_key(file_path, parent_folder_id)
+        with self._lock:
+            session = self._sessions().get(key)
+            if session is None:
+                return
+            if slice_no not in session["uploaded"]:
+                session["uploaded"].add(slice_no)
+                self._schedule_dump()
+    
+    def remove(self, file_path, parent_folder_id):
+        """上传完成或会话失效后删除记录"""
+        key = self.session_key(file_path, parent_folder_id)
+        with self._lock:
+            if self._sessions().pop(key, None) is not None:
+                self._dump()
+
+
+atexit.register(UploadSessionStore.flush_all)
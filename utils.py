@@ -6,6 +6,11 @@ from datetime import timedelta
 # 常量定义
 TOKEN_FILE = "token.json"
 CREDENTIALS_FILE = "token.txt"  # 保存 clientID 和 clientSecret 的文件
+UPLOAD_SESSION_FILE = "upload_sessions.json"  # 未完成的分片上传会话
+HASH_CACHE_FILE = "hash_cache.db"  # 本地文件哈希缓存
+SEARCH_INDEX_FILE = "search_index.db"  # 已浏览过的网盘文件的搜索索引
+TRANSFER_QUEUE_FILE = "transfer_queue.json"  # 未完成的上传下载队列
+SYNC_STATE_FILE = "sync_state.db"  # 文件夹同步记录
 
 def format_file_size(size):
     """格式化文件大小为可读形式"""
@@ -18,11 +23,22 @@ def format_file_size(size):
     else:
         return f"{size/(1024*1024*1024):.2f} GB"
 
-def save_token(access_token, expired_at):
-    """保存token到本地文件"""
+def format_duration(seconds):
+    """格式化剩余时间为可读形式"""
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}秒"
+    elif seconds < 3600:
+        return f"{seconds // 60}分{seconds % 60}秒"
+    else:
+        return f"{seconds // 3600}小时{seconds % 3600 // 60}分"
+
+def save_token(access_token, expired_at, client_id=None):
+    """保存token到本地文件，client_id 用于区分账号(搜索索引按账号保存)"""
     token_data = {
         "accessToken": access_token,
-        "expiredAt": expired_at
+        "expiredAt": expired_at,
+        "clientId": client_id
     }
     with open(TOKEN_FILE, 'w') as f:
         json.dump(token_data, f)
@@ -0,0 +1,182 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from api import MAX_PAGE_SIZE, LAST_PAGE
+from ratelimit import TokenBucket
+
+DEFAULT_WALK_WORKERS = 8  # 同时列出的页数
+DEFAULT_WALK_QPS = 0  # 本次遍历每秒最多发出的列表请求数，0表示只受全局按接口限速的限制
+WALK_CHECKPOINT_INTERVAL = 5.0  # 遍历断点的最短保存间隔(秒)
+WALK_PAGE_ATTEMPTS = 3  # 单页列表请求的最多尝试次数
+
+
+def join_path(parent, name):
+    return parent.rstrip("/") + "/" + name
+
+
+class WalkCheckpoint:
+    """遍历断点文件
+    
+    保存还没有处理完的页 [(文件夹ID, 路径, 分页游标)] 以及已遍历的数量，
+    中断后从这些页继续。已经返回过的页不会再返回，正在返回中的页恢复后会重新返回一次。
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.root_id = None
+        self.frontier = []
+        self.folders = 0
+        self.files = 0
+    
+    def load(self):
+        """读取断点文件，不存在或损坏时返回False"""
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            self.root_id = data["rootId"]
+            self.frontier = [(folder_id, path, cursor) for folder_id, path, cursor in data["frontier"]]
+            self.folders = int(data.get("folders", 0))
+            self.files = int(data.get("files", 0))
+            return True
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+    
+    def save(self):
+        """原子地写入断点文件"""
+        data = {
+            "rootId": self.root_id,
+            "frontier": self.frontier,
+            "folders": self.folders,
+            "files": self.files,
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+    
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class TreeWalker:
+    """并发的广度优先目录遍历
+    
+    每次请求列出一个文件夹的一页，最多 workers 个请求同时进行，并用令牌桶把请求速率限制在 qps 以内。
+    walk() 按页返回 (路径, FileRecord)，给出 checkpoint_path 时定期保存待处理的页，
+    中断(异常、cancel() 或提前结束迭代)后用同一个断点文件再次遍历会从断点继续，遍历完成后删除断点文件。
+    """
+    
+    def __init__(self, api, root_id="0", root_path="/", workers=DEFAULT_WALK_WORKERS, qps=DEFAULT_WALK_QPS,
+                 checkpoint_path=None, page_size=MAX_PAGE_SIZE):
+        self.api = api
+        self.root_id = str(root_id)
+        self.root_path = root_path
+        self.workers = max(1, workers)
+        self.page_size = page_size
+        self.rate_limiter = TokenBucket(qps)
+        self.checkpoint = WalkCheckpoint(checkpoint_path) if checkpoint_path else None
+        self.folders = 0
+        self.files = 0
+        self.pages = 0
+        self._pending = {}  # 页号 -> (文件夹ID, 路径, 分页游标)，尚未处理完的页
+        self._queue = deque()  # 等待请求的页号
+        self._page_ids = 0
+        self._last_checkpoint = 0
+        self._cancelled = threading.Event()
+    
+    def cancel(self):
+        """停止遍历，保存断点后 walk() 结束"""
+        self._cancelled.set()
+    
+    def add_page(self, folder_id, path, cursor=None):
+        self._page_ids += 1
+        self._pending[self._page_ids] = (folder_id, path, cursor)
+        self._queue.append(self._page_ids)
+    
+    def list_page(self, folder_id, cursor):
+        """限速后列出一页，失败时重试"""
+        for attempt in range(WALK_PAGE_ATTEMPTS):
+            self.rate_limiter.acquire()
+            try:
+                return self.api.fetch_file_list(folder_id, cursor, self.page_size)
+            except Exception:
+                if attempt == WALK_PAGE_ATTEMPTS - 1 or self._cancelled.is_set():
+                    raise
+                time.sleep(attempt + 1)
+    
+    def start_frontier(self):
+        """读取可用的断点，否则从根目录开始"""
+        checkpoint = self.checkpoint
+        if checkpoint and checkpoint.load() and checkpoint.root_id == self.root_id and checkpoint.frontier:
+            self.folders = checkpoint.folders
+            self.files = checkpoint.files
+            for folder_id, path, cursor in checkpoint.frontier:
+                self.add_page(folder_id, path, cursor)
+        else:
+            self.add_page(self.root_id, self.root_path)
+    
+    def save_checkpoint(self, force=False):
+        """按间隔保存待处理的页"""
+        if not self.checkpoint:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_checkpoint < WALK_CHECKPOINT_INTERVAL:
+            return
+        self._last_checkpoint = now
+        self.checkpoint.root_id = self.root_id
+        self.checkpoint.frontier = list(self._pending.values())
+        self.checkpoint.folders = self.folders
+        self.checkpoint.files = self.files
+        self.checkpoint.save()
+    
+    def walk(self):
+        """逐个返回 (路径, FileRecord)，同一层的文件夹先于下一层返回"""
+        self.start_frontier()
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="walk")
+        running = {}  # Future -> 页号
+        finished = False
+        try:
+            while (self._queue or running) and not self._cancelled.is_set():
+                while self._queue and len(running) < self.workers:
+                    page_id = self._queue.popleft()
+                    folder_id, _, cursor = self._pending[page_id]
+                    running[executor.submit(self.list_page, folder_id, cursor)] = page_id
+                
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    page_id = running.pop(future)
+                    folder_id, path, cursor = self._pending[page_id]
+                    records, next_cursor = future.result()
+                    subfolders = []
+                    for record in records:
+                        record_path = join_path(path, record.filename)
+                        if record.is_folder:
+                            subfolders.append((str(record.file_id), record_path))
+                        yield record_path, record
+                    
+                    # 整页返回完之后才记录下一页和子文件夹，断点中不会出现重复的子树
+                    if next_cursor and next_cursor != LAST_PAGE:
+                        self.add_page(folder_id, path, next_cursor)
+                    for subfolder_id, subfolder_path in subfolders:
+                        self.add_page(subfolder_id, subfolder_path)
+                    del self._pending[page_id]
+                    self.pages += 1
+                    self.folders += len(subfolders)
+                    self.files += len(records) - len(subfolders)
+                    self.save_checkpoint()
+            finished = not self._queue and not running
+        finally:
+            for future in running:
+                future.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
+            if self.checkpoint:
+                if finished:
+                    self.checkpoint.remove()
+                else:
+                    self.save_checkpoint(force=True)